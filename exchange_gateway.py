@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+# =======================================================================================
+# --- 🚦 Maestro Exchange Gateway (Request Scheduler) 🚦 ---
+# =======================================================================================
+#
+# منظم مركزي لكل طلبات REST إلى OKX بدلاً من منظم ccxt العام (enableRateLimit) الذي يخدم الطلبات
+# بترتيب وصولها، فيقف أمر بيع وقف الخسارة خلف مئات طلبات الشموع الخاصة بالفحص.
+#   - دلو رموز (Token Bucket) لكل نقطة نهاية بحدود OKX المنشورة (عدد طلبات كل ثانيتين).
+#   - مسارات أولوية: الأوامر > قراءات الحارس والرجل الحكيم > الفحص > التقارير.
+#     عند نفاد رموز نقطة نهاية يُخدم المنتظر الأعلى أولوية أولاً، وبترتيب الوصول داخل نفس المسار.
+#   - المسار يُحدد من سياق المهمة (contextvars) فيرثه كل ما تنشئه المهمة من مهام فرعية؛
+#     وأوامر الإنشاء والإلغاء تذهب دائماً إلى مسار الأوامر مهما كان السياق.
+#   - دمج الطلبات المتطابقة (Singleflight): طلبات القراءة المتطابقة المتزامنة تشترك في طلب واحد ونتيجته،
+#     مع نافذة حداثة قصيرة اختيارية لبعض الطرق؛ وأي أمر إنشاء أو إلغاء يُبطل النتائج المحفوظة.
+#
+# =======================================================================================
+
+import asyncio
+import contextlib
+import contextvars
+import functools
+import heapq
+import itertools
+import logging
+import time
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+LANE_PRIORITY = {"order": 0, "guardian": 1, "scan": 2, "report": 3}
+
+# حدود OKX لكل نقطة نهاية: (عدد الطلبات، النافذة بالثواني)
+OKX_RATE_LIMITS = {
+    "market/candles": (40, 2.0),
+    "market/history-candles": (20, 2.0),
+    "market/tickers": (20, 2.0),
+    "market/ticker": (20, 2.0),
+    "market/books": (40, 2.0),
+    "public/instruments": (20, 2.0),
+    "public/time": (10, 2.0),
+    "account/balance": (10, 2.0),
+    "trade/order": (60, 2.0),
+    "trade/cancel-order": (60, 2.0),
+    "trade/orders-pending": (60, 2.0),
+    "trade/orders-history": (40, 2.0),
+    "trade/fills": (60, 2.0),
+}
+DEFAULT_RATE_LIMIT = (10, 2.0)
+
+CCXT_METHOD_ENDPOINTS = {
+    "fetch_ohlcv": "market/candles",
+    "fetch_tickers": "market/tickers",
+    "fetch_ticker": "market/ticker",
+    "fetch_order_book": "market/books",
+    "load_markets": "public/instruments",
+    "fetch_markets": "public/instruments",
+    "fetch_time": "public/time",
+    "fetch_balance": "account/balance",
+    "create_order": "trade/order",
+    "create_market_buy_order": "trade/order",
+    "create_market_sell_order": "trade/order",
+    "create_limit_buy_order": "trade/order",
+    "create_limit_sell_order": "trade/order",
+    "fetch_order": "trade/order",
+    "cancel_order": "trade/cancel-order",
+    "fetch_open_orders": "trade/orders-pending",
+    "fetch_closed_orders": "trade/orders-history",
+    "fetch_my_trades": "trade/fills",
+}
+ORDER_METHOD_PREFIXES = ("create_", "cancel_", "edit_")
+SCHEDULED_METHOD_PREFIXES = ("fetch_", "load_") + ORDER_METHOD_PREFIXES
+
+# نافذة الحداثة (ثوانٍ) لإعادة استخدام نتيجة طلب قراءة منتهٍ؛ الطرق غير المذكورة تُدمج فقط أثناء تنفيذها
+READ_FRESHNESS_SECONDS = {
+    "fetch_balance": 1.0,
+    "fetch_ticker": 1.0,
+    "fetch_tickers": 1.0,
+}
+
+HISTORY_CANDLES_AFTER_BARS = 1440  # OKX تخدم الشموع الأقدم من ذلك عبر history-candles بحد أقل
+
+# جزء من الحد يُسمح به كدفعة فورية؛ الباقي يتجدد بمعدل ثابت، فلا تتجاوز أي نافذة متحركة الحد المنشور
+BURST_FRACTION = 0.2
+
+request_lane = contextvars.ContextVar("request_lane", default="guardian")
+
+
+@contextlib.contextmanager
+def request_lane_scope(lane: str):
+    token = request_lane.set(lane)
+    try:
+        yield
+    finally:
+        request_lane.reset(token)
+
+
+def in_request_lane(lane: str):
+    """Decorator running a coroutine function (and every task it spawns) in the given priority lane."""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with request_lane_scope(lane):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class _TokenBucket:
+    def __init__(self, limit: int, window: float):
+        self.capacity = max(1.0, limit * BURST_FRACTION)
+        self.rate = (limit - self.capacity) / window
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._waiters = []  # heap of (priority, seq, future)
+        self._seq = itertools.count()
+        self._pump_task = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, priority: int):
+        self._refill()
+        if not self._waiters and self.tokens >= 1:
+            self.tokens -= 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        if self._pump_task is None or self._pump_task.done():
+            self._pump_task = asyncio.create_task(self._pump())
+        await future
+
+    async def _pump(self):
+        while self._waiters:
+            self._refill()
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                continue
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done(): continue  # المنتظر أُلغي
+            self.tokens -= 1
+            future.set_result(None)
+
+    def __len__(self):
+        return len(self._waiters)
+
+
+class RequestScheduler:
+    def __init__(self, limits: dict = None, default_limit: tuple = DEFAULT_RATE_LIMIT):
+        self._limits = OKX_RATE_LIMITS if limits is None else limits
+        self._default_limit = default_limit
+        self._buckets = {}
+        self.stats = Counter()
+
+    def _bucket(self, endpoint: str) -> _TokenBucket:
+        bucket = self._buckets.get(endpoint)
+        if bucket is None:
+            bucket = self._buckets[endpoint] = _TokenBucket(*self._limits.get(endpoint, self._default_limit))
+        return bucket
+
+    async def acquire(self, endpoint: str, lane: str):
+        started = time.monotonic()
+        await self._bucket(endpoint).acquire(LANE_PRIORITY.get(lane, LANE_PRIORITY["guardian"]))
+        self.stats[f"{lane}_requests"] += 1
+        self.stats[f"{lane}_wait_ms"] += int((time.monotonic() - started) * 1000)
+
+    def queued(self) -> int:
+        return sum(len(b) for b in self._buckets.values())
+
+    def lane_summary(self) -> str:
+        """'order: 3 (0ms) | scan: 420 (35ms)' — request count and average wait per lane."""
+        parts = []
+        for lane in LANE_PRIORITY:
+            count = self.stats[f"{lane}_requests"]
+            if count: parts.append(f"{lane}: {count} ({self.stats[f'{lane}_wait_ms'] // count}ms)")
+        return " | ".join(parts) or "N/A"
+
+
+def endpoint_for(method: str, args: tuple, kwargs: dict, exchange=None) -> str:
+    endpoint = CCXT_METHOD_ENDPOINTS.get(method, method)
+    if method == "fetch_ohlcv":
+        since = kwargs.get("since", args[2] if len(args) > 2 else None)
+        timeframe = kwargs.get("timeframe", args[1] if len(args) > 1 else "1m")
+        if since is not None and exchange is not None:
+            age_bars = (exchange.milliseconds() - since) // (exchange.parse_timeframe(timeframe) * 1000)
+            if age_bars > HISTORY_CANDLES_AFTER_BARS: endpoint = "market/history-candles"
+    return endpoint
+
+
+class ExchangeGateway:
+    """
+    Proxy around a ccxt exchange: every fetch/create/cancel coroutine waits for a token of its
+    endpoint's bucket in the caller's lane before reaching the exchange. Everything else passes through.
+    Identical concurrent reads share one in-flight call (results are shared objects, callers must not mutate them).
+    """
+
+    def __init__(self, exchange, scheduler: RequestScheduler = None, freshness: dict = None):
+        self._exchange = exchange
+        self.scheduler = scheduler or RequestScheduler()
+        self.freshness = READ_FRESHNESS_SECONDS if freshness is None else freshness
+        self._inflight = {}  # key -> (lane priority, task)
+        self._recent = {}  # key -> (monotonic finish time, result)
+        self.stats = Counter()
+
+    def __getattr__(self, name):
+        attr = getattr(self._exchange, name)
+        if not name.startswith(SCHEDULED_METHOD_PREFIXES) or not asyncio.iscoroutinefunction(attr):
+            return attr
+
+        if name.startswith(ORDER_METHOD_PREFIXES):
+            @functools.wraps(attr)
+            async def ordered(*args, **kwargs):
+                await self.scheduler.acquire(endpoint_for(name, args, kwargs, self._exchange), "order")
+                try:
+                    return await attr(*args, **kwargs)
+                finally:
+                    self._recent.clear()  # الرصيد والأوامر تغيرت
+            return ordered
+
+        @functools.wraps(attr)
+        async def scheduled(*args, **kwargs):
+            return await self._coalesced(name, attr, args, kwargs)
+        return scheduled
+
+    async def _call(self, name, attr, args, kwargs, lane):
+        await self.scheduler.acquire(endpoint_for(name, args, kwargs, self._exchange), lane)
+        return await attr(*args, **kwargs)
+
+    async def _coalesced(self, name, attr, args, kwargs):
+        key = (name, repr(args), repr(sorted(kwargs.items())))
+        self.stats['reads'] += 1
+        recent = self._recent.get(key)
+        if recent is not None:
+            if time.monotonic() - recent[0] <= self.freshness.get(name, 0):
+                self.stats['fresh_hits'] += 1
+                return recent[1]
+            del self._recent[key]
+
+        lane = request_lane.get()
+        priority = LANE_PRIORITY.get(lane, LANE_PRIORITY["guardian"])
+        inflight = self._inflight.get(key)
+        # لا ننضم إلى طلب جارٍ في مسار أقل أولوية، حتى لا ينتظر طلب الحارس خلف طابور الفحص
+        if inflight is not None and inflight[0] <= priority:
+            self.stats['coalesced'] += 1
+            return await asyncio.shield(inflight[1])
+
+        task = asyncio.ensure_future(self._call(name, attr, args, kwargs, lane))
+        self._inflight[key] = (priority, task)
+        self.stats['requests'] += 1
+        try:
+            result = await asyncio.shield(task)
+        finally:
+            if self._inflight.get(key, (None, None))[1] is task: del self._inflight[key]
+        if self.freshness.get(name): self._recent[key] = (time.monotonic(), result)
+        return result
+
+    def duplicate_summary(self) -> str:
+        """'36/120 (30%)' — reads served without their own request."""
+        reads = self.stats['reads']
+        if not reads: return "N/A"
+        saved = self.stats['coalesced'] + self.stats['fresh_hits']
+        return f"{saved}/{reads} ({saved / reads:.0%})"
@@ -0,0 +1,516 @@
+# -*- coding: utf-8 -*-
+# =======================================================================================
+# --- 📐 Maestro Indicators (NumPy Kernels) 📐 ---
+# =======================================================================================
+#
+# نوى حسابية للمؤشرات تعمل مباشرة على مصفوفات NumPy بدون DataFrame.
+# كل نواة تقبل مصفوفة أحادية (شموع رمز واحد) أو ثنائية (رموز × شموع) وتحسب على المحور الأخير،
+# والقيم الناقصة (NaN) في بداية السلسلة تُعامل كشموع غير موجودة، مما يسمح بتكديس رموز بأطوال مختلفة.
+# التعريفات تطابق pandas_ta (EMA مبذورة بـ SMA، و RMA عبر ewm(adjust=True)).
+#
+# نوى الماسحات (bbands، kc، obv، macd، vwap، rsi، supertrend) تعمل على سلسلة رمز واحد (مصفوفات أحادية متصلة)
+# وتعيد {اسم العمود: مصفوفة} بنفس أسماء أعمدة pandas_ta، فتبقى الماسحات كما هي. العوديات (EMA، RMA، Supertrend)
+# تُحسب بحلقة على قوائم بايثون، وهي أسرع بكثير من np.where لكل شمعة أو من .iloc في pandas على 220 شمعة.
+#
+# IndicatorState: حالة تزايدية لكل رمز لمؤشرات الفلترة والماسحات (EMA، ATR، ADX، RSI، Supertrend، OBV، متوسط الحجم).
+# كل مؤشر عودي يتقدم بخطوة O(1) عند إغلاق شمعة جديدة، ومتوسط الحجم يحتفظ بنافذته في حلقة ثابتة الحجم.
+# عند فجوة في الشموع أو تعديل آخر شمعة مغلقة أو إعادة التشغيل تُعاد بناء الحالة من الشموع المتاحة،
+# فتساوي قيمها دائماً إعادة الحساب الكاملة بالنوى أعلاه على كل الشموع منذ آخر إعادة بناء.
+#
+# SupportLevelIndex: مستويات الدعم لرمز واحد (أدنى قاع في كل نافذة كاملة من الشموع المغلقة) في قائمة مرتبة،
+# تتقدم بشمعة عند كل إغلاق ويُبحث فيها عن أقرب دعم أسفل السعر بـ bisect.
+#
+# =======================================================================================
+
+import bisect
+import itertools
+import json
+import math
+import time
+from collections import Counter, deque
+
+import numpy as np
+
+OHLCV_FIELDS = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+
+
+def _first_valid_index(x: np.ndarray) -> np.ndarray:
+    valid = ~np.isnan(x)
+    return np.where(valid.any(axis=-1), valid.argmax(axis=-1), x.shape[-1])
+
+
+def _shift(x: np.ndarray, periods: int = 1) -> np.ndarray:
+    out = np.full_like(x, np.nan)
+    out[..., periods:] = x[..., :-periods]
+    return out
+
+
+def sma(x, length: int) -> np.ndarray:
+    """Simple moving average; a window only yields a value when all its bars exist (pandas rolling)."""
+    x = np.asarray(x, dtype=np.float64)
+    out = np.full_like(x, np.nan)
+    if x.shape[-1] < length:
+        return out
+    valid = ~np.isnan(x)
+    csum = np.cumsum(np.where(valid, x, 0.0), axis=-1)
+    ccount = np.cumsum(valid, axis=-1)
+    window_sum = csum[..., length - 1:].copy()
+    window_sum[..., 1:] -= csum[..., :-length]
+    window_count = ccount[..., length - 1:].copy()
+    window_count[..., 1:] -= ccount[..., :-length]
+    out[..., length - 1:] = np.where(window_count == length, window_sum / length, np.nan)
+    return out
+
+
+def ema(x, length: int) -> np.ndarray:
+    """pandas_ta EMA: seeded with the SMA of the first `length` bars, then ewm(adjust=False)."""
+    x = np.asarray(x, dtype=np.float64)
+    out = np.full_like(x, np.nan)
+    seed_at = _first_valid_index(x) + length - 1
+    seed = sma(x, length)
+    alpha = 2.0 / (length + 1)
+    state = np.full(x.shape[:-1], np.nan)
+    for t in range(x.shape[-1]):
+        state = np.where(seed_at == t, seed[..., t], alpha * x[..., t] + (1.0 - alpha) * state)
+        out[..., t] = state
+    return out
+
+
+def rma(x, length: int) -> np.ndarray:
+    """Wilder's moving average as pandas_ta computes it: ewm(alpha=1/length, min_periods=length, adjust=True)."""
+    x = np.asarray(x, dtype=np.float64)
+    out = np.full_like(x, np.nan)
+    decay = 1.0 - 1.0 / length
+    num = np.zeros(x.shape[:-1])
+    den = np.zeros(x.shape[:-1])
+    count = np.zeros(x.shape[:-1], dtype=np.int64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for t in range(x.shape[-1]):
+            xt = x[..., t]
+            valid = ~np.isnan(xt)
+            num = decay * num + np.where(valid, xt, 0.0)
+            den = decay * den + valid
+            count = count + valid
+            out[..., t] = np.where(count >= length, num / den, np.nan)
+    return out
+
+
+def true_range(high, low, close) -> np.ndarray:
+    high, low, close = (np.asarray(a, dtype=np.float64) for a in (high, low, close))
+    prev_close = _shift(close)
+    # np.maximum ينقل NaN، فتبقى أول شمعة لكل رمز بدون قيمة كما في pandas_ta
+    return np.maximum(np.maximum(high - low, np.abs(high - prev_close)), np.abs(low - prev_close))
+
+
+def atr(high, low, close, length: int = 14) -> np.ndarray:
+    """Average True Range with RMA smoothing (pandas_ta column ATRr_<length>)."""
+    return rma(true_range(high, low, close), length)
+
+
+def adx(high, low, close, length: int = 14, lensig: int = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Returns (ADX, DMP, DMN) with the pandas_ta definitions."""
+    high, low, close = (np.asarray(a, dtype=np.float64) for a in (high, low, close))
+    lensig = lensig or length
+    up = high - _shift(high)
+    dn = _shift(low) - low
+    missing = np.isnan(up) | np.isnan(dn)
+    pos = np.where(missing, np.nan, np.where((up > dn) & (up > 0), up, 0.0))
+    neg = np.where(missing, np.nan, np.where((dn > up) & (dn > 0), dn, 0.0))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        k = 100.0 / atr(high, low, close, length)
+        dmp = k * rma(pos, length)
+        dmn = k * rma(neg, length)
+        dx = 100.0 * np.abs(dmp - dmn) / (dmp + dmn)
+    return rma(dx, lensig), dmp, dmn
+
+
+# --- نوى الماسحات (سلسلة واحدة) ---
+def _ema_1d(x: np.ndarray, length: int, seed_start: int = None) -> np.ndarray:
+    """
+    pandas_ta EMA of one series: the mean of the `length` values from seed_start (NaNs skipped) seeds index
+    seed_start + length - 1, then ewm(adjust=False). seed_start defaults to the first valid value, like
+    pandas_ta does when it slices a series first (MACD signal); kc passes 0 because pandas_ta does not slice there.
+    """
+    n = x.shape[0]
+    out = np.full(n, np.nan)
+    if seed_start is None:
+        valid = np.flatnonzero(~np.isnan(x))
+        seed_start = int(valid[0]) if valid.size else n
+    seed_at = seed_start + length - 1
+    if seed_at >= n: return out
+    with np.errstate(invalid='ignore'):
+        y = float(np.nanmean(x[seed_start:seed_at + 1]))
+    alpha = 2.0 / (length + 1)
+    values = out.tolist()
+    values[seed_at] = y
+    for t, xt in enumerate(x[seed_at + 1:].tolist(), seed_at + 1):
+        y = alpha * xt + (1.0 - alpha) * y
+        values[t] = y
+    return np.asarray(values)
+
+
+def _rma_1d(x: np.ndarray, length: int) -> np.ndarray:
+    """ewm(alpha=1/length, min_periods=length, adjust=True) of one series with leading NaNs only."""
+    n = x.shape[0]
+    out = np.full(n, np.nan)
+    valid = np.flatnonzero(~np.isnan(x))
+    if valid.size < length: return out
+    start = int(valid[0])
+    decay = 1.0 - 1.0 / length
+    num = den = 0.0
+    values = out.tolist()
+    for t, xt in enumerate(x[start:].tolist(), start):
+        num = decay * num + xt
+        den = decay * den + 1.0
+        values[t] = num / den
+    out = np.asarray(values)
+    out[:start + length - 1] = np.nan
+    return out
+
+
+def _rolling_std(x: np.ndarray, length: int) -> np.ndarray:
+    out = np.full(x.shape[0], np.nan)
+    if x.shape[0] >= length:
+        out[length - 1:] = np.lib.stride_tricks.sliding_window_view(x, length).std(axis=-1)
+    return out
+
+
+def rsi(close: np.ndarray, length: int = 14) -> dict:
+    change = np.diff(close, prepend=np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        gains = _rma_1d(np.where(change < 0, 0.0, change), length)
+        losses = _rma_1d(np.where(change > 0, 0.0, change), length)
+        return {f"RSI_{length}": 100.0 * gains / (gains + np.abs(losses))}
+
+
+def bbands(close: np.ndarray, length: int = 5, std: float = 2.0) -> dict:
+    """pandas_ta bbands with its defaults (SMA basis, population standard deviation)."""
+    length, std = int(length), float(std)
+    mid = sma(close, length)
+    deviation = std * _rolling_std(close, length)
+    lower, upper = mid - deviation, mid + deviation
+    props = f"_{length}_{std}"
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return {f"BBL{props}": lower, f"BBM{props}": mid, f"BBU{props}": upper,
+                f"BBB{props}": 100.0 * (upper - lower) / mid, f"BBP{props}": (close - lower) / (upper - lower)}
+
+
+def kc(high: np.ndarray, low: np.ndarray, close: np.ndarray, length: int = 20, scalar: float = 2.0) -> dict:
+    """pandas_ta Keltner channels with its defaults (EMA basis, true-range band)."""
+    length, scalar = int(length), float(scalar)
+    basis = _ema_1d(close, length, seed_start=0)
+    band = _ema_1d(true_range(high, low, close), length, seed_start=0)
+    props = f"e_{length}_{scalar}"
+    return {f"KCL{props}": basis - scalar * band, f"KCB{props}": basis, f"KCU{props}": basis + scalar * band}
+
+
+def obv(close: np.ndarray, volume: np.ndarray) -> dict:
+    sign = np.sign(np.diff(close, prepend=np.nan))
+    sign[0] = 1.0
+    return {"OBV": np.cumsum(sign * volume)}
+
+
+def macd(close: np.ndarray, fast: int = 12, slow: int = 26, signal: int = 9) -> dict:
+    line = _ema_1d(close, fast) - _ema_1d(close, slow)
+    signal_line = _ema_1d(line, signal)
+    props = f"_{fast}_{slow}_{signal}"
+    return {f"MACD{props}": line, f"MACDh{props}": line - signal_line, f"MACDs{props}": signal_line}
+
+
+def vwap_daily(timestamp_ms: np.ndarray, high: np.ndarray, low: np.ndarray, close: np.ndarray, volume: np.ndarray) -> dict:
+    """VWAP anchored to each UTC day (pandas_ta vwap(anchor='D'))."""
+    day = timestamp_ms.astype(np.int64) // 86_400_000
+    starts = np.flatnonzero(np.r_[True, day[1:] != day[:-1]])
+    group_lengths = np.diff(np.r_[starts, day.shape[0]])
+
+    def grouped_cumsum(values):
+        total = np.cumsum(values)
+        offsets = np.r_[0.0, total[starts[1:] - 1]]
+        return total - np.repeat(offsets, group_lengths)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return {"VWAP_D": grouped_cumsum((high + low + close) / 3.0 * volume) / grouped_cumsum(volume)}
+
+
+def supertrend(high: np.ndarray, low: np.ndarray, close: np.ndarray, length: int = 7, multiplier: float = 3.0) -> dict:
+    length, multiplier = int(length), float(multiplier)
+    hl2 = (high + low) / 2.0
+    matr = multiplier * _rma_1d(true_range(high, low, close), length)
+    upper, lower, closes = (hl2 + matr).tolist(), (hl2 - matr).tolist(), close.tolist()
+    n = len(closes)
+    direction, trend = [1] * n, [np.nan] * n  # pandas_ta لا يعطي قيمة لأول شمعة
+    long, short = [np.nan] * n, [np.nan] * n
+    for i in range(1, n):
+        if closes[i] > upper[i - 1]:
+            direction[i] = 1
+        elif closes[i] < lower[i - 1]:
+            direction[i] = -1
+        else:
+            direction[i] = direction[i - 1]
+            if direction[i] > 0 and lower[i] < lower[i - 1]: lower[i] = lower[i - 1]
+            if direction[i] < 0 and upper[i] > upper[i - 1]: upper[i] = upper[i - 1]
+        if direction[i] > 0: trend[i] = long[i] = lower[i]
+        else: trend[i] = short[i] = upper[i]
+    props = f"_{length}_{multiplier}"
+    return {f"SUPERT{props}": np.asarray(trend), f"SUPERTd{props}": np.asarray(direction),
+            f"SUPERTl{props}": np.asarray(long), f"SUPERTs{props}": np.asarray(short)}
+
+
+# --- الحالة التزايدية لكل رمز ---
+INCREMENTAL_HISTORY = 64  # عدد القيم المغلقة المحفوظة لكل عمود (نوافذ الماسحات تقرأ منها)
+
+
+def _rma_step(s: dict, key: str, x: float, length: int) -> float:
+    """One step of `rma` (NaN inputs are skipped but still decay the sums)."""
+    num, den, count = s.get(key, (0.0, 0.0, 0))
+    decay = 1.0 - 1.0 / length
+    valid = x == x
+    num, den, count = decay * num + (x if valid else 0.0), decay * den + valid, count + valid
+    s[key] = (num, den, count)
+    return num / den if count >= length else math.nan
+
+
+def _ema_step(s: dict, key: str, x: float, length: int) -> float:
+    """One step of the pandas_ta EMA: the mean of the first `length` values seeds it, then ewm(adjust=False)."""
+    value, count, total = s.get(key, (math.nan, 0, 0.0))
+    if count < length:
+        count, total = count + 1, total + x
+        if count == length: value = total / length
+    else:
+        alpha = 2.0 / (length + 1)
+        value = alpha * x + (1.0 - alpha) * value
+    s[key] = (value, count, total)
+    return value
+
+
+def _ratio(num: float, den: float) -> float:
+    return num / den if den else math.nan
+
+
+class IndicatorState:
+    """
+    Incremental indicators of one symbol over its closed candles (every row but the last, still-forming one).
+    config: ema_period, atr_periods, adx_length, rsi_lengths, volume_sma_length, supertrend (length, multiplier), history.
+    Columns use the kernels' names (EMA_200, ATRr_14, ADX_14, RSI_14, OBV, VOLUME_SMA_20, SUPERT*_10_3.0).
+    """
+
+    def __init__(self, config: dict, timeframe_ms: int):
+        self.config = config
+        self.timeframe_ms = timeframe_ms
+        self.last_used = time.monotonic()
+        self._reset()
+
+    def _reset(self):
+        self.last_ts, self.last_row, self.bars = None, None, 0
+        self.history = {}
+        self._s = {}
+        self._volume_window = np.zeros(self.config['volume_sma_length'])
+        self._preview = None  # (forming row, values)
+
+    def update(self, ohlcv) -> bool:
+        """Advances over the new closed candles of `ohlcv`; returns True when the state had to be rebuilt."""
+        closed = np.asarray(ohlcv, dtype=np.float64)[:-1, :len(OHLCV_FIELDS)]
+        self._preview = None
+        if self.last_ts is not None and len(closed):
+            at = int(np.searchsorted(closed[:, 0], self.last_ts))
+            if at < len(closed) and closed[at, 0] == self.last_ts and np.array_equal(closed[at], self.last_row):
+                new = closed[at + 1:]
+                # شموع متتالية بلا فجوات بعد آخر شمعة معروفة فقط؛ أي شيء آخر يعني إعادة البناء
+                if not len(new) or np.all(np.diff(closed[at:, 0]) == self.timeframe_ms):
+                    for row in new.tolist(): self._push(row)
+                    return False
+        self._reset()
+        for row in closed.tolist(): self._push(row)
+        return True
+
+    def _push(self, row: list):
+        values = self._advance(self._s, row, commit=True)
+        history_length = self.config.get('history', INCREMENTAL_HISTORY)
+        for name, value in values.items():
+            column = self.history.get(name)
+            if column is None: column = self.history[name] = deque(maxlen=history_length)
+            column.append(value)
+        self.last_ts, self.last_row, self.bars = row[0], np.asarray(row), self.bars + 1
+
+    def _advance(self, s: dict, row: list, commit: bool) -> dict:
+        _, _, high, low, close, volume = row
+        cfg, out = self.config, {}
+        prev_high, prev_low, prev_close = s.get('prev', (math.nan, math.nan, math.nan))
+        first = self.bars == 0
+        tr = math.nan if first else max(high - low, abs(high - prev_close), abs(low - prev_close))
+
+        ema_period = cfg['ema_period']
+        out[f"EMA_{ema_period}"] = _ema_step(s, 'ema', close, ema_period)
+        for length in cfg['atr_periods']:
+            out[f"ATRr_{length}"] = _rma_step(s, f'atr_{length}', tr, length)
+
+        length = cfg['adx_length']
+        up, dn = high - prev_high, prev_low - low
+        pos = math.nan if first else (up if up > dn and up > 0 else 0.0)
+        neg = math.nan if first else (dn if dn > up and dn > 0 else 0.0)
+        k = _ratio(100.0, _rma_step(s, 'adx_atr', tr, length))
+        dmp, dmn = k * _rma_step(s, 'adx_pos', pos, length), k * _rma_step(s, 'adx_neg', neg, length)
+        out[f"ADX_{length}"] = _rma_step(s, 'adx', _ratio(100.0 * abs(dmp - dmn), dmp + dmn), length)
+
+        change = math.nan if first else close - prev_close
+        for length in cfg['rsi_lengths']:
+            gains = _rma_step(s, f'rsi_gain_{length}', 0.0 if change < 0 else change, length)
+            losses = _rma_step(s, f'rsi_loss_{length}', 0.0 if change > 0 else change, length)
+            out[f"RSI_{length}"] = _ratio(100.0 * gains, gains + abs(losses))
+
+        out["OBV"] = s['obv'] = s.get('obv', 0.0) + (1.0 if first else (change > 0) - (change < 0)) * volume
+
+        # متوسط الحجم: نافذة ثابتة الحجم في حلقة، والمجموع يُعاد حسابه منها فلا تتراكم أخطاء الطرح
+        window, n = self._volume_window, cfg['volume_sma_length']
+        slot = self.bars % n
+        total = window.sum() - window[slot] + volume
+        if commit: window[slot] = volume
+        out[f"VOLUME_SMA_{n}"] = total / n if self.bars + 1 >= n else math.nan
+
+        length, multiplier = cfg['supertrend']
+        length, multiplier = int(length), float(multiplier)
+        hl2, matr = (high + low) / 2.0, multiplier * _rma_step(s, 'st_atr', tr, length)
+        upper, lower = hl2 + matr, hl2 - matr
+        if first:
+            direction, trend = 1, math.nan
+        else:
+            prev_upper, prev_lower, direction = s['st']
+            if close > prev_upper: direction = 1
+            elif close < prev_lower: direction = -1
+            else:
+                if direction > 0 and lower < prev_lower: lower = prev_lower
+                if direction < 0 and upper > prev_upper: upper = prev_upper
+            trend = lower if direction > 0 else upper
+        s['st'] = (upper, lower, direction)
+        props = f"_{length}_{multiplier}"
+        out[f"SUPERT{props}"], out[f"SUPERTd{props}"] = trend, float(direction)
+        out[f"SUPERTl{props}"] = trend if not first and direction > 0 else math.nan
+        out[f"SUPERTs{props}"] = trend if not first and direction < 0 else math.nan
+
+        s['prev'] = (high, low, close)
+        return out
+
+    def value(self, name: str, back: int = 0) -> float:
+        """Value at the last closed candle (back=0) or `back` closed candles before it; NaN when unknown."""
+        column = self.history.get(name)
+        return column[-1 - back] if column is not None and back < len(column) else math.nan
+
+    def preview(self, forming_row) -> dict:
+        """Values for the still-forming candle, without advancing the state."""
+        forming_row = [float(v) for v in forming_row[:len(OHLCV_FIELDS)]]
+        if self._preview is None or self._preview[0] != forming_row:
+            s = dict(self._s)
+            values = self._advance(s, forming_row, commit=False)
+            self._preview = (forming_row, values)
+        return self._preview[1]
+
+    def frame_columns(self, names: list, n_rows: int, forming_row) -> dict | None:
+        """
+        Full-length columns for a scanners' frame of n_rows candles: NaN beyond the kept history, the closed values,
+        then the forming candle's preview. None when the state does not hold every requested column.
+        """
+        if self.bars == 0 or not all(name in self.history for name in names): return None
+        preview = self.preview(forming_row)
+        columns = {}
+        for name in names:
+            column = np.full(n_rows, np.nan)
+            closed = list(self.history[name])[-(n_rows - 1):] if n_rows > 1 else []
+            if closed: column[n_rows - 1 - len(closed):n_rows - 1] = closed
+            column[-1] = preview[name]
+            columns[name] = column
+        return columns
+
+
+class IndicatorStateCache:
+    """One IndicatorState per symbol; a state whose config changed is replaced."""
+
+    def __init__(self, timeframe_ms: int):
+        self.timeframe_ms = timeframe_ms
+        self._states = {}
+        self.stats = Counter()
+
+    def update(self, symbol: str, ohlcv, config: dict) -> IndicatorState:
+        state = self._states.get(symbol)
+        if state is None or state.config != config:
+            state = self._states[symbol] = IndicatorState(config, self.timeframe_ms)
+        self.stats['rebuilds' if state.update(ohlcv) else 'incremental_updates'] += 1
+        state.last_used = time.monotonic()
+        return state
+
+    def get(self, symbol: str) -> IndicatorState | None:
+        return self._states.get(symbol)
+
+    def evict_idle(self, max_idle_seconds: float):
+        cutoff = time.monotonic() - max_idle_seconds
+        for symbol in [s for s, state in self._states.items() if state.last_used < cutoff]:
+            del self._states[symbol]
+
+    def __len__(self):
+        return len(self._states)
+
+
+class SupportLevelIndex:
+    """
+    Support levels of one symbol: the lowest low of every complete `window`-candle window over the last `lookback`
+    closed candles (the non-NaN values of rolling(window).min() on them), kept sorted for bisect lookups.
+    Each closed candle adds one window and drops the oldest, so updates cost O(window + lookback) at worst.
+    """
+
+    def __init__(self, timeframe_ms: int, lookback: int = 100, window: int = 10):
+        self.timeframe_ms, self.lookback, self.window = timeframe_ms, lookback, window
+        self.lows = deque()
+        self.window_lows = deque()  # أدنى قاع لكل نافذة بترتيب بدايتها، لمعرفة المستوى الخارج
+        self.levels = []
+        self.last_ts = None  # وقت فتح آخر شمعة مغلقة مضافة
+
+    def extend(self, rows) -> bool:
+        """
+        Appends closed candles (ccxt rows, oldest first) newer than last_ts.
+        Returns False, changing nothing, when they do not continue the index without a gap.
+        """
+        rows = [row for row in rows if self.last_ts is None or int(row[0]) > self.last_ts]
+        if not rows: return True
+        ts = [int(row[0]) for row in rows]
+        if self.last_ts is not None and ts[0] != self.last_ts + self.timeframe_ms: return False
+        if any(b - a != self.timeframe_ms for a, b in zip(ts, ts[1:])): return False
+        for row in rows: self._push(float(row[3]))
+        self.last_ts = ts[-1]
+        return True
+
+    def reset(self, rows):
+        """Rebuilds the index from closed candles, keeping only the contiguous run that ends with the newest one."""
+        self.lows.clear(); self.window_lows.clear(); self.levels.clear(); self.last_ts = None
+        start = len(rows) - 1
+        while start > 0 and int(rows[start][0]) - int(rows[start - 1][0]) == self.timeframe_ms: start -= 1
+        self.extend(rows[start:])
+
+    def _push(self, low: float):
+        if len(self.lows) == self.lookback:
+            self.lows.popleft()
+            level = self.window_lows.popleft()  # النافذة التي بدأت بالقاع الخارج
+            del self.levels[bisect.bisect_left(self.levels, level)]
+        self.lows.append(low)
+        if len(self.lows) >= self.window:
+            level = min(itertools.islice(reversed(self.lows), self.window))
+            self.window_lows.append(level)
+            bisect.insort(self.levels, level)
+
+    def nearest_below(self, price: float):
+        """Highest support strictly below `price`, or None."""
+        i = bisect.bisect_left(self.levels, price)
+        return self.levels[i - 1] if i else None
+
+    def __len__(self):
+        return len(self.lows)
+
+    def to_record(self) -> tuple:
+        """(last_ts, lows as JSON) — enough to rebuild the index after a restart."""
+        return self.last_ts, json.dumps(list(self.lows))
+
+    @classmethod
+    def from_record(cls, last_ts: int, lows_json: str, timeframe_ms: int, lookback: int = 100, window: int = 10):
+        index = cls(timeframe_ms, lookback, window)
+        lows = json.loads(lows_json)[-lookback:]
+        first_ts = last_ts - (len(lows) - 1) * timeframe_ms
+        index.extend([[first_ts + i * timeframe_ms, 0.0, 0.0, low] for i, low in enumerate(lows)])
+        return index
@@ -0,0 +1,571 @@
+# -*- coding: utf-8 -*-
+# =======================================================================================
+# --- 🗄️ Maestro Market Data (OHLCV Cache) 🗄️ ---
+# =======================================================================================
+#
+# ذاكرة مؤقتة حلقية (Ring Buffer) لآخر N شمعة لكل (رمز، إطار زمني).
+#   - أول طلب يجلب التاريخ كاملاً (مع تقسيم الصفحات عند تجاوز حد المنصة).
+#   - الطلبات التالية تجلب فقط الشموع الجديدة باستخدام since= وتستبدل الشمعة التي ما زالت قيد التشكل.
+#   - عند اكتشاف فجوة (شمعة مفقودة أو تأخر طويل) يتم الرجوع إلى الجلب الكامل.
+#   - الأطر الأكبر من الإطار الأساسي (مثل 1h و 4h من 15m) تُبنى محلياً بالتجميع في حاويات UTC بدلاً من طلبها من المنصة.
+#   - التخزين عمودي مضغوط (OHLCVRing): أوقات int64 وكتلة أسعار/أحجام float64 (أو float32)، بدلاً من قوائم أرقام بايثون؛
+#     والـ DataFrame يُبنى فقط عند طلبه عبر get_frame.
+#
+# ذاكرة حدود الشموع (CandleBoundaryCache): قيم مشتقة من الشموع المغلقة تبقى صالحة حتى إغلاق الشمعة التالية
+# في إطارها الزمني، بدلاً من مدة صلاحية (TTL) ثابتة.
+#
+# لقطة السوق (MarketUniverse): أعمدة NumPy مضغوطة لبيانات fetch_tickers بدلاً من قواميس ccxt الكاملة (مع info الخام)،
+# مع أعلام بنيوية تُحسب مرة واحدة لكل رمز، وترتيب حجم يُحدث مع كل لقطة، وأقنعة أهلية محفوظة لكل مجموعة فلاتر.
+#
+# ذاكرة دفاتر الأوامر (OrderBookCache): قمة الدفتر لكل رمز (أفضل عرض وطلب، السبريد، القيمة التراكمية لمستويات العرض)
+# تُغذى من بث books5/bbo-tbt أو من طلب REST احتياطي، مع وقت الاستلام لرفض البيانات القديمة،
+# أو الأقل عمقاً من المطلوب (رادار الحيتان يحتاج 10 مستويات فيُخدم بطلب REST بعمق 10).
+#
+# =======================================================================================
+
+import asyncio
+import logging
+import time
+import numpy as np
+import pandas as pd
+from collections import defaultdict, Counter, OrderedDict
+
+logger = logging.getLogger(__name__)
+
+TIMEFRAME_UNITS_MS = {'m': 60_000, 'h': 3_600_000, 'd': 86_400_000, 'w': 604_800_000}
+OHLCV_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+
+
+def timeframe_to_ms(timeframe: str) -> int:
+    return int(timeframe[:-1]) * TIMEFRAME_UNITS_MS[timeframe[-1]]
+
+
+def candle_open_ms(timeframe: str, ts_ms: int) -> int:
+    """Open time of the UTC-aligned candle containing ts_ms (weekly candles open on Monday, the epoch is a Thursday)."""
+    tf_ms = timeframe_to_ms(timeframe)
+    offset = 4 * TIMEFRAME_UNITS_MS['d'] if timeframe[-1] == 'w' else 0
+    return (ts_ms - offset) // tf_ms * tf_ms + offset
+
+
+def now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def ohlcv_frame(ohlcv) -> pd.DataFrame:
+    """DataFrame with OHLCV_COLUMNS (int64 timestamps, float64 values) from ccxt rows or an (n × 6) array."""
+    data = np.asarray(ohlcv, dtype=np.float64).reshape(-1, len(OHLCV_COLUMNS))
+    df = pd.DataFrame(data[:, 1:], columns=OHLCV_COLUMNS[1:])
+    df.insert(0, 'timestamp', data[:, 0].astype(np.int64))
+    return df
+
+
+def resample_ohlcv(rows, timeframe: str) -> list:
+    """
+    Aggregates ccxt candles into UTC-aligned `timeframe` buckets (first open, max high, min low, last close, summed volume).
+    An incomplete first bucket is dropped; the last bucket is kept as the forming candle, like the exchange returns it.
+    """
+    resampled = resample_ohlcv_array(rows, timeframe)
+    return [[int(row[0]), *row[1:]] for row in resampled.tolist()]
+
+
+def resample_ohlcv_array(rows, timeframe: str) -> np.ndarray:
+    """resample_ohlcv returning an (n × 6) float64 array."""
+    data = np.asarray(rows, dtype=np.float64)
+    if data.size == 0: return np.empty((0, len(OHLCV_COLUMNS)))
+    ts = data[:, 0].astype(np.int64)
+    buckets = candle_open_ms(timeframe, ts)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(data)] - 1
+    resampled = np.column_stack([
+        buckets[starts], data[starts, 1], np.maximum.reduceat(data[:, 2], starts),
+        np.minimum.reduceat(data[:, 3], starts), data[ends, 4], np.add.reduceat(data[:, 5], starts),
+    ])
+    if ts[0] != buckets[0]: resampled = resampled[1:]
+    return resampled
+
+
+class OHLCVRing:
+    """
+    Fixed-capacity candle buffer, oldest first: int64 open times plus one contiguous (capacity × 5) block of
+    open/high/low/close/volume. Appending to a full buffer shifts it by memmove, so the live rows stay contiguous.
+    """
+    __slots__ = ('ts', 'values', 'size')
+
+    def __init__(self, maxlen: int, dtype=np.float64):
+        self.ts = np.zeros(maxlen, dtype=np.int64)
+        self.values = np.zeros((maxlen, len(OHLCV_COLUMNS) - 1), dtype=dtype)
+        self.size = 0
+
+    @property
+    def maxlen(self) -> int:
+        return self.ts.shape[0]
+
+    def __len__(self):
+        return self.size
+
+    def ts_at(self, index: int) -> int:
+        """Open time of the candle at a (negative or positive) position among the stored ones."""
+        return int(self.ts[:self.size][index])
+
+    def set(self, index: int, candle):
+        position = range(self.size)[index]
+        self.ts[position] = candle[0]
+        self.values[position] = candle[1:6]
+
+    def extend(self, candles):
+        candles = np.asarray(candles, dtype=np.float64).reshape(-1, len(OHLCV_COLUMNS))[-self.maxlen:]
+        n = candles.shape[0]
+        overflow = self.size + n - self.maxlen
+        if overflow > 0:
+            keep = self.size - overflow
+            self.ts[:keep] = self.ts[overflow:self.size]
+            self.values[:keep] = self.values[overflow:self.size]
+            self.size = keep
+        self.ts[self.size:self.size + n] = candles[:, 0]
+        self.values[self.size:self.size + n] = candles[:, 1:]
+        self.size += n
+
+    def append(self, candle):
+        self.extend([candle])
+
+    def pop(self):
+        self.size -= 1
+
+    def tail(self, n: int) -> np.ndarray:
+        """Last `n` candles as a new (n × 6) float64 array."""
+        start = max(0, self.size - n)
+        out = np.empty((self.size - start, len(OHLCV_COLUMNS)))
+        out[:, 0] = self.ts[start:self.size]
+        out[:, 1:] = self.values[start:self.size]
+        return out
+
+    @property
+    def nbytes(self) -> int:
+        return self.ts.nbytes + self.values.nbytes
+
+
+class OHLCVCache:
+    MAX_REQUEST_LIMIT = 300  # أقصى عدد شموع تعيده OKX في الطلب الواحد
+
+    def __init__(self, fetcher, capacity: int = 300, base_timeframe: str = None, max_base_bars: int = 1000, dtype: str = 'float64'):
+        """
+        fetcher: coroutine function (symbol, timeframe, since, limit) -> list of ccxt candles, or None on failure.
+        capacity: minimum number of candles kept per (symbol, timeframe).
+        base_timeframe: when set, larger multiples of it are resampled from the base series as long as
+                        that needs at most `max_base_bars` base candles; deeper requests are fetched natively.
+        dtype: storage type of prices and volumes ('float64' keeps exchange precision; 'float32' halves the memory
+               but rounds prices to ~7 significant digits, and signal entry/SL/TP prices are read from these candles).
+        """
+        self._fetcher = fetcher
+        self.capacity = capacity
+        self.dtype = np.dtype(dtype)
+        self.base_timeframe = base_timeframe
+        self.max_base_bars = max_base_bars
+        self._buffers = {}
+        self._refreshed_at = {}
+        self._accessed_at = {}
+        self._exhausted = set()  # رموز تاريخها أقصر من سعة الذاكرة (عملات مدرجة حديثاً)
+        self._locks = defaultdict(asyncio.Lock)
+        self.stats = Counter()
+
+    async def get(self, symbol: str, timeframe: str, limit: int, max_age: float = 0.0):
+        """
+        Returns the last `limit` candles (ccxt format, oldest first), or None if the exchange could not be reached.
+        Candles refreshed less than `max_age` seconds ago are served without any request.
+        """
+        candles = await self.get_array(symbol, timeframe, limit, max_age)
+        if candles is None: return None
+        return [[int(row[0]), *row[1:]] for row in candles.tolist()]
+
+    async def get_frame(self, symbol: str, timeframe: str, limit: int, max_age: float = 0.0):
+        """Same candles as get() as a DataFrame (see ohlcv_frame), built only for consumers that need one."""
+        candles = await self.get_array(symbol, timeframe, limit, max_age)
+        return None if candles is None else ohlcv_frame(candles)
+
+    async def get_array(self, symbol: str, timeframe: str, limit: int, max_age: float = 0.0):
+        """Same candles as get() as an (n × 6) float64 array, without building Python lists."""
+        base_bars = self._base_bars_for(timeframe, limit)
+        if base_bars:
+            base_candles = await self.get_array(symbol, self.base_timeframe, base_bars, max_age=max_age)
+            if base_candles is None: return None
+            self.stats['resampled'] += 1
+            return resample_ohlcv_array(base_candles, timeframe)[-limit:]
+
+        key = (symbol, timeframe)
+        async with self._locks[key]:
+            self._accessed_at[key] = time.time()
+            buffer = self._buffers.get(key)
+            has_depth = buffer is not None and (len(buffer) >= limit or (key in self._exhausted and buffer.maxlen >= limit))
+            if has_depth and time.time() - self._refreshed_at[key] < max_age:
+                self.stats['hits'] += 1
+            elif not has_depth:
+                if not await self._full_fetch(key, max(limit, self.capacity)): return None
+            else:
+                delta_ok = await self._delta_fetch(key)
+                if delta_ok is None: return None
+                if not delta_ok and not await self._full_fetch(key, buffer.maxlen): return None
+            return self._buffers[key].tail(limit)
+
+    def _base_bars_for(self, timeframe: str, limit: int) -> int:
+        """Number of base candles needed to resample `limit` candles of `timeframe`, or 0 if it must be fetched natively."""
+        if not self.base_timeframe or timeframe == self.base_timeframe: return 0
+        base_ms, tf_ms = timeframe_to_ms(self.base_timeframe), timeframe_to_ms(timeframe)
+        if tf_ms <= base_ms or tf_ms % base_ms: return 0
+        base_bars = (limit + 1) * (tf_ms // base_ms)  # حاوية إضافية لأن أول حاوية قد تكون ناقصة
+        return base_bars if base_bars <= self.max_base_bars else 0
+
+    async def _full_fetch(self, key, capacity: int) -> bool:
+        symbol, timeframe = key
+        if capacity <= self.MAX_REQUEST_LIMIT:
+            rows = await self._fetcher(symbol, timeframe, None, capacity)
+            self.stats['requests'] += 1
+        else:
+            rows = await self._paginated_fetch(symbol, timeframe, capacity)
+        if rows is None:
+            self.stats['errors'] += 1
+            return False
+        buffer = OHLCVRing(capacity, self.dtype)
+        buffer.extend(sorted(rows, key=lambda r: r[0]))
+        self._buffers[key] = buffer
+        self._refreshed_at[key] = time.time()
+        if len(buffer) < capacity: self._exhausted.add(key)
+        else: self._exhausted.discard(key)
+        self.stats['full_fetches'] += 1
+        self.stats['candles_downloaded'] += len(rows)
+        return True
+
+    async def _paginated_fetch(self, symbol: str, timeframe: str, capacity: int):
+        tf_ms = timeframe_to_ms(timeframe)
+        current_open = candle_open_ms(timeframe, now_ms())
+        cursor = current_open - (capacity - 1) * tf_ms
+        rows = []
+        while cursor <= current_open:
+            page = await self._fetcher(symbol, timeframe, cursor, self.MAX_REQUEST_LIMIT)
+            self.stats['requests'] += 1
+            if page is None: return None
+            page = [r for r in page if r[0] >= cursor]
+            if not page:
+                cursor += self.MAX_REQUEST_LIMIT * tf_ms  # نافذة قبل إدراج العملة
+                continue
+            rows.extend(page)
+            cursor = page[-1][0] + tf_ms
+        return rows
+
+    async def _delta_fetch(self, key):
+        """True when the buffer was extended, False when a gap forces a full refetch, None on request failure."""
+        symbol, timeframe = key
+        buffer = self._buffers[key]
+        tf_ms = timeframe_to_ms(timeframe)
+        last_ts = buffer.ts_at(-1)
+        current_open = candle_open_ms(timeframe, now_ms())
+        expected = max(1, (current_open - last_ts) // tf_ms + 1)
+        if expected > min(self.MAX_REQUEST_LIMIT, buffer.maxlen):
+            self.stats['gaps'] += 1
+            return False
+
+        rows = await self._fetcher(symbol, timeframe, last_ts, expected)
+        self.stats['requests'] += 1
+        if rows is None:
+            self.stats['errors'] += 1
+            return None
+        rows = sorted((r for r in rows if r[0] >= last_ts), key=lambda r: r[0])
+        if rows:
+            if rows[0][0] != last_ts or any(b[0] - a[0] != tf_ms for a, b in zip(rows, rows[1:])):
+                self.stats['gaps'] += 1
+                return False
+            buffer.pop()  # الشمعة الأخيرة كانت قيد التشكل، نستبدلها بنسختها الحالية
+            buffer.extend(rows)
+        self._refreshed_at[key] = time.time()
+        self.stats['delta_fetches'] += 1
+        self.stats['candles_downloaded'] += len(rows)
+        return True
+
+    def apply_stream_candle(self, symbol: str, timeframe: str, candle: list, confirmed: bool = False) -> bool:
+        """
+        Merges a candle pushed over WebSocket into the buffer, keeping it fresh without REST requests.
+        When the candle is confirmed (closed), a flat placeholder for the next candle is appended so the closed
+        candle sits at index -2, exactly like a REST response right after the close; real pushes replace it.
+        Returns False when the candle cannot be merged (no buffer yet, or a gap after which the buffer is dropped).
+        """
+        key = (symbol, timeframe)
+        buffer = self._buffers.get(key)
+        if buffer is None: return False
+        if key in self._locks and self._locks[key].locked(): return True  # طلب REST جارٍ سيجلب نفس البيانات
+        tf_ms = timeframe_to_ms(timeframe)
+        ts, last_ts = candle[0], buffer.ts_at(-1)
+        if ts == last_ts: buffer.set(-1, candle)
+        elif ts == last_ts + tf_ms: buffer.append(candle)
+        elif len(buffer) > 1 and ts == buffer.ts_at(-2): buffer.set(-2, candle)
+        elif ts < last_ts: return True
+        else:
+            self.stats['gaps'] += 1
+            self._drop(key)
+            return False
+        if confirmed and buffer.ts_at(-1) == ts:
+            close = candle[4]
+            buffer.append([ts + tf_ms, close, close, close, close, 0.0])
+        self._refreshed_at[key] = time.time()
+        self.stats['stream_updates'] += 1
+        return True
+
+    def evict_idle(self, max_idle_seconds: float):
+        """Drops buffers nobody asked for within `max_idle_seconds` (e.g. symbols that left the scan universe)."""
+        cutoff = time.time() - max_idle_seconds
+        for key in [k for k, t in self._accessed_at.items() if t < cutoff]:
+            if key in self._locks and self._locks[key].locked(): continue
+            self._drop(key)
+
+    def _drop(self, key):
+        for store in (self._buffers, self._refreshed_at, self._accessed_at, self._locks):
+            store.pop(key, None)
+        self._exhausted.discard(key)
+
+    def memory_bytes(self) -> int:
+        """Bytes held by the candle arrays of all buffers (allocated capacity, not just filled rows)."""
+        return sum(buffer.nbytes for buffer in self._buffers.values())
+
+    def __len__(self):
+        return len(self._buffers)
+
+
+class CandleBoundaryCache:
+    def __init__(self):
+        self._entries = {}
+
+    def get(self, symbol: str, timeframe: str):
+        """Returns the stored value while no new candle of `timeframe` has opened since it was computed, else None."""
+        key = (symbol, timeframe)
+        entry = self._entries.get(key)
+        if entry is None: return None
+        if entry[0] != candle_open_ms(timeframe, now_ms()):
+            del self._entries[key]
+            return None
+        return entry[1]
+
+    def set(self, symbol: str, timeframe: str, value, last_candle_open: int):
+        """
+        last_candle_open: open time of the newest (forming) candle the value was derived from.
+        Values computed from data that does not include the current candle yet are never served.
+        """
+        self._entries[(symbol, timeframe)] = (last_candle_open, value)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class ScanVerdictCache:
+    """
+    Bounded LRU of scan verdicts keyed by (symbol, last closed candle open, settings fingerprint).
+    A verdict is the signal dict or the rejection reason; entries of past candles simply age out.
+    """
+
+    def __init__(self, max_entries: int = 5000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.stats = Counter()
+
+    def get(self, key):
+        verdict = self._entries.get(key)
+        if verdict is None:
+            self.stats['misses'] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats['hits'] += 1
+        return verdict
+
+    def set(self, key, verdict):
+        self._entries[key] = verdict
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SymbolQuarantine:
+    """
+    Backoff registry of symbols that keep failing, per (symbol, error class). Each consecutive failure of a class
+    doubles the time the symbol is skipped (base × 2^(strikes-1), capped); a success clears only the classes it proves fixed.
+    """
+
+    def __init__(self):
+        self._entries = defaultdict(dict)  # symbol -> {error_class: [strikes, until, detail]}
+        self.stats = Counter()
+
+    def record_failure(self, symbol: str, error_class: str, base_seconds: float, max_seconds: float, detail: str = "") -> float:
+        """Registers a failure and returns the backoff (seconds) the symbol is now quarantined for."""
+        entry = self._entries[symbol].setdefault(error_class, [0, 0.0, ""])
+        entry[0] += 1
+        backoff = min(max_seconds, base_seconds * 2 ** (entry[0] - 1))
+        entry[1], entry[2] = time.time() + backoff, detail[:200]
+        self.stats[error_class] += 1
+        return backoff
+
+    def record_success(self, symbol: str, error_classes=None):
+        """Clears the given error classes of the symbol (all of them when None)."""
+        classes = self._entries.get(symbol)
+        if not classes: return
+        for error_class in list(classes) if error_classes is None else error_classes:
+            if classes.pop(error_class, None) is not None:
+                self.stats['released'] += 1
+        if not classes: del self._entries[symbol]
+
+    def is_quarantined(self, symbol: str) -> bool:
+        classes = self._entries.get(symbol)
+        if not classes: return False
+        now = time.time()
+        return any(until > now for _, until, _ in classes.values())
+
+    def active(self) -> list:
+        """(symbol, error_class, strikes, seconds_left, detail) of running backoffs, longest first."""
+        now = time.time()
+        rows = [(symbol, error_class, strikes, until - now, detail)
+                for symbol, classes in self._entries.items()
+                for error_class, (strikes, until, detail) in classes.items() if until > now]
+        return sorted(rows, key=lambda row: -row[3])
+
+    def evict_expired(self, forget_after_seconds: float):
+        """Forgets strikes whose backoff ended more than `forget_after_seconds` ago (symbols that left the scan)."""
+        cutoff = time.time() - forget_after_seconds
+        for symbol in list(self._entries):
+            classes = self._entries[symbol]
+            for error_class in [c for c, (_, until, _) in classes.items() if until < cutoff]:
+                del classes[error_class]
+            if not classes: del self._entries[symbol]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class MarketUniverse:
+    """
+    Columnar snapshot of the ticker universe. Rows are assigned once per symbol and updated in place;
+    symbols missing from a snapshot are flagged stale instead of removed, so row ids stay stable.
+    """
+    FIELDS = ('quoteVolume', 'bid', 'ask', 'high', 'low', 'open', 'last', 'percentage')
+    FLAG_USDT = 1
+    FLAG_EXCLUDED_NAME = 2  # مشتقات ورموز الرافعة (-SWAP، UP، DOWN، 3L، 3S)
+    FLAG_INACTIVE = 4
+    FLAG_STALE = 8
+    EXCLUDED_NAME_PARTS = ('-SWAP', 'UP', 'DOWN', '3L', '3S')
+
+    def __init__(self, initial_capacity: int = 1024):
+        self.symbols = []
+        self.bases = []
+        self._index = {}
+        self.values = np.full((initial_capacity, len(self.FIELDS)), np.nan)
+        self.flags = np.zeros(initial_capacity, dtype=np.uint8)
+        self._ranking = np.empty(0, dtype=np.int64)
+        self._eligible_cache = {}
+        self.updated_at = 0.0
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def _add_symbol(self, symbol: str) -> int:
+        row = len(self.symbols)
+        if row == len(self.flags):
+            self.values = np.vstack([self.values, np.full_like(self.values, np.nan)])
+            self.flags = np.concatenate([self.flags, np.zeros_like(self.flags)])
+        self.symbols.append(symbol)
+        self.bases.append(symbol.split('/')[0])
+        self._index[symbol] = row
+        flags = 0
+        if 'USDT' in symbol: flags |= self.FLAG_USDT
+        if any(part in symbol for part in self.EXCLUDED_NAME_PARTS): flags |= self.FLAG_EXCLUDED_NAME
+        self.flags[row] = flags
+        return row
+
+    def update(self, tickers: dict):
+        """Merges a fetch_tickers() result; only new symbols pay for the string checks."""
+        n_before = len(self.symbols)
+        seen = np.zeros(n_before, dtype=bool)
+        for symbol, ticker in tickers.items():
+            row = self._index.get(symbol)
+            if row is None: row = self._add_symbol(symbol)
+            elif row < n_before: seen[row] = True
+            self.values[row] = [ticker.get(field) if ticker.get(field) is not None else np.nan for field in self.FIELDS]
+            self.flags[row] &= ~np.uint8(self.FLAG_INACTIVE | self.FLAG_STALE)
+            if not ticker.get('active', True): self.flags[row] |= self.FLAG_INACTIVE
+        self.flags[:n_before][~seen] |= self.FLAG_STALE
+        volume = np.nan_to_num(self.values[:len(self.symbols), 0], nan=0.0)
+        self._ranking = np.argsort(-volume, kind='stable')
+        self._eligible_cache.clear()
+        self.updated_at = time.time()
+
+    def _ranked_eligible(self, min_quote_volume: float, blacklist) -> np.ndarray:
+        """Row ids passing the static filters, by descending quote volume (cached until the next update)."""
+        key = (min_quote_volume, frozenset(blacklist))
+        ranked = self._eligible_cache.get(key)
+        if ranked is None:
+            n = len(self.symbols)
+            flags = self.flags[:n]
+            mask = ((flags & self.FLAG_USDT) != 0) & ((flags & (self.FLAG_EXCLUDED_NAME | self.FLAG_INACTIVE | self.FLAG_STALE)) == 0)
+            mask &= np.nan_to_num(self.values[:n, 0], nan=0.0) > min_quote_volume
+            if key[1]: mask &= ~np.fromiter((base in key[1] for base in self.bases), dtype=bool, count=n)
+            ranked = self._ranking[mask[self._ranking]]
+            self._eligible_cache[key] = ranked
+        return ranked
+
+    def top(self, n: int, min_quote_volume: float = 0.0, blacklist=()) -> list:
+        """The `n` most liquid eligible markets as small ticker-like dicts (only these rows are materialised)."""
+        return [self.row(i) for i in self._ranked_eligible(min_quote_volume, blacklist)[:n]]
+
+    def row(self, i: int) -> dict:
+        market = {'symbol': self.symbols[i]}
+        for field, value in zip(self.FIELDS, self.values[i].tolist()):
+            market[field] = None if value != value else value
+        return market
+
+    def nbytes(self) -> int:
+        n = len(self.symbols)
+        return self.values[:n].nbytes + self.flags[:n].nbytes + self._ranking.nbytes
+
+
+class OrderBookCache:
+    def __init__(self):
+        self._books = {}
+        self.stats = Counter()
+
+    def apply(self, symbol: str, bids, asks, ts_ms: int = None):
+        """
+        Stores the top of a book. bids/asks: [[price, size, ...], ...] best level first (WS strings or REST floats).
+        Cumulative bid notional is precomputed per level so any top-N lookup is O(1). Returns the entry, or None for an empty side.
+        """
+        if not bids or not asks: return None
+        best_bid, best_ask = float(bids[0][0]), float(asks[0][0])
+        notional, cumulative = 0.0, []
+        for level in bids:
+            notional += float(level[0]) * float(level[1])
+            cumulative.append(notional)
+        entry = {
+            'bid': best_bid, 'ask': best_ask,
+            'spread_percent': (best_ask - best_bid) / best_bid * 100 if best_bid > 0 else None,
+            'bid_notional': cumulative, 'levels': len(cumulative),
+            'ts': int(ts_ms) if ts_ms else now_ms(), 'received_at': time.time(),
+        }
+        self._books[symbol] = entry
+        return entry
+
+    def get(self, symbol: str, max_age: float, levels: int = 1):
+        """The stored entry if it was received less than `max_age` seconds ago and has at least `levels` bid levels, else None."""
+        entry = self._books.get(symbol)
+        if entry is None or entry['levels'] < levels:
+            self.stats['misses'] += 1
+            return None
+        if time.time() - entry['received_at'] > max_age:
+            self.stats['stale'] += 1
+            return None
+        self.stats['hits'] += 1
+        return entry
+
+    def discard(self, symbols):
+        for symbol in symbols:
+            self._books.pop(symbol, None)
+
+    def __len__(self):
+        return len(self._books)
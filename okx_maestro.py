@@ -40,9 +40,15 @@ import json
 import time
 import copy
 import random
+import contextlib
+import contextvars
+import zlib
 from datetime import datetime, timedelta, timezone, time as dt_time
 from zoneinfo import ZoneInfo
 from collections import defaultdict, Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
 import httpx
 import re
 import aiosqlite
@@ -93,8 +99,11 @@ from telegram.constants import ParseMode
 from telegram.error import BadRequest, TimedOut, Forbidden
 
 # --- الوحدات المخصصة ---
-from wise_man import WiseMan, PORTFOLIO_RISK_RULES # --- [تعديل V8.1] استيراد قواعد المخاطر
+from wise_man import WiseMan, PORTFOLIO_RISK_RULES, REGIME_ALLOWED_STRATEGIES # --- [تعديل V8.1] استيراد قواعد المخاطر
 from smart_engine import EvolutionaryEngine
+import indicators
+from market_data import OHLCVCache, CandleBoundaryCache, MarketUniverse, OrderBookCache, ScanVerdictCache, SymbolQuarantine, candle_open_ms, now_ms, ohlcv_frame, timeframe_to_ms
+from exchange_gateway import ExchangeGateway, in_request_lane, request_lane_scope
 
 # --- إعدادات أساسية ---
 logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
@@ -143,11 +152,16 @@ DB_FILE = 'trading_bot_v8.1_okx.db'
 SETTINGS_FILE = 'trading_bot_v8.1_okx_settings.json'
 TIMEFRAME = '15m'
 SCAN_INTERVAL_SECONDS = 900
+SCAN_FETCH_CONCURRENCY = 20 # --- [أداء] خط أنابيب الفحص: عدد طلبات الشموع المتزامنة
+SCAN_QUEUE_MAXSIZE = 64 # حد الطوابير بين المراحل (ضغط عكسي)
+PREFILTER_MICRO_BATCH = 32 # أقصى عدد رموز في دفعة الفلترة المتجهة الواحدة
+WHALE_RADAR_DEPTH_LEVELS = 10 # مستويات العرض في فحص الحيتان (حد 30000 USDT مضبوط على 10 مستويات)
+ORDER_BOOK_CHANNEL_LEVELS = {"books5": 5, "bbo-tbt": 1} # عمق كل قناة بث؛ أي طلب أعمق (رادار الحيتان) يُجلب بـ REST
+SUPPORT_LEVEL_TIMEFRAME, SUPPORT_LEVEL_LOOKBACK, SUPPORT_LEVEL_WINDOW = '1h', 100, 10 # فهرس دعم ارتداد الدعم: شموع مغلقة ونافذة القاع
 SUPERVISOR_INTERVAL_SECONDS = 180
 TIME_SYNC_INTERVAL_SECONDS = 3600
 STRATEGY_ANALYSIS_INTERVAL_SECONDS = 21600 # 6 hours
 EGYPT_TZ = ZoneInfo("Africa/Cairo")
-REQUEST_SEMAPHORE = asyncio.Semaphore(5) # --- [تعديل V8.1] منظم الطلبات
 
 # (بقية الإعدادات الافتراضية تبقى كما هي)
 DEFAULT_SETTINGS = {
@@ -155,6 +169,23 @@ DEFAULT_SETTINGS = {
     "max_concurrent_trades": 5,
     "top_n_symbols_by_volume": 300,
     "worker_threads": 10,
+    "scan_execution_mode": "async",
+    "scan_schedule_mode": "interval",
+    "scan_candle_offset_seconds": 5,
+    "candle_stream": {"shard_size": 100, "debounce_seconds": 2.0},
+    # بث قمة الدفاتر يغطي السبريد فقط: رادار الحيتان يحتاج WHALE_RADAR_DEPTH_LEVELS مستويات فيبقى طلب REST لكل رمز عند تفعيله
+    "order_book_stream": {"enabled": True, "channel": "books5", "shard_size": 100, "max_age_seconds": 5.0},
+    "scan_time_budget": {"enabled": True, "fraction_of_interval": 0.8},
+    # طبقات الفحص (اختيارية): الكون كله (حتى universe_size) بدلاً من top_n_symbols_by_volume؛ hot كل شمعة، warm و cold بالتناوب
+    "scan_tiers": {"enabled": False, "universe_size": 800, "hot_size": 100, "warm_size": 200, "warm_period_candles": 2, "cold_period_candles": 4,
+                   "hot_min_rvol": 1.5, "hot_max_spread_percent": 0.3, "hot_signal_hours": 6},
+    # حجر الرموز المتعثرة: كل فشل متتالٍ من نفس الفئة يضاعف مدة الاستبعاد من الفحص بدءاً من base_seconds للفئة
+    "symbol_quarantine": {"enabled": True, "base_seconds": {"bad_symbol": 3600, "exchange_error": 300, "no_data": 900, "analysis_error": 600},
+                          "max_seconds": 86400},
+    "process_pool_workers": 0,
+    "resample_base_timeframe": "15m",
+    "resample_max_base_bars": 1000,
+    "ohlcv_store_dtype": "float64", # float64 يحفظ دقة المنصة لأسعار الدخول والوقف والهدف؛ float32 يخفض الذاكرة للنصف لكنه يقرب الأسعار (~7 أرقام)
     "atr_sl_multiplier": 2.5,
     "risk_reward_ratio": 2.0,
     "trailing_sl_enabled": True,
@@ -172,6 +203,7 @@ DEFAULT_SETTINGS = {
     "volatility_filters": {"atr_period_for_filter": 14, "min_atr_percent": 0.8},
     "trend_filters": {"ema_period": 200, "htf_period": 50, "enabled": True},
     "spread_filter": {"max_spread_percent": 0.5},
+    "ticker_prefilter": {"enabled": True, "min_24h_range_percent": 2.0, "max_drop_from_open_percent": 5.0},
     "rsi_divergence": {"rsi_period": 14, "lookback_period": 35, "peak_trough_lookback": 5, "confirm_with_rsi_exit": True},
     "supertrend_pullback": {"atr_period": 10, "atr_multiplier": 3.0, "swing_high_lookback": 10},
     "multi_timeframe_enabled": True,
@@ -202,6 +234,10 @@ STRATEGY_NAMES_AR = {
     "rsi_divergence": "دايفرجنس RSI", "supertrend_pullback": "انعكاس سوبرترند"
 }
 
+MARKET_REGIME_NAMES_AR = {"BULL_TREND": "اتجاه صاعد", "BEAR_TREND": "اتجاه هابط", "VOLATILE_RANGE": "تذبذب حاد", "QUIET_RANGE": "تذبذب هادئ"}
+
+SYMBOL_ERROR_CLASSES_AR = {"bad_symbol": "رمز غير صالح", "exchange_error": "خطأ منصة", "no_data": "بلا شموع", "analysis_error": "خطأ تحليل"}
+
 PRESET_NAMES_AR = {"professional": "احترافي", "strict": "متشدد", "lenient": "متساهل", "very_lenient": "فائق التساهل", "bold_heart": "القلب الجريء"}
 
 SETTINGS_PRESETS = {
@@ -259,7 +295,7 @@ class BotState:
         self.application = None
         self.market_mood = {"mood": "UNKNOWN", "reason": "تحليل لم يتم بعد"}
         self.last_scan_info = {}
-        self.all_markets = []
+        self.market_universe = MarketUniverse()
         self.last_markets_fetch = 0
         self.websocket_manager = None
         self.strategy_performance = {}
@@ -269,8 +305,30 @@ class BotState:
         self.trade_update_recommendations = {}
         self.news_cache = {}
         self.pending_orphan_alerts = set()
+        self.process_pool = None
+        self.process_pool_size = 0
+        self.ohlcv_cache = None
+        self.htf_cache = CandleBoundaryCache()
+        self.indicator_states = indicators.IndicatorStateCache(timeframe_to_ms(TIMEFRAME))
+        self.scan_profiler = None # يُضبط من scan_benchmark.py فقط
+        self.last_scanned_candle = 0
+        self.scan_carryover = [] # رموز تخطاها آخر فحص عند انتهاء ميزانيته الزمنية، تُفحص أولاً في الفحص التالي
+        self.scan_verdicts = ScanVerdictCache(max_entries=5000) # أحكام الفحص لكل (رمز، شمعة مغلقة، بصمة إعدادات)
+        self.symbol_quarantine = SymbolQuarantine() # رموز متعثرة يتخطاها الفحص حتى تنتهي مهلتها
+        self.support_levels = {} # فهرس مستويات الدعم (indicators.SupportLevelIndex) لكل رمز، محفوظ في جدول support_levels
+        self.support_levels_dirty = set() # رموز تغير فهرسها ولم يُحفظ بعد
+        self.symbol_scan_candle = {} # آخر شمعة (رقمها منذ البداية) فُحص فيها كل رمز، لضمان تغطية طبقات warm و cold
+        self.market_stream = None
+        self.stream_closed_symbols = set()
+        self.stream_dispatch_task = None
+        self.order_book_cache = OrderBookCache()
+        self.order_book_stream = None
 
 bot_data = BotState()
+
+def scan_stage(name):
+    """[قياس الأداء] يقيس زمن مرحلة من الفحص عند تفعيل bot_data.scan_profiler (من scan_benchmark.py)، ولا يفعل شيئاً غير ذلك."""
+    return bot_data.scan_profiler.stage(name) if bot_data.scan_profiler else contextlib.nullcontext()
 wise_man = None
 smart_brain = None
 scan_lock = asyncio.Lock()
@@ -329,6 +387,8 @@ async def init_database():
                     trade_size REAL DEFAULT 15.0
                 )
             """)
+            # --- [أداء] فهرس مستويات الدعم: قيعان شموع الساعة المغلقة لكل رمز، يُستعاد عند التشغيل بدلاً من إعادة بنائه
+            await conn.execute("CREATE TABLE IF NOT EXISTS support_levels (symbol TEXT PRIMARY KEY, last_ts INTEGER NOT NULL, lows TEXT NOT NULL)")
             await conn.commit()
             cursor = await conn.execute("PRAGMA table_info(trades)")
             columns = [row[1] for row in await cursor.fetchall()]
@@ -502,18 +562,25 @@ async def _send_email_alert(subject, body):
 
 # --- [تعديل V8.1] دالة مخصصة لتنفيذ أوامر المنصة مع التحكم في عدد الطلبات
 # --- [تعديل V8.2] إصلاح خطأ "cannot reuse already awaited coroutine"
-async def safe_api_call(api_call_func, max_retries=3, delay=5):
+async def safe_api_call(api_call_func, max_retries=3, delay=5, symbol=None):
     """
     [النسخة النهائية] ينفذ استدعاء API بشكل آمن مع محاولات إعادة متعددة ودعم للدوال غير المتزامنة.
     - api_call_func: دالة lambda التي تحتوي على استدعاء الـ API لإنشاء coroutine جديد في كل محاولة.
+    - symbol: عند تمريره (قراءات الفحص) يُسجل الفشل النهائي في سجل حجر الرموز (إن كان الخطأ يخص الرمز لا الشبكة)،
+      ولا يُعاد الطلب المرفوض حتمياً (BadRequest).
     """
-    last_exception = None
+    last_exception, attempts = None, 0
     for attempt in range(max_retries):
+        attempts = attempt + 1
         try:
             # نقوم بإنشاء واستدعاء الـ coroutine هنا في كل مرة
             return await api_call_func()
         except (ccxt.NetworkError, ccxt.ExchangeError) as e:
             last_exception = e
+            if symbol is not None and isinstance(e, ccxt.BadRequest):
+                # --- [أداء] قراءة فحص مرفوضة حتمياً (رمز مشطوب أو غير موجود): إعادة المحاولة لن تغير النتيجة
+                logger.warning(f"API call for {symbol} rejected: {str(e)}. Not retrying.")
+                break
             logger.warning(f"API call failed with network/exchange error: {str(e)}. Attempt {attempt + 1}/{max_retries}.")
             if "51400" in str(e): # خطأ "Order does not exist"
                  logger.warning(f"Caught OKX error 51400. The order was likely already filled or canceled. Stopping retries.")
@@ -525,9 +592,32 @@ async def safe_api_call(api_call_func, max_retries=3, delay=5):
             # نوقف المحاولات فوراً في حالة الأخطاء غير المتوقعة (مثل خطأ برمجي)
             break
 
-    logger.error(f"API call failed after {max_retries} attempts. Last error: {last_exception}")
+    logger.error(f"API call failed after {attempts} attempt(s). Last error ({type(last_exception).__name__}): {last_exception}")
+    if symbol is not None: quarantine_symbol(symbol, last_exception)
     return None
 
+def symbol_error_class(error):
+    """فئة الخطأ في سجل الحجر، أو None لأخطاء الشبكة والحساب التي لا تخص رمزاً بعينه."""
+    if isinstance(error, ccxt.BadSymbol): return "bad_symbol"
+    if isinstance(error, (ccxt.NetworkError, ccxt.AuthenticationError)): return None
+    if isinstance(error, ccxt.ExchangeError): return "exchange_error"
+    return "analysis_error"
+
+# فئات الحجر التي يثبت جلب الشموع الناجح زوالها؛ analysis_error لا يزول إلا بتحليل ناجح للرمز
+SCAN_FETCH_ERROR_CLASSES = ("bad_symbol", "exchange_error", "no_data")
+
+def quarantine_symbol(symbol, error, error_class=None):
+    """
+    [أداء] يسجل فشل رمز في سجل الحجر فيتخطاه الفحص لمدة تتضاعف مع كل فشل متتالٍ من نفس الفئة،
+    بدلاً من دفع محاولات الإعادة وانتظارها لنفس الرمز في كل فحص. error_class يتجاوز تصنيف error.
+    """
+    quarantine_settings = bot_data.settings.get('symbol_quarantine', {})
+    error_class = error_class or symbol_error_class(error)
+    if not quarantine_settings.get('enabled', True) or error_class is None: return
+    base_seconds = quarantine_settings.get('base_seconds', {}).get(error_class, 600)
+    backoff = bot_data.symbol_quarantine.record_failure(symbol, error_class, base_seconds, quarantine_settings.get('max_seconds', 86400), str(error or ""))
+    logger.warning(f"Quarantined {symbol} for {backoff / 60:.0f} min ({error_class}): {error}")
+
 # --- ADAPTIVE INTELLIGENCE MODULE ---
 async def update_strategy_performance(context: ContextTypes.DEFAULT_TYPE):
     logger.info("🧠 Adaptive Mind: Analyzing strategy performance...")
@@ -687,9 +777,8 @@ async def get_market_mood():
     if settings.get('btc_trend_filter_enabled', True):
         try:
             htf_period = settings['trend_filters']['htf_period']
-            ohlcv = await safe_api_call(lambda: bot_data.exchange.fetch_ohlcv('BTC/USDT', '4h', limit=htf_period + 5))
-            if not ohlcv: return {"mood": "DANGEROUS", "reason": "فشل جلب بيانات BTC (API Error)", "btc_mood": "UNKNOWN"}
-            df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+            df = await bot_data.ohlcv_cache.get_frame('BTC/USDT', '4h', htf_period + 5)
+            if df is None or df.empty: return {"mood": "DANGEROUS", "reason": "فشل جلب بيانات BTC (API Error)", "btc_mood": "UNKNOWN"}
             df['sma'] = ta.sma(df['close'], length=htf_period)
             is_btc_bullish = df['close'].iloc[-1] > df['sma'].iloc[-1]
             btc_mood_text = "صاعد ✅" if is_btc_bullish else "هابط ❌"
@@ -702,37 +791,155 @@ async def get_market_mood():
             return {"mood": "NEGATIVE", "reason": f"مشاعر خوف شديد (F&G: {fng})", "btc_mood": btc_mood_text}
     return {"mood": "POSITIVE", "reason": "وضع السوق مناسب", "btc_mood": btc_mood_text}
 
+# --- [أداء] المؤشرات المشتركة بين الماسحات ---
+# كل ماسح يعلن في SCANNER_INDICATORS المؤشرات التي يحتاجها (اسم + معاملات)، ويحسب المحرك اتحادها مرة واحدة
+# لكل رمز وشمعة في إطار مشترك. الماسحات تقرأ الإطار فقط ولا تنسخه ولا تضيف إليه أعمدة.
+# --- [أداء] كل مؤشر يُحسب بنواة NumPy من indicators.py على أعمدة الشموع مباشرة، بنفس أسماء أعمدة pandas_ta
+INDICATOR_BUILDERS = {
+    "vwap": lambda c: indicators.vwap_daily(c['timestamp'], c['high'], c['low'], c['close'], c['volume']),
+    "bbands": lambda c, length: indicators.bbands(c['close'], length=length),
+    "macd": lambda c: indicators.macd(c['close']),
+    "rsi": lambda c, length: indicators.rsi(c['close'], length=length),
+    "kc": lambda c, length, scalar: indicators.kc(c['high'], c['low'], c['close'], length=length, scalar=scalar),
+    "obv": lambda c: indicators.obv(c['close'], c['volume']),
+    "supertrend": lambda c, length, multiplier: indicators.supertrend(c['high'], c['low'], c['close'], length=length, multiplier=multiplier),
+    "volume_sma": lambda c, length: {f"VOLUME_SMA_{length}": indicators.sma(c['volume'], length)},
+}
+
+# --- [أداء] المؤشرات التي تحتفظ بها IndicatorState لكل رمز: تُقرأ أعمدتها من الحالة التزايدية بدلاً من حسابها على كل الشموع
+INCREMENTAL_INDICATOR_COLUMNS = {
+    "rsi": lambda length: [f"RSI_{length}"],
+    "obv": lambda: ["OBV"],
+    "volume_sma": lambda length: [f"VOLUME_SMA_{length}"],
+    "supertrend": lambda length, multiplier: [f"SUPERT{kind}_{int(length)}_{float(multiplier)}" for kind in ("", "d", "l", "s")],
+}
+
+def indicator_state_config(settings):
+    """معاملات IndicatorState المشتقة من الإعدادات؛ تغييرها يعيد بناء حالة كل رمز عند تحديثه التالي."""
+    rsi_params, supertrend_params = settings.get('rsi_divergence', {}), settings.get('supertrend_pullback', {})
+    return {
+        "ema_period": settings.get('trend_filters', {}).get('ema_period', 200),
+        "atr_periods": tuple(sorted({settings.get('volatility_filters', {}).get('atr_period_for_filter', 14), 14})),
+        "adx_length": 14,
+        "rsi_lengths": tuple(sorted({14, rsi_params.get('rsi_period', 14)})),
+        "volume_sma_length": 20,
+        "supertrend": (supertrend_params.get('atr_period', 10), supertrend_params.get('atr_multiplier', 3.0)),
+        "history": max(indicators.INCREMENTAL_HISTORY, rsi_params.get('lookback_period', 35) + 1),
+    }
+
+def incremental_indicator_columns(state, specs, ohlcv_array):
+    """أعمدة المؤشرات التي تحملها حالة الرمز التزايدية لنفس مصفوفة الشموع بالضبط."""
+    if state is None or len(ohlcv_array) < 2 or state.last_ts != ohlcv_array[-2][0]: return {}
+    columns = {}
+    for name, params in specs:
+        if name in INCREMENTAL_INDICATOR_COLUMNS:
+            columns.update(state.frame_columns(INCREMENTAL_INDICATOR_COLUMNS[name](**params), len(ohlcv_array), ohlcv_array[-1]) or {})
+    return columns
+
+def collect_indicator_specs(scanner_names, params_by_scanner):
+    """اتحاد مؤشرات الماسحات المعطاة بلا تكرار (الاسم، المعاملات)."""
+    specs = {}
+    for scanner_name in scanner_names:
+        declare = SCANNER_INDICATORS.get(scanner_name)
+        if not declare: continue
+        for name, params in declare(params_by_scanner.get(scanner_name, {})):
+            specs.setdefault((name, tuple(sorted(params.items()))), (name, params))
+    return list(specs.values())
+
+def build_indicator_frame(ohlcv_array, specs, computations=None, precomputed=None):
+    """[أداء] يحسب كل مؤشر مرة واحدة ويبني إطار الماسحات دفعة واحدة؛ المؤشرات الموجودة في precomputed تؤخذ منه."""
+    ohlcv_array = np.asarray(ohlcv_array, dtype=np.float64)
+    if ohlcv_array.shape[0] > 1 and np.any(np.diff(ohlcv_array[:, 0]) < 0):
+        ohlcv_array = ohlcv_array[np.argsort(ohlcv_array[:, 0], kind='stable')]
+    columns = {name: np.ascontiguousarray(ohlcv_array[:, i]) for i, name in enumerate(indicators.OHLCV_FIELDS)}
+    data = {name: columns[name] for name in indicators.OHLCV_FIELDS[1:]}
+    for name, params in specs:
+        names = INCREMENTAL_INDICATOR_COLUMNS[name](**params) if precomputed and name in INCREMENTAL_INDICATOR_COLUMNS else None
+        if names and all(column in precomputed for column in names):
+            data.update({column: precomputed[column] for column in names}); continue
+        data.update(INDICATOR_BUILDERS[name](columns, **params))
+        if computations is not None: computations[name] += 1
+    # كتلة float واحدة بدلاً من عمود لكل مصفوفة: يتجنب كلفة دمج الكتل في pandas
+    return pd.DataFrame(np.column_stack(list(data.values())), columns=list(data), index=pd.DatetimeIndex(columns['timestamp'].astype('datetime64[ms]'), name='timestamp'))
+
 def analyze_momentum_breakout(df, params, rvol, adx_value):
-    df.ta.vwap(append=True); df.ta.bbands(length=20, append=True); df.ta.macd(append=True); df.ta.rsi(append=True)
     last, prev = df.iloc[-2], df.iloc[-3]
-    macd_col, macds_col, bbu_col, rsi_col = find_col(df.columns, "MACD_"), find_col(df.columns, "MACDs_"), find_col(df.columns, "BBU_"), find_col(df.columns, "RSI_")
+    macd_col, macds_col, bbu_col, rsi_col = find_col(df.columns, "MACD_"), find_col(df.columns, "MACDs_"), find_col(df.columns, "BBU_20_"), find_col(df.columns, "RSI_14")
     if not all([macd_col, macds_col, bbu_col, rsi_col]): return None
     if (prev[macd_col] <= prev[macds_col] and last[macd_col] > last[macds_col] and last['close'] > last[bbu_col] and last['close'] > last["VWAP_D"] and last[rsi_col] < 68):
         return {"reason": "momentum_breakout"}
     return None
 
 def analyze_breakout_squeeze_pro(df, params, rvol, adx_value):
-    df.ta.bbands(length=20, append=True); df.ta.kc(length=20, scalar=1.5, append=True); df.ta.obv(append=True)
-    bbu_col, bbl_col, kcu_col, kcl_col = find_col(df.columns, "BBU_"), find_col(df.columns, "BBL_"), find_col(df.columns, "KCUe_"), find_col(df.columns, "KCLEe_")
+    bbu_col, bbl_col, kcu_col, kcl_col = find_col(df.columns, "BBU_20_"), find_col(df.columns, "BBL_20_"), find_col(df.columns, "KCUe_20_"), find_col(df.columns, "KCLEe_20_")
     if not all([bbu_col, bbl_col, kcu_col, kcl_col]): return None
     last, prev = df.iloc[-2], df.iloc[-3]
     is_in_squeeze = prev[bbl_col] > prev[kcl_col] and prev[bbu_col] < prev[kcu_col]
-    if is_in_squeeze and (last['close'] > last[bbu_col]) and (last['volume'] > df['volume'].rolling(20).mean().iloc[-2] * 1.5) and (df['OBV'].iloc[-2] > df['OBV'].iloc[-3]):
+    if is_in_squeeze and (last['close'] > last[bbu_col]) and (last['volume'] > last['VOLUME_SMA_20'] * 1.5) and (df['OBV'].iloc[-2] > df['OBV'].iloc[-3]):
         return {"reason": "breakout_squeeze_pro"}
     return None
 
+async def get_support_level_index(symbol):
+    """
+    [أداء] فهرس مستويات الدعم للرمز، يتقدم فقط بشموع الساعة التي أغلقت منذ آخر تحديث. شموع الساعة تُبنى محلياً
+    من شموع 15m المحفوظة في ohlcv_cache، والفهرس يُبنى كاملاً فقط لرمز جديد أو بعد فجوة. يعيد None إن تعذر بناؤه.
+    """
+    tf_ms = timeframe_to_ms(SUPPORT_LEVEL_TIMEFRAME)
+    last_closed = candle_open_ms(SUPPORT_LEVEL_TIMEFRAME, now_ms()) - tf_ms
+    index = bot_data.support_levels.get(symbol)
+    if index is not None and index.last_ts >= last_closed: return index
+
+    missing = SUPPORT_LEVEL_LOOKBACK if index is None else min(SUPPORT_LEVEL_LOOKBACK, (last_closed - index.last_ts) // tf_ms)
+    candles = await bot_data.ohlcv_cache.get_array(symbol, SUPPORT_LEVEL_TIMEFRAME, missing + 1, max_age=60)
+    if candles is None or len(candles) < 2: return index
+    closed = candles[:-1].tolist()  # الشمعة الأخيرة قيد التشكل
+    if index is None or not index.extend(closed):
+        if missing < SUPPORT_LEVEL_LOOKBACK:
+            candles = await bot_data.ohlcv_cache.get_array(symbol, SUPPORT_LEVEL_TIMEFRAME, SUPPORT_LEVEL_LOOKBACK + 1, max_age=60)
+            if candles is None or len(candles) < 2: return index
+            closed = candles[:-1].tolist()
+        index = index or indicators.SupportLevelIndex(tf_ms, SUPPORT_LEVEL_LOOKBACK, SUPPORT_LEVEL_WINDOW)
+        index.reset(closed)
+        bot_data.support_levels[symbol] = index
+    bot_data.support_levels_dirty.add(symbol)
+    return index
+
+async def load_support_levels():
+    """يستعيد فهارس مستويات الدعم المحفوظة عند التشغيل."""
+    try:
+        async with aiosqlite.connect(DB_FILE) as conn:
+            rows = await (await conn.execute("SELECT symbol, last_ts, lows FROM support_levels")).fetchall()
+        tf_ms = timeframe_to_ms(SUPPORT_LEVEL_TIMEFRAME)
+        bot_data.support_levels = {symbol: indicators.SupportLevelIndex.from_record(last_ts, lows, tf_ms, SUPPORT_LEVEL_LOOKBACK, SUPPORT_LEVEL_WINDOW)
+                                   for symbol, last_ts, lows in rows}
+        logger.info(f"Support level index: restored {len(rows)} symbols.")
+    except Exception as e:
+        logger.error(f"Failed to load support levels: {e}", exc_info=True)
+
+async def save_support_levels():
+    """يحفظ الفهارس التي تغيرت منذ آخر حفظ في معاملة واحدة."""
+    symbols = [symbol for symbol in bot_data.support_levels_dirty if symbol in bot_data.support_levels]
+    bot_data.support_levels_dirty.clear()
+    if not symbols: return
+    try:
+        async with aiosqlite.connect(DB_FILE) as conn:
+            await conn.executemany("INSERT OR REPLACE INTO support_levels (symbol, last_ts, lows) VALUES (?, ?, ?)",
+                                   [(symbol, *bot_data.support_levels[symbol].to_record()) for symbol in symbols])
+            await conn.commit()
+    except Exception as e:
+        logger.error(f"Failed to save support levels: {e}", exc_info=True)
+        bot_data.support_levels_dirty.update(symbols)
+
 async def analyze_support_rebound(df, params, rvol, adx_value, exchange, symbol):
     try:
-        ohlcv_1h = await safe_api_call(lambda: exchange.fetch_ohlcv(symbol, '1h', limit=100))
-        if not ohlcv_1h or len(ohlcv_1h) < 50: return None
-        df_1h = pd.DataFrame(ohlcv_1h, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-        current_price = df_1h['close'].iloc[-1]
-        recent_lows = df_1h['low'].rolling(window=10, center=True).min()
-        supports = recent_lows[recent_lows.notna()]
-        closest_support = max([s for s in supports if s < current_price], default=None)
+        # --- [أداء] أقرب دعم من الفهرس الدائم ببحث ثنائي، بدلاً من نافذة متحركة على 100 شمعة ساعة وقائمة بايثون في كل فحص
+        index = await get_support_level_index(symbol)
+        if index is None or len(index) < 50: return None
+        current_price = float(df['close'].iloc[-1])  # سعر شمعة الساعة قيد التشكل هو سعر آخر شمعة 15m
+        closest_support = index.nearest_below(current_price)
         if not closest_support or ((current_price - closest_support) / closest_support * 100 > 1.0): return None
         last_candle_15m = df.iloc[-2]
-        if last_candle_15m['close'] > last_candle_15m['open'] and last_candle_15m['volume'] > df['volume'].rolling(window=20).mean().iloc[-2] * 1.5:
+        if last_candle_15m['close'] > last_candle_15m['open'] and last_candle_15m['volume'] > last_candle_15m['VOLUME_SMA_20'] * 1.5:
             return {"reason": "support_rebound"}
     except Exception: return None
     return None
@@ -754,19 +961,18 @@ def analyze_sniper_pro(df, params, rvol, adx_value):
 
 async def analyze_whale_radar(df, params, rvol, adx_value, exchange, symbol):
     try:
-        ob = await safe_api_call(lambda: exchange.fetch_order_book(symbol, limit=20))
-        if not ob or not ob.get('bids'): return None
-        if sum(float(price) * float(qty) for price, qty in ob['bids'][:10]) > 30000:
+        book = await get_order_book_top(symbol, levels=WHALE_RADAR_DEPTH_LEVELS)
+        if not book: return None
+        if book['bid_notional'][min(book['levels'], WHALE_RADAR_DEPTH_LEVELS) - 1] > 30000:
             return {"reason": "whale_radar"}
     except Exception: return None
     return None
 
 def analyze_rsi_divergence(df, params, rvol, adx_value):
     if not SCIPY_AVAILABLE: return None
-    df.ta.rsi(length=params.get('rsi_period', 14), append=True)
     rsi_col = find_col(df.columns, f"RSI_{params.get('rsi_period', 14)}")
     if not rsi_col or df[rsi_col].isnull().all(): return None
-    subset = df.iloc[-params.get('lookback_period', 35):].copy()
+    subset = df.iloc[-params.get('lookback_period', 35):]
     price_troughs_idx, _ = find_peaks(-subset['low'], distance=params.get('peak_trough_lookback', 5))
     rsi_troughs_idx, _ = find_peaks(-subset[rsi_col], distance=params.get('peak_trough_lookback', 5))
     if len(price_troughs_idx) >= 2 and len(rsi_troughs_idx) >= 2:
@@ -782,7 +988,6 @@ def analyze_rsi_divergence(df, params, rvol, adx_value):
     return None
 
 def analyze_supertrend_pullback(df, params, rvol, adx_value):
-    df.ta.supertrend(length=params.get('atr_period', 10), multiplier=params.get('atr_multiplier', 3.0), append=True)
     st_dir_col = find_col(df.columns, f"SUPERTd_{params.get('atr_period', 10)}_")
     if not st_dir_col: return None
     last, prev = df.iloc[-2], df.iloc[-3]
@@ -798,6 +1003,14 @@ SCANNERS = {
     "rsi_divergence": analyze_rsi_divergence, "supertrend_pullback": analyze_supertrend_pullback
 }
 
+SCANNER_INDICATORS = {
+    "momentum_breakout": lambda params: [("vwap", {}), ("bbands", {"length": 20}), ("macd", {}), ("rsi", {"length": 14})],
+    "breakout_squeeze_pro": lambda params: [("bbands", {"length": 20}), ("kc", {"length": 20, "scalar": 1.5}), ("obv", {}), ("volume_sma", {"length": 20})],
+    "support_rebound": lambda params: [("volume_sma", {"length": 20})],
+    "rsi_divergence": lambda params: [("rsi", {"length": params.get('rsi_period', 14)})],
+    "supertrend_pullback": lambda params: [("supertrend", {"length": params.get('atr_period', 10), "multiplier": params.get('atr_multiplier', 3.0)})],
+}
+
 # --- محرك التداول ---
 async def get_okx_markets():
     settings = bot_data.settings
@@ -806,151 +1019,469 @@ async def get_okx_markets():
             logger.info("Fetching and caching all OKX markets..."); 
             all_tickers = await safe_api_call(lambda: bot_data.exchange.fetch_tickers())
             if not all_tickers: return []
-            bot_data.all_markets = list(all_tickers.values()); bot_data.last_markets_fetch = time.time()
+            # --- [أداء] لقطة عمودية مضغوطة بدلاً من الاحتفاظ بقواميس ccxt الكاملة لكل الأسواق
+            bot_data.market_universe.update(all_tickers); bot_data.last_markets_fetch = time.time()
         except Exception as e: logger.error(f"Failed to fetch all markets: {e}"); return []
-    blacklist = settings.get('asset_blacklist', [])
-    valid_markets = [t for t in bot_data.all_markets if 'USDT' in t['symbol'] and t.get('quoteVolume', 0) > settings['liquidity_filters']['min_quote_volume_24h_usd'] and t['symbol'].split('/')[0] not in blacklist and t.get('active', True) and not any(k in t['symbol'] for k in ['-SWAP', 'UP', 'DOWN', '3L', '3S'])]
-    valid_markets.sort(key=lambda m: m.get('quoteVolume', 0), reverse=True)
-    return valid_markets[:settings['top_n_symbols_by_volume']]
-
-async def fetch_ohlcv_batch(exchange, symbols, timeframe, limit):
-    tasks = [safe_api_call(lambda s=s: exchange.fetch_ohlcv(s, timeframe, limit=limit)) for s in symbols]
-    results = await asyncio.gather(*tasks)
-    return {symbols[i]: results[i] for i in range(len(symbols)) if results[i] is not None}
-
-async def worker_batch(queue, signals_list, errors_list):
-    settings, exchange = bot_data.settings, bot_data.exchange
-    while not queue.empty():
+    tier_settings = settings.get('scan_tiers', {})
+    universe_size = tier_settings.get('universe_size', 800) if tier_settings.get('enabled', False) else settings['top_n_symbols_by_volume']
+    return bot_data.market_universe.top(universe_size, min_quote_volume=settings['liquidity_filters']['min_quote_volume_24h_usd'],
+                                        blacklist=settings.get('asset_blacklist', []))
+
+async def get_order_book_top(symbol, levels=1):
+    """
+    [أداء] قمة دفتر الأوامر من order_book_cache (يغذيها البث) إن كانت حديثة وبالعمق المطلوب،
+    وإلا طلب REST احتياطي تُخزن نتيجته في نفس الذاكرة. يعيد None عند غياب أحد جانبي الدفتر.
+    """
+    max_age = bot_data.settings.get('order_book_stream', {}).get('max_age_seconds', 5.0)
+    book = bot_data.order_book_cache.get(symbol, max_age, levels)
+    if book: return book
+    ob = await safe_api_call(lambda: bot_data.exchange.fetch_order_book(symbol, limit=levels))
+    if not ob: return None
+    return bot_data.order_book_cache.apply(symbol, ob.get('bids'), ob.get('asks'), ob.get('timestamp'))
+
+# الرمز الذي يجلب scan_fetch_stage شموعه الآن؛ قراءات OHLCVCache الأخرى (المزاج، الرجل الحكيم، المحرك) لا تمسه
+scan_fetch_symbol = contextvars.ContextVar("scan_fetch_symbol", default=None)
+
+async def fetch_ohlcv_from_exchange(symbol, timeframe, since, limit):
+    """
+    [أداء] مصدر البيانات الخام لـ OHLCVCache: since=None يجلب آخر limit شمعة، وإلا الشموع ابتداءً من since.
+    فقط قراءة مرحلة الجلب في الفحص تُمرر symbol= إلى safe_api_call (بلا إعادة لـ BadRequest، مع الحجر)؛ باقي القراءات تُعاد كالمعتاد.
+    """
+    scan_symbol = symbol if scan_fetch_symbol.get() == symbol else None
+    return await safe_api_call(lambda: bot_data.exchange.fetch_ohlcv(symbol, timeframe, since=since, limit=limit), symbol=scan_symbol)
+
+def scan_deadline_reached(deadline):
+    return deadline is not None and time.monotonic() >= deadline
+
+async def scan_fetch_stage(markets, scan_plan, fetched_queue, max_age=0, deadline=None, skipped=None):
+    """
+    [خط الأنابيب] المرحلة الأولى: تجلب شموع الرموز بعدد محدود من الطلبات المتزامنة وتمرر كل رمز فور وصول شموعه.
+    رموز "whale_only" تمر بدون شموع. بعد deadline لا تُجلب شموع جديدة وتُضاف الرموز المتبقية إلى skipped. تنتهي بوضع None في الطابور.
+    رمز بلا شموع أو فشل جلبه يذهب إلى سجل الحجر، ونجاح الجلب يحرره من فئات الجلب (SCAN_FETCH_ERROR_CLASSES).
+    """
+    markets_iter = iter(markets)
+    async def fetcher():
+        for market in markets_iter:
+            if scan_deadline_reached(deadline):
+                skipped.append(market['symbol']); continue
+            if scan_plan[market['symbol']] == "whale_only":
+                await fetched_queue.put((market, None)); continue
+            token = scan_fetch_symbol.set(market['symbol'])
+            try:
+                with scan_stage("fetch_ohlcv"):
+                    ohlcv = await bot_data.ohlcv_cache.get_array(market['symbol'], TIMEFRAME, 220, max_age=max_age)
+            except Exception as e:
+                logger.error(f"Scan fetch failed for {market['symbol']}: {e}")
+                quarantine_symbol(market['symbol'], e); continue
+            finally:
+                scan_fetch_symbol.reset(token)
+            if ohlcv is None: continue  # safe_api_call سجل الرمز في الحجر إن كان الخطأ يخصه
+            if not len(ohlcv):
+                quarantine_symbol(market['symbol'], "exchange returned no candles", "no_data"); continue
+            bot_data.symbol_quarantine.record_success(market['symbol'], SCAN_FETCH_ERROR_CLASSES)
+            await fetched_queue.put((market, ohlcv))
+    await asyncio.gather(*(fetcher() for _ in range(min(SCAN_FETCH_CONCURRENCY, len(markets)))))
+    await fetched_queue.put(None)
+
+async def scan_prefilter_stage(fetched_queue, analysis_queue, settings, stats, memo=None):
+    """
+    [خط الأنابيب] المرحلة الثانية: تجمع ما وصل من رموز في دفعات صغيرة (حتى PREFILTER_MICRO_BATCH) وتطبق عليها
+    vectorized_prefilter، ثم تمرر الناجحة (أو كل الرموز عند تفعيل رادار الحيتان) إلى طابور التحليل.
+    """
+    whale_radar_active = 'whale_radar' in settings['active_scanners']
+    finished = False
+    while not finished:
+        batch = [await fetched_queue.get()]
+        while len(batch) < PREFILTER_MICRO_BATCH and not fetched_queue.empty():
+            batch.append(fetched_queue.get_nowait())
+        if batch[-1] is None:
+            finished = True; batch.pop()
+        if not batch: continue
+
+        with scan_stage("vectorized_prefilter"):
+            prefilter_results = vectorized_prefilter({market['symbol']: ohlcv for market, ohlcv in batch if ohlcv is not None}, settings)
+        stats['batches'] += 1
+        for market, ohlcv in batch:
+            if ohlcv is None:
+                await analysis_queue.put({'market': market, 'ohlcv': None, 'prefilter': None, 'whale_only': True}); continue
+            prefilter = prefilter_results.get(market['symbol'])
+            if prefilter:
+                stats['evaluated'] += 1
+                stats['passed'] += prefilter['passed']
+                if prefilter['passed'] or whale_radar_active:
+                    await analysis_queue.put({'market': market, 'ohlcv': ohlcv, 'prefilter': prefilter}); continue
+            if memo is not None and memo.cacheable({'ohlcv': ohlcv}):
+                bot_data.scan_verdicts.set(memo.key(market['symbol']), prefilter['reason'] if prefilter else "insufficient_data")
+
+def assign_scan_tiers(markets, settings):
+    """
+    [أداء] يعيد ترتيب الكون (مرتباً بالحجم من لقطة التيكرات) في طبقات فحص عند كل فحص:
+    - hot: إشارة خلال hot_signal_hours، أو RVOL آخر شمعة مغلقة (من حالة مؤشرات الرمز) مرتفع مع سبريد ضيق؛ حتى hot_size رمز.
+    - warm: الرموز التالية بالحجم حتى warm_size، و cold: الباقي.
+    يعيد {الرمز: الطبقة}.
+    """
+    tier_settings = settings.get('scan_tiers', {})
+    signal_window, now = tier_settings.get('hot_signal_hours', 6) * 3600, time.time()
+    min_rvol, max_spread = tier_settings.get('hot_min_rvol', 1.5), tier_settings.get('hot_max_spread_percent', 0.3)
+    candidates = []
+    for rank, market in enumerate(markets):
+        symbol = market['symbol']
+        recent_signal = now - bot_data.last_signal_time.get(symbol, 0) <= signal_window
+        bid, ask = market.get('bid') or 0, market.get('ask') or 0
+        spread_percent = (ask - bid) / bid * 100 if bid > 0 and ask > 0 else None
+        state, rvol = bot_data.indicator_states.get(symbol), 0.0
+        if state is not None and state.bars:
+            volume_sma = state.value("VOLUME_SMA_20")
+            if volume_sma > 0: rvol = state.last_row[5] / volume_sma
+        if recent_signal or (rvol >= min_rvol and spread_percent is not None and spread_percent <= max_spread):
+            candidates.append((not recent_signal, -rvol, rank, symbol))
+    hot = {symbol for *_, symbol in sorted(candidates)[:tier_settings.get('hot_size', 100)]}
+    tiers, warm_left = {}, tier_settings.get('warm_size', 200)
+    for market in markets:
+        symbol = market['symbol']
+        if symbol in hot: tiers[symbol] = "hot"
+        elif warm_left > 0: tiers[symbol], warm_left = "warm", warm_left - 1
+        else: tiers[symbol] = "cold"
+    return tiers
+
+def scan_tier_due(symbol, tier, candle_index, tier_settings):
+    """
+    رمز الطبقة ذات الدورة P شمعة يُفحص في خانته الثابتة (crc32 للرمز) كل P شموع، فيتوزع الحمل على الشموع،
+    أو فوراً إن مرت P شموع منذ آخر فحص له (تغيّر الطبقة أو تأجيل بسبب الميزانية الزمنية).
+    """
+    period = 1 if tier == "hot" else max(1, int(tier_settings.get(f'{tier}_period_candles', 1)))
+    last_scanned = bot_data.symbol_scan_candle.get(symbol)
+    if last_scanned is not None and candle_index - last_scanned >= period: return True
+    return (zlib.crc32(symbol.encode()) + candle_index) % period == 0
+
+def ticker_prefilter(markets, settings):
+    """
+    [أداء] المرحلة الأولى من الفحص: تستخدم لقطة fetch_tickers المخزنة في get_okx_markets لاستبعاد الرموز قبل تحميل الشموع ودفاتر الأوامر.
+    - السبريد من bid/ask مقابل spread_filter.
+    - مدى الـ 24 ساعة (high/low) كبديل رخيص لفلتر التقلب.
+    - السعر الحالي مقابل سعر افتتاح الـ 24 ساعة كبديل رخيص لفلتر الاتجاه.
+    يعيد {الرمز: "full" أو "whale_only"} مع Counter بأسباب الاستبعاد. عند تفعيل رادار الحيتان تبقى الرموز المستبعدة
+    (بسبريد لا يتجاوز ضعف الحد) مرشحة للرادار فقط، فلا تُحمل شموعها إلا إذا ظهر حوت.
+    """
+    phase_settings = settings.get('ticker_prefilter', {})
+    max_spread = settings['spread_filter']['max_spread_percent']
+    whale_radar_active = 'whale_radar' in settings['active_scanners']
+    plan, rejected = {}, Counter()
+    for market in markets:
+        symbol = market['symbol']
+        if not phase_settings.get('enabled', True):
+            plan[symbol] = "full"; continue
+        bid, ask = market.get('bid') or 0, market.get('ask') or 0
+        high, low, open_price, last = market.get('high') or 0, market.get('low') or 0, market.get('open') or 0, market.get('last') or 0
+        spread_percent = (ask - bid) / bid * 100 if bid > 0 and ask > 0 else None
+
+        reason = None
+        if spread_percent is not None and spread_percent > max_spread: reason = "spread"
+        elif low > 0 and high > 0 and (high - low) / low * 100 < phase_settings.get('min_24h_range_percent', 2.0): reason = "low_24h_range"
+        elif open_price > 0 and last > 0 and (last - open_price) / open_price * 100 < -phase_settings.get('max_drop_from_open_percent', 5.0): reason = "below_24h_open"
+
+        if reason is None:
+            plan[symbol] = "full"; continue
+        rejected[reason] += 1
+        if whale_radar_active and (spread_percent is None or spread_percent <= max_spread * 2):
+            plan[symbol] = "whale_only"
+    return plan, rejected
+
+def vectorized_prefilter(ohlcv_data, settings):
+    """
+    [أداء] يطبق فلاتر الاتجاه (EMA) والتقلب (ATR%) والحجم (RVOL) و ADX على كل الرموز دفعة واحدة.
+    قيم المؤشرات تأتي من الحالة التزايدية لكل رمز (bot_data.indicator_states) التي تتقدم بالشموع المغلقة الجديدة فقط
+    بدلاً من إعادة الحساب على كل الشموع، ثم تُطبق الفلاتر متجهةً على القيم المجمعة. يعيد لكل رمز نتيجة الفلترة مع القيم
+    المحسوبة ليعيد worker_batch استخدامها. الرموز ذات البيانات غير الكافية (< 50 شمعة) لا تظهر في النتيجة.
+    """
+    symbols = [symbol for symbol, ohlcv in ohlcv_data.items() if len(ohlcv) >= 50]
+    if not symbols: return {}
+    config = indicator_state_config(settings)
+    states = [bot_data.indicator_states.update(symbol, ohlcv_data[symbol], config) for symbol in symbols]
+    lengths = np.array([len(ohlcv_data[symbol]) for symbol in symbols])
+    last_close = np.array([ohlcv_data[symbol][-2][4] for symbol in symbols], dtype=np.float64)
+    last_volume = np.array([ohlcv_data[symbol][-2][5] for symbol in symbols], dtype=np.float64)
+    def last_values(column):
+        return np.array([state.value(column) for state in states], dtype=np.float64)
+
+    passed = np.ones(len(symbols), dtype=bool)
+    reasons = np.full(len(symbols), None, dtype=object)
+    def reject(mask, reason):
+        newly_rejected = passed & mask
+        reasons[newly_rejected] = reason
+        passed[newly_rejected] = False
+
+    trend_filters = settings.get('trend_filters', {})
+    if trend_filters.get('enabled', True):
+        ema_period = trend_filters.get('ema_period', 200)
+        ema_last = last_values(f"EMA_{ema_period}")
+        reject(lengths < ema_period + 1, "trend_insufficient_data")
+        reject(np.isnan(ema_last), "trend_ema_unavailable")
+        reject(last_close < ema_last, "below_trend_ema")
+
+    vol_filters = settings.get('volatility_filters', {})
+    atr_period, min_atr_percent = vol_filters.get('atr_period_for_filter', 14), vol_filters.get('min_atr_percent', 0.8)
+    atr_last, atr_14 = last_values(f"ATRr_{atr_period}"), last_values("ATRr_14")
+    atr_percent = np.divide(atr_last * 100, last_close, out=np.zeros(len(symbols)), where=last_close > 0)
+    reject(np.isnan(atr_last), "atr_unavailable")
+    reject(atr_percent < min_atr_percent, "low_volatility")
+
+    volume_sma = last_values("VOLUME_SMA_20")
+    reject(np.isnan(volume_sma) | (volume_sma == 0), "volume_sma_unavailable")
+    rvol = np.divide(last_volume, volume_sma, out=np.zeros(len(symbols)), where=volume_sma > 0)
+    reject(rvol < settings.get('volume_filter_multiplier', 2.0), "low_rvol")
+
+    adx_value = np.zeros(len(symbols))
+    if settings.get('adx_filter_enabled', False):
+        adx_value = np.nan_to_num(last_values("ADX_14"), nan=0.0)
+        reject(adx_value < settings.get('adx_filter_level', 25), "low_adx")
+
+    return {
+        symbol: {"passed": bool(passed[i]), "reason": reasons[i], "rvol": float(rvol[i]), "adx_value": float(adx_value[i]),
+                 "atr_percent": float(atr_percent[i]), "atr_14": float(atr_14[i])}
+        for i, symbol in enumerate(symbols)
+    }
+
+def analyze_symbol_cpu(ohlcv_array, scanner_names, params_by_scanner, rvol, adx_value, precomputed=None):
+    """
+    [Process Pool] يشغل الماسحات الحسابية (غير الشبكية) لرمز واحد ويعيد {اسم الماسح: السبب} للماسحات التي أكدت الإشارة،
+    مع عداد المؤشرات التي حُسبت. تُمرر الشموع كمصفوفة NumPy مضغوطة بدلاً من DataFrame لتقليل كلفة النقل بين العمليات.
+    """
+    computations = Counter()
+    df = build_indicator_frame(ohlcv_array, collect_indicator_specs(scanner_names, params_by_scanner), computations, precomputed)
+    results = {}
+    for name in scanner_names:
+        result = SCANNERS[name](df=df, params=params_by_scanner.get(name, {}), rvol=rvol, adx_value=adx_value)
+        if result: results[name] = result['reason']
+    return results, computations
+
+def get_scan_process_pool():
+    """مجمع عمليات الفحص المشترك (يُنشأ عند أول استخدام) في وضع process_pool، وإلا None."""
+    if bot_data.settings.get('scan_execution_mode', 'async') != 'process_pool':
+        return None
+    if bot_data.process_pool is None:
+        workers = bot_data.settings.get('process_pool_workers', 0) or os.cpu_count() or 1
+        bot_data.process_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        bot_data.process_pool_size = workers
+        logger.info(f"Scan process pool started with {workers} worker processes.")
+    return bot_data.process_pool
+
+def reset_scan_process_pool():
+    if bot_data.process_pool is not None:
+        bot_data.process_pool.shutdown(wait=False, cancel_futures=True)
+    bot_data.process_pool, bot_data.process_pool_size = None, 0
+
+async def is_htf_trend_bullish(symbol, htf):
+    """
+    [أداء] اتجاه الإطار الأكبر (إغلاق آخر شمعة مغلقة مقابل EMA-200) لا يتغير إلا عند إغلاق شمعة من هذا الإطار،
+    لذا تُخزن النتيجة في htf_cache حتى حد الشمعة التالي، فلا تحتاج معظم الفحوصات أي طلب أو حساب للإطار الأكبر.
+    """
+    cached = bot_data.htf_cache.get(symbol, htf)
+    if cached is not None: return cached['is_htf_bullish']
+    ohlcv_htf = await bot_data.ohlcv_cache.get_array(symbol, htf, 220)
+    if ohlcv_htf is None or not len(ohlcv_htf): return True
+    is_htf_bullish, ema_200 = True, None
+    if len(ohlcv_htf) > 200:
+        closes = ohlcv_htf[:, 4]
+        ema_200 = indicators.ema(closes, 200)[-2]
+        if not np.isnan(ema_200): is_htf_bullish = bool(closes[-2] > ema_200)
+    bot_data.htf_cache.set(symbol, htf, {"is_htf_bullish": is_htf_bullish, "ema_200": ema_200}, last_candle_open=int(ohlcv_htf[-1, 0]))
+    return is_htf_bullish
+
+# --- [أداء] ذاكرة أحكام الفحص: أقسام الإعدادات التي يتغير بها حكم رمز على نفس الشمعة المغلقة
+SCAN_VERDICT_SETTINGS = ("active_scanners", "scan_scanners", "spread_filter", "volatility_filters", "trend_filters", "volume_filter_multiplier",
+                         "adx_filter_enabled", "adx_filter_level", "multi_timeframe_enabled", "multi_timeframe_htf", "atr_sl_multiplier",
+                         "risk_reward_ratio", "adaptive_intelligence_enabled", "strategy_deactivation_threshold_wr", "strategy_analysis_min_trades",
+                         "dynamic_sizing_max_decrease_pct", "dynamic_sizing_max_increase_pct")
+
+def scan_settings_fingerprint(settings):
+    """بصمة أقسام الإعدادات (وأداء الاستراتيجيات) التي يعتمد عليها حكم الفحص."""
+    relevant = {key: settings.get(key) for key in SCAN_VERDICT_SETTINGS}
+    relevant.update({name: settings.get(name, {}) for name in settings.get('scan_scanners', settings['active_scanners'])})
+    relevant['strategy_performance'] = bot_data.strategy_performance
+    return hashlib.sha1(json.dumps(relevant, sort_keys=True, default=str).encode()).hexdigest()
+
+class ScanMemo:
+    """
+    مفاتيح ذاكرة الأحكام لفحص واحد: (الرمز، افتتاح آخر شمعة مغلقة، بصمة الإعدادات).
+    replayed: الرموز التي استُعيد حكمها الأساسي من الذاكرة في هذا الفحص بدلاً من حسابه.
+    """
+    def __init__(self, closed_candle_open, fingerprint):
+        self.closed_candle_open, self.fingerprint = closed_candle_open, fingerprint
+        self.replayed = set()
+
+    def key(self, symbol):
+        return (symbol, self.closed_candle_open, self.fingerprint)
+
+    def cacheable(self, item):
+        """تُحفظ فقط الأحكام المحسوبة على نفس الشمعة المغلقة (لا على شموع متأخرة)."""
+        ohlcv = item.get('ohlcv')
+        return ohlcv is None or (len(ohlcv) >= 2 and int(ohlcv[-2][0]) == self.closed_candle_open)
+
+async def run_symbol_scanners(symbol, ohlcv_array, scanner_names, settings, rvol, adx_value, indicator_computations):
+    """يشغل الماسحات المطلوبة على شموع رمز واحد ويعيد {الماسح: السبب} للماسحات التي أكدت."""
+    if not scanner_names: return {}
+    exchange = bot_data.exchange
+    cpu_scanners = [name for name in scanner_names if not asyncio.iscoroutinefunction(SCANNERS[name])]
+    network_scanners = [name for name in scanner_names if name not in cpu_scanners]
+    params_by_scanner = {name: settings.get(name, {}) for name in scanner_names}
+
+    # --- [أداء] الماسحات الحسابية تذهب إلى مجمع العمليات (إن كان مفعلاً) بينما تبقى الماسحات الشبكية على الحلقة
+    # أعمدة المؤشرات التي تحتفظ بها الحالة التزايدية للرمز تُمرر جاهزة (للحلقة ولمجمع العمليات) بدلاً من إعادة حسابها
+    precomputed = incremental_indicator_columns(bot_data.indicator_states.get(symbol), collect_indicator_specs(scanner_names, params_by_scanner), ohlcv_array)
+    pool = get_scan_process_pool()
+    if pool and cpu_scanners:
+        cpu_future = asyncio.get_running_loop().run_in_executor(pool, analyze_symbol_cpu, ohlcv_array, cpu_scanners, params_by_scanner, rvol, adx_value, precomputed)
+        loop_scanners = network_scanners
+    else:
+        cpu_future, loop_scanners = None, scanner_names
+
+    results_by_scanner = {}
+    if loop_scanners:
+        # إطار مؤشرات واحد مشترك بين كل الماسحات التي تعمل على الحلقة
+        with scan_stage("indicators"):
+            df = build_indicator_frame(ohlcv_array, collect_indicator_specs(loop_scanners, params_by_scanner), indicator_computations, precomputed)
+        for name in loop_scanners:
+            with scan_stage(f"scanner:{name}"):
+                if name in network_scanners:
+                    result = await SCANNERS[name](df=df, params=params_by_scanner[name], rvol=rvol, adx_value=adx_value, exchange=exchange, symbol=symbol)
+                else:
+                    result = SCANNERS[name](df=df, params=params_by_scanner[name], rvol=rvol, adx_value=adx_value)
+            if result: results_by_scanner[name] = result['reason']
+
+    if cpu_future is not None:
         try:
-            item = await queue.get()
-            market, ohlcv = item['market'], item['ohlcv']
-            symbol = market['symbol']
-
-            df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-            df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-            df = df.set_index('timestamp').sort_index()
-            if len(df) < 50:
-                queue.task_done(); continue
-
-            orderbook = await safe_api_call(lambda: exchange.fetch_order_book(symbol, limit=1))
-            if not orderbook or not orderbook['bids'] or not orderbook['asks']:
-                queue.task_done(); continue
-
-            best_bid, best_ask = orderbook['bids'][0][0], orderbook['asks'][0][0]
-            if best_bid <= 0:
-                queue.task_done(); continue
-            spread_percent = ((best_ask - best_bid) / best_bid) * 100
-
-            if 'whale_radar' in settings['active_scanners']:
-                whale_radar_signal = await analyze_whale_radar(df.copy(), {}, 0, 0, exchange, symbol)
-                if whale_radar_signal and spread_percent <= settings['spread_filter']['max_spread_percent'] * 2:
-                    reason_str, strength = whale_radar_signal['reason'], 5
-                    entry_price = df.iloc[-2]['close']
-                    df.ta.atr(length=14, append=True)
-                    atr = df.iloc[-2].get(find_col(df.columns, "ATRr_14"), 0)
-                    risk = atr * settings['atr_sl_multiplier']
-                    stop_loss, take_profit = entry_price - risk, entry_price + (risk * settings['risk_reward_ratio'])
-                    signals_list.append({"symbol": symbol, "entry_price": entry_price, "take_profit": take_profit, "stop_loss": stop_loss, "reason": reason_str, "strength": strength, "weight": 1.0})
-                    queue.task_done();
-
-            if spread_percent > settings['spread_filter']['max_spread_percent']:
-                queue.task_done(); continue
-
-            is_htf_bullish = True
-            if settings.get('multi_timeframe_enabled', True):
-                ohlcv_htf = await safe_api_call(lambda: exchange.fetch_ohlcv(symbol, settings.get('multi_timeframe_htf'), limit=220))
-                if ohlcv_htf and len(ohlcv_htf) > 200:
-                    df_htf = pd.DataFrame(ohlcv_htf, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-                    df_htf.ta.ema(length=200, append=True)
-                    ema_col_name_htf = find_col(df_htf.columns, "EMA_200")
-                    if ema_col_name_htf and pd.notna(df_htf[ema_col_name_htf].iloc[-2]):
-                        is_htf_bullish = df_htf['close'].iloc[-2] > df_htf[ema_col_name_htf].iloc[-2]
-
-            if settings.get('trend_filters', {}).get('enabled', True):
-                ema_period = settings.get('trend_filters', {}).get('ema_period', 200)
-                if len(df) < ema_period + 1:
-                    queue.task_done(); continue
-                df.ta.ema(length=ema_period, append=True)
-                ema_col_name = find_col(df.columns, f"EMA_{ema_period}")
-                if not ema_col_name or pd.isna(df[ema_col_name].iloc[-2]):
-                    queue.task_done(); continue
-                if df['close'].iloc[-2] < df[ema_col_name].iloc[-2]:
-                    queue.task_done(); continue
-
-            vol_filters = settings.get('volatility_filters', {})
-            atr_period, min_atr_percent = vol_filters.get('atr_period_for_filter', 14), vol_filters.get('min_atr_percent', 0.8)
-            df.ta.atr(length=atr_period, append=True)
-            atr_col_name = find_col(df.columns, f"ATRr_{atr_period}")
-            if not atr_col_name or pd.isna(df[atr_col_name].iloc[-2]):
-                queue.task_done(); continue
-            last_close = df['close'].iloc[-2]
-            atr_percent = (df[atr_col_name].iloc[-2] / last_close) * 100 if last_close > 0 else 0
-            if atr_percent < min_atr_percent:
-                queue.task_done(); continue
-
-            df['volume_sma'] = ta.sma(df['volume'], length=20)
-            if pd.isna(df['volume_sma'].iloc[-2]) or df['volume_sma'].iloc[-2] == 0:
-                queue.task_done(); continue
-            rvol = df['volume'].iloc[-2] / df['volume_sma'].iloc[-2]
-            if rvol < settings.get('volume_filter_multiplier', 2.0):
-                queue.task_done(); continue
-
-            adx_value = 0
-            if settings.get('adx_filter_enabled', False):
-                df.ta.adx(append=True); adx_col = find_col(df.columns, "ADX_")
-                adx_value = df[adx_col].iloc[-2] if adx_col and pd.notna(df[adx_col].iloc[-2]) else 0
-                if adx_value < settings.get('adx_filter_level', 25):
-                    queue.task_done(); continue
-
-            confirmed_reasons = []
-            for name in settings['active_scanners']:
-                if name == 'whale_radar': continue
-                if not (strategy_func := SCANNERS.get(name)): continue
-                params = settings.get(name, {})
-                func_args = {'df': df.copy(), 'params': params, 'rvol': rvol, 'adx_value': adx_value}
-                if name in ['support_rebound', 'whale_radar']:
-                    func_args.update({'exchange': exchange, 'symbol': symbol})
-                result = await strategy_func(**func_args) if asyncio.iscoroutinefunction(strategy_func) else strategy_func(**{k: v for k, v in func_args.items() if k not in ['exchange', 'symbol']})
-                if result: confirmed_reasons.append(result['reason'])
-
-            if confirmed_reasons:
-                reason_str, strength = ' + '.join(set(confirmed_reasons)), len(set(confirmed_reasons))
-
-                trade_weight = 1.0
-                if settings.get('adaptive_intelligence_enabled', True):
-                    primary_reason = confirmed_reasons[0]
-                    perf = bot_data.strategy_performance.get(primary_reason)
-                    if perf:
-                        if perf['win_rate'] < 50 and perf['total_trades'] > 5:
-                            trade_weight = 1 - (settings['dynamic_sizing_max_decrease_pct'] / 100.0)
-                        elif perf['win_rate'] > 70 and perf['profit_factor'] > 1.5:
-                            trade_weight = 1 + (settings['dynamic_sizing_max_increase_pct'] / 100.0)
-
-                        if perf['win_rate'] < settings['strategy_deactivation_threshold_wr'] and perf['total_trades'] > settings['strategy_analysis_min_trades']:
-                           logger.warning(f"Signal for {symbol} from weak strategy '{primary_reason}' ignored.")
-                           queue.task_done(); continue
-
-                if not is_htf_bullish:
-                    strength = max(1, int(strength / 2))
-                    reason_str += " (اتجاه كبير ضعيف)"
-                    trade_weight *= 0.8
-
-                entry_price = df.iloc[-2]['close']
-                df.ta.atr(length=14, append=True)
-                atr = df.iloc[-2].get(find_col(df.columns, "ATRr_14"), 0)
-                risk = atr * settings['atr_sl_multiplier']
-                stop_loss, take_profit = entry_price - risk, entry_price + (risk * settings['risk_reward_ratio'])
-                signals_list.append({"symbol": symbol, "entry_price": entry_price, "take_profit": take_profit, "stop_loss": stop_loss, "reason": reason_str, "strength": strength, "weight": trade_weight})
-
-            queue.task_done()
+            with scan_stage("scanner:process_pool"):
+                cpu_results, cpu_computations = await cpu_future
+        except BrokenProcessPool:
+            logger.error("Scan process pool broke; recreating it and analyzing this symbol on the event loop.")
+            reset_scan_process_pool()
+            cpu_results, cpu_computations = analyze_symbol_cpu(ohlcv_array, cpu_scanners, params_by_scanner, rvol, adx_value, precomputed)
+        results_by_scanner.update(cpu_results)
+        indicator_computations.update(cpu_computations)
+
+    return results_by_scanner
+
+async def analyze_scan_item(item, settings, indicator_computations, memo=None):
+    """
+    يحلل رمزاً واحداً من طابور التحليل ويعيد حكمه: قاموس الإشارة، أو سبب الرفض (نص)،
+    أو None لرفض عابر (دفتر أوامر غير متاح).
+    memo: ScanMemo للفحص الحالي؛ أحكام دفتر الأوامر (رادار الحيتان، السبريد) تُحسب دائماً من الدفتر الحي،
+    وما بعدها (analyze_scan_core) يُستعاد من bot_data.scan_verdicts أو يُحفظ فيها.
+    """
+    market, ohlcv, prefilter = item['market'], item['ohlcv'], item['prefilter']
+    symbol, whale_only = market['symbol'], item.get('whale_only', False)
+    exchange = bot_data.exchange
+
+    # دفتر واحد بعمق رادار الحيتان يخدم السبريد والرادار معاً
+    with scan_stage("fetch_order_book"):
+        book = await get_order_book_top(symbol, levels=WHALE_RADAR_DEPTH_LEVELS if 'whale_radar' in settings['active_scanners'] else 1)
+    if not book or book['bid'] <= 0:
+        return None
+    spread_percent = book['spread_percent']
+
+    if 'whale_radar' in settings['active_scanners']:
+        with scan_stage("scanner:whale_radar"):
+            whale_radar_signal = await analyze_whale_radar(None, {}, 0, 0, exchange, symbol)
+        if whale_radar_signal and spread_percent <= settings['spread_filter']['max_spread_percent'] * 2:
+            if whale_only:
+                # رموز المرحلة الأولى المستبعدة: الشموع تُحمل فقط بعد تأكيد الحوت
+                ohlcv = await bot_data.ohlcv_cache.get_array(symbol, TIMEFRAME, 220)
+                prefilter = vectorized_prefilter({symbol: ohlcv}, settings).get(symbol) if ohlcv is not None and len(ohlcv) else None
+                if not prefilter:
+                    return "insufficient_data"
+            reason_str, strength = whale_radar_signal['reason'], 5
+            entry_price = float(ohlcv[-2][4])
+            risk = prefilter['atr_14'] * settings['atr_sl_multiplier']
+            stop_loss, take_profit = entry_price - risk, entry_price + (risk * settings['risk_reward_ratio'])
+            return {"symbol": symbol, "entry_price": entry_price, "take_profit": take_profit, "stop_loss": stop_loss, "reason": reason_str, "strength": strength, "weight": 1.0}
+
+    # الرموز التي رفضتها الفلترة (بالتيكر أو المتجهة) تصل إلى هنا فقط من أجل رادار الحيتان
+    if whale_only: return "no_whale"
+    if not prefilter['passed']: return prefilter['reason']
+    if spread_percent > settings['spread_filter']['max_spread_percent']: return "spread"
+
+    # --- [أداء] ذاكرة الأحكام: الحكم الأساسي لا يعتمد إلا على الشمعة المغلقة والإعدادات، فيُستعاد لنفس الشمعة
+    if memo is not None:
+        verdict = bot_data.scan_verdicts.get(memo.key(symbol))
+        if verdict is not None:
+            memo.replayed.add(symbol)
+            return dict(verdict) if isinstance(verdict, dict) else verdict
+    verdict = await analyze_scan_core(symbol, ohlcv, prefilter, settings, indicator_computations)
+    if memo is not None and memo.cacheable(item):
+        bot_data.scan_verdicts.set(memo.key(symbol), verdict)
+    return verdict
+
+async def analyze_scan_core(symbol, ohlcv, prefilter, settings, indicator_computations):
+    """الحكم الأساسي لرمز اجتاز فحوص دفتر الأوامر: الاتجاه الكبير، الماسحات، ووزن الاستراتيجية."""
+    is_htf_bullish = True
+    if settings.get('multi_timeframe_enabled', True):
+        with scan_stage("htf_trend"):
+            is_htf_bullish = await is_htf_trend_bullish(symbol, settings.get('multi_timeframe_htf'))
+
+    rvol, adx_value = prefilter['rvol'], prefilter['adx_value']
+    # --- [أداء] خطة الماسحات: الماسحات القادرة على قيادة مرشح قابل للتنفيذ (active_scanners) تعمل أولاً، والمستبعدة من الخطة
+    # تعمل بعدها فقط إن أكد أحدها، كأسباب داعمة، فتبقى قوة الإشارة ونص سببها كما لو عملت كل الماسحات (scan_scanners)
+    scanner_names = [name for name in settings.get('scan_scanners', settings['active_scanners']) if name != 'whale_radar' and name in SCANNERS]
+    leading = [name for name in scanner_names if name in settings['active_scanners']]
+    supporting = [name for name in scanner_names if name not in leading]
+    ohlcv_array = np.asarray(ohlcv, dtype=np.float64)
+    results_by_scanner = await run_symbol_scanners(symbol, ohlcv_array, leading, settings, rvol, adx_value, indicator_computations)
+    if results_by_scanner and supporting:
+        results_by_scanner.update(await run_symbol_scanners(symbol, ohlcv_array, supporting, settings, rvol, adx_value, indicator_computations))
+
+    confirmed_reasons = [results_by_scanner[name] for name in scanner_names if name in results_by_scanner]
+
+    if not confirmed_reasons: return "no_scanner_confirmed"
+    reason_str, strength = ' + '.join(set(confirmed_reasons)), len(set(confirmed_reasons))
+
+    trade_weight = 1.0
+    if settings.get('adaptive_intelligence_enabled', True):
+        primary_reason = confirmed_reasons[0]
+        perf = bot_data.strategy_performance.get(primary_reason)
+        if perf:
+            if perf['win_rate'] < 50 and perf['total_trades'] > 5:
+                trade_weight = 1 - (settings['dynamic_sizing_max_decrease_pct'] / 100.0)
+            elif perf['win_rate'] > 70 and perf['profit_factor'] > 1.5:
+                trade_weight = 1 + (settings['dynamic_sizing_max_increase_pct'] / 100.0)
+
+            if perf['win_rate'] < settings['strategy_deactivation_threshold_wr'] and perf['total_trades'] > settings['strategy_analysis_min_trades']:
+               logger.warning(f"Signal for {symbol} from weak strategy '{primary_reason}' ignored.")
+               return "weak_strategy"
+
+    if not is_htf_bullish:
+        strength = max(1, int(strength / 2))
+        reason_str += " (اتجاه كبير ضعيف)"
+        trade_weight *= 0.8
+
+    entry_price = float(ohlcv[-2][4])
+    risk = prefilter['atr_14'] * settings['atr_sl_multiplier']
+    stop_loss, take_profit = entry_price - risk, entry_price + (risk * settings['risk_reward_ratio'])
+    return {"symbol": symbol, "entry_price": entry_price, "take_profit": take_profit, "stop_loss": stop_loss, "reason": reason_str, "strength": strength, "weight": trade_weight}
+
+async def worker_batch(queue, signals_list, errors_list, indicator_computations, deadline=None, skipped=None, settings=None, memo=None):
+    """
+    [خط الأنابيب] المرحلة الثالثة: تحلل الرموز من الطابور حتى تستلم None.
+    بعد deadline تستمر في تفريغ الطابور (حتى لا تتوقف المراحل السابقة) لكنها تضيف الرموز إلى skipped بدلاً من تحليلها.
+    settings: إعدادات الفحص (active_scanners فيها هي خطة الفحص)، وإلا bot_data.settings.
+    memo: ScanMemo للفحص الحالي (يُمرر إلى analyze_scan_item).
+    """
+    settings = settings or bot_data.settings
+    while (item := await queue.get()) is not None:
+        if scan_deadline_reached(deadline):
+            skipped.append(item['market']['symbol']); continue
+        try:
+            symbol = item['market']['symbol']
+            verdict = await analyze_scan_item(item, settings, indicator_computations, memo)
+            if isinstance(verdict, dict): signals_list.append(verdict)
+            bot_data.symbol_quarantine.record_success(symbol, ("analysis_error",))
         except Exception as e:
             if 'symbol' in locals():
                 logger.error(f"Error processing symbol {symbol}: {e}", exc_info=True)
                 errors_list.append(symbol)
+                quarantine_symbol(symbol, e)
             else:
                 logger.error(f"Worker error with no symbol context: {e}", exc_info=True)
-            if not queue.empty():
-                queue.task_done()
 
 async def handle_order_update(order_data):
     """يتم استدعاؤها عند ورود تحديث لأمر من مراسل البيانات."""
@@ -958,6 +1489,7 @@ async def handle_order_update(order_data):
         logger.info(f"Fast Reporter: Received fill for order {order_data['ordId']}. Activating trade...")
         await activate_trade(order_data['ordId'], order_data['instId'])
 
+@in_request_lane("order")
 async def activate_trade(order_id, symbol):
     """
     [النسخة النهائية المطورة V8.3]
@@ -1047,6 +1579,7 @@ async def has_active_trade_for_symbol(symbol: str) -> bool:
         logger.error(f"Database check for active trade failed for {symbol}: {e}")
         return True
 
+@in_request_lane("order")
 async def initiate_real_trade(signal, settings, exchange, bot):
     """
     [النسخة النهائية المطورة V9.2]
@@ -1112,30 +1645,73 @@ async def initiate_real_trade(signal, settings, exchange, bot):
         logger.error(f"REAL TRADE FAILED {signal['symbol']}: {e}", exc_info=True)
         return False
     
-async def log_candidate_to_db(signal):
+async def log_candidates_to_db(signals):
+    """
+    [أداء] يسجل مرشحي الفحص دفعة واحدة: اتصال ومعاملة واحدة، واستعلام واحد لاستبعاد الرموز التي لها مرشح معلق،
+    ثم INSERT عبر executemany. يعيد معرفات المرشحين الجدد (بترتيب الإدراج) ليراجعها الرجل الحكيم مباشرة.
+    """
+    unique_signals = {}
+    for signal in signals: unique_signals.setdefault(signal['symbol'], signal)
+    if not unique_signals: return []
     try:
         async with aiosqlite.connect(DB_FILE) as conn:
-            exists = await (await conn.execute("SELECT 1 FROM trade_candidates WHERE symbol = ? AND status = 'pending'", (signal['symbol'],))).fetchone()
-            if not exists:
-                # --- [تعديل V8.1] إضافة البيانات الجديدة عند تسجيل المرشح
-                await conn.execute("""
-                    INSERT INTO trade_candidates (timestamp, symbol, reason, entry_price, take_profit, stop_loss, signal_strength, trade_weight, win_prob, trade_size)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (datetime.now(EGYPT_TZ).isoformat(), signal['symbol'], signal['reason'], signal['entry_price'],
-                      signal['take_profit'], signal['stop_loss'], signal.get('strength', 1), signal.get('weight', 1.0),
-                      signal.get('win_prob', 0.5), signal.get('trade_size', bot_data.settings['real_trade_size_usdt'])))
+            await conn.execute("BEGIN IMMEDIATE")
+            symbols = list(unique_signals)
+            pending = {row[0] for row in await (await conn.execute(
+                f"SELECT symbol FROM trade_candidates WHERE status = 'pending' AND symbol IN ({','.join('?' * len(symbols))})", symbols)).fetchall()}
+            new_signals = [signal for symbol, signal in unique_signals.items() if symbol not in pending]
+            if not new_signals:
                 await conn.commit()
-                logger.info(f"New trade candidate logged for {signal['symbol']} for Wise Man review.")
+                return []
+            timestamp, default_size = datetime.now(EGYPT_TZ).isoformat(), bot_data.settings['real_trade_size_usdt']
+            # --- [تعديل V8.1] إضافة البيانات الجديدة عند تسجيل المرشح
+            await conn.executemany("""
+                INSERT INTO trade_candidates (timestamp, symbol, reason, entry_price, take_profit, stop_loss, signal_strength, trade_weight, win_prob, trade_size)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, [(timestamp, s['symbol'], s['reason'], s['entry_price'], s['take_profit'], s['stop_loss'], s.get('strength', 1),
+                   s.get('weight', 1.0), s.get('win_prob', 0.5), s.get('trade_size', default_size)) for s in new_signals])
+            # كل رمز جديد له الآن مرشح معلق واحد بالضبط، فنقرأ معرفاتها بنفس المعاملة
+            new_symbols = [s['symbol'] for s in new_signals]
+            candidate_ids = [row[0] for row in await (await conn.execute(
+                f"SELECT id FROM trade_candidates WHERE status = 'pending' AND symbol IN ({','.join('?' * len(new_symbols))}) ORDER BY id", new_symbols)).fetchall()]
+            await conn.commit()
+        logger.info(f"Logged {len(candidate_ids)} new trade candidates for Wise Man review ({len(pending)} already pending).")
+        return candidate_ids
     except Exception as e:
-        logger.error(f"Failed to log candidate for {signal['symbol']}: {e}")
+        logger.error(f"Failed to log {len(unique_signals)} candidates: {e}")
+        return []
 
+async def plan_scan_scanners(settings):
+    """
+    [أداء] خطة الماسحات قبل الفحص: تحدد الماسحات التي لا يمكن أن يقود أي منها مرشحاً قابلاً للتنفيذ. هذه لا تُحسب
+    إلا كأسباب داعمة لإشارة أكدها ماسح مخطط، وإن لم يبق ماسح مخطط لا يُجرى الفحص أصلاً.
+    - حالة السوق: الرجل الحكيم يرفض أي مرشح استراتيجيته الأساسية خارج REGIME_ALLOWED_STRATEGIES لحالة السوق الحالية.
+    - الأداء: worker_batch يتجاهل إشارات الاستراتيجيات تحت strategy_deactivation_threshold_wr (رادار الحيتان لا يمر بهذا الفحص).
+    يعيد (الماسحات المخططة بترتيب active_scanners، {الماسح المستبعد: السبب}، حالة السوق أو None).
+    """
+    active = [name for name in settings['active_scanners'] if name in SCANNERS]
+    pruned, regime = {}, None
+    if wise_man is not None:
+        regime = await wise_man.get_market_regime()
+        allowed = REGIME_ALLOWED_STRATEGIES.get(regime, [])
+        pruned.update({name: f"regime_{regime}" for name in active if name not in allowed})
+    if settings.get('adaptive_intelligence_enabled', True):
+        for name in active:
+            perf = bot_data.strategy_performance.get(name)
+            if name in pruned or name == 'whale_radar' or not perf: continue
+            if perf['win_rate'] < settings['strategy_deactivation_threshold_wr'] and perf['total_trades'] > settings['strategy_analysis_min_trades']:
+                pruned[name] = "weak_performance"
+    return [name for name in active if name not in pruned], pruned, regime
+
+@in_request_lane("scan")
 async def perform_scan(context: ContextTypes.DEFAULT_TYPE):
     async with scan_lock:
         if not bot_data.trading_enabled:
             logger.warning("Scan skipped: Trading is disabled by circuit breaker or manually.")
             return
 
-        scan_start_time = time.time()
+        scan_start_time, scan_start_monotonic = time.time(), time.monotonic()
+        scan_candle = candle_open_ms(TIMEFRAME, now_ms())
         logger.info("--- Starting new Intelligent Engine scan... ---")
         settings, bot = bot_data.settings, context.bot
 
@@ -1166,38 +1742,137 @@ async def perform_scan(context: ContextTypes.DEFAULT_TYPE):
         if active_trades_count >= settings['max_concurrent_trades']:
             logger.info(f"Scan skipped: Max trades ({active_trades_count}) reached."); return
 
+        # --- [أداء] خطة الماسحات: active_scanners المخططة تقود الفحص (ورادار الحيتان منها فقط)، وبقية الماسحات المفعلة (scan_scanners)
+        # تُحسب كأسباب داعمة لرمز أكده ماسح مخطط. وإن لم يبق ماسح مخطط لا تُحمل أي شموع
+        planned_scanners, pruned_scanners, regime = await plan_scan_scanners(settings)
+        if pruned_scanners:
+            logger.info(f"Scan plan under regime {regime}: running {planned_scanners}, pruned {pruned_scanners}.")
+        if not planned_scanners:
+            logger.info("Scan skipped: no active scanner can produce an executable candidate under the current regime and strategy performance.")
+            return
+        settings = {**settings, 'active_scanners': planned_scanners, 'scan_scanners': settings['active_scanners']}
+
         top_markets = await get_okx_markets()
         if not top_markets:
              logger.warning("Scan could not retrieve any markets to check.")
              return
-
-        symbols_to_scan = [m['symbol'] for m in top_markets]
-        ohlcv_data = await fetch_ohlcv_batch(bot_data.exchange, symbols_to_scan, TIMEFRAME, 220)
-
-        queue, signals_found, analysis_errors = asyncio.Queue(), [], []
-        for market in top_markets:
-            if market['symbol'] in ohlcv_data:
-                await queue.put({'market': market, 'ohlcv': ohlcv_data[market['symbol']]})
-
-        worker_tasks = [asyncio.create_task(worker_batch(queue, signals_found, analysis_errors)) for _ in range(settings.get("worker_threads", 10))]
-        await queue.join()
-        for task in worker_tasks: task.cancel()
+        # الشمعة تُعد مفحوصة فقط بعد اجتياز كل شروط التوقف المبكر، فلا يُرفض فحص يدوي لشمعة لم يُفحص فيها شيء
+        bot_data.last_scanned_candle = scan_candle
+        universe_symbols = {m['symbol'] for m in top_markets}
+        tier_settings, tiers = settings.get('scan_tiers', {}), None
+        if tier_settings.get('enabled', False):
+            tiers = assign_scan_tiers(top_markets, settings)
+        # فحص أطلقه بث الشموع: يقتصر على الرموز التي أغلقت شمعتها للتو، وشموعها موجودة في الذاكرة
+        stream_symbols = (getattr(getattr(context, 'job', None), 'data', None) or {}).get('symbols')
+        if stream_symbols:
+            top_markets = [m for m in top_markets if m['symbol'] in stream_symbols]
+        if tiers:
+            # --- [أداء] طبقات الفحص: hot كل شمعة، و warm/cold بالتناوب، ورموز الترحيل من الفحص السابق دائماً
+            candle_index, carryover = bot_data.last_scanned_candle // timeframe_to_ms(TIMEFRAME), set(bot_data.scan_carryover)
+            top_markets = [m for m in top_markets if m['symbol'] in carryover or scan_tier_due(m['symbol'], tiers[m['symbol']], candle_index, tier_settings)]
+            logger.info(f"Scan tiers: {dict(Counter(tiers.values()))} of {len(tiers)} symbols; {len(top_markets)} due this candle.")
+        due_symbols = {m['symbol'] for m in top_markets}
+        # --- [أداء] حجر الرموز: الرموز المتعثرة تُتخطى حتى انتهاء مهلتها بدلاً من تكرار محاولاتها وانتظارها في كل فحص
+        quarantined_symbols = [m['symbol'] for m in top_markets if bot_data.symbol_quarantine.is_quarantined(m['symbol'])]
+        if quarantined_symbols:
+            quarantined_set = set(quarantined_symbols)
+            top_markets = [m for m in top_markets if m['symbol'] not in quarantined_set]
+            logger.info(f"Symbol quarantine: skipping {len(quarantined_symbols)} symbols until their backoff expires: {quarantined_symbols[:10]}")
+        ohlcv_max_age = 60 if settings.get('scan_schedule_mode') == 'event_stream' else 0
+
+        with scan_stage("ticker_prefilter"):
+            scan_plan, ticker_rejections = ticker_prefilter(top_markets, settings)
+        full_count = sum(1 for mode in scan_plan.values() if mode == "full")
+        logger.info(f"Ticker prefilter: {full_count} full / {len(scan_plan) - full_count} whale-only of {len(top_markets)} symbols. Rejections: {dict(ticker_rejections)}")
+
+        # --- [أداء] خط أنابيب متدفق: جلب الشموع → فلترة متجهة بدفعات صغيرة → تحليل، بطوابير محدودة بين المراحل.
+        # كل رمز يدخل التحليل فور وصول شموعه، فتتداخل الشبكة مع الحساب بدلاً من انتظار أبطأ طلب.
+        fetched_queue, analysis_queue = asyncio.Queue(maxsize=SCAN_QUEUE_MAXSIZE), asyncio.Queue(maxsize=SCAN_QUEUE_MAXSIZE)
+        signals_found, analysis_errors, indicator_computations, prefilter_stats = [], [], Counter(), Counter()
+        worker_count = settings.get("worker_threads", 10)
+        if get_scan_process_pool():
+            # كل عامل ينتظر نتيجة عملية واحدة، لذا نحتاج عمالاً أكثر من عدد العمليات لإبقائها مشغولة
+            worker_count = max(worker_count, 2 * bot_data.process_pool_size)
+        cache_stats_before, state_stats_before = bot_data.ohlcv_cache.stats.copy(), bot_data.indicator_states.stats.copy()
+        # --- [أداء] ميزانية زمنية للفحص: عند بلوغها تتوقف المراحل عن أخذ رموز جديدة، وتُرحل الرموز المتخطاة إلى رأس الفحص التالي
+        # فلا يتراكم فحص خلف آخر على scan_lock ولا تُبنى الإشارات على بيانات قديمة، مع بقاء الكون كله مغطى عبر الفحوصات المتتالية.
+        budget_settings = settings.get('scan_time_budget', {})
+        budget_seconds = SCAN_INTERVAL_SECONDS * budget_settings.get('fraction_of_interval', 0.8) if budget_settings.get('enabled', True) else None
+        deadline = scan_start_monotonic + budget_seconds if budget_seconds else None
+        skipped_symbols = []
+        scan_markets = [market for market in top_markets if market['symbol'] in scan_plan]
+        # --- [أداء] ذاكرة الأحكام: رمز حُكم عليه لنفس الشمعة المغلقة ونفس الإعدادات (فحص يدوي أو فحوصات متداخلة)
+        # ورُفض بلا اعتماد على دفتر الأوامر لا يُجلب ولا يُحسب من جديد. الإشارات المحفوظة (وكل الرموز عند تفعيل رادار الحيتان)
+        # تمر بخط الأنابيب لتُعاد فحوص الدفتر الحي، ثم يُستعاد حكمها الأساسي داخل analyze_scan_item
+        memo = ScanMemo(bot_data.last_scanned_candle - timeframe_to_ms(TIMEFRAME), scan_settings_fingerprint(settings))
+        whale_radar_planned = 'whale_radar' in settings['active_scanners']
+        pipeline_markets = [market for market in scan_markets
+                            if whale_radar_planned or not isinstance(bot_data.scan_verdicts.get(memo.key(market['symbol'])), str)]
+        memo_skipped = len(scan_markets) - len(pipeline_markets)
+        carryover = set(bot_data.scan_carryover)
+        carried_markets = [market for market in pipeline_markets if market['symbol'] in carryover]
+        if carried_markets:
+            pipeline_markets = carried_markets + [market for market in pipeline_markets if market['symbol'] not in carryover]
+            logger.info(f"Scan budget: {len(carried_markets)} symbols skipped by the previous scan are scanned first.")
+        worker_tasks = [asyncio.create_task(worker_batch(analysis_queue, signals_found, analysis_errors, indicator_computations, deadline, skipped_symbols, settings, memo)) for _ in range(worker_count)]
+        try:
+            await asyncio.gather(scan_fetch_stage(pipeline_markets, scan_plan, fetched_queue, ohlcv_max_age, deadline, skipped_symbols),
+                                 scan_prefilter_stage(fetched_queue, analysis_queue, settings, prefilter_stats, memo))
+            for _ in worker_tasks: await analysis_queue.put(None)
+            await asyncio.gather(*worker_tasks)
+        finally:
+            for task in worker_tasks: task.cancel()
+
+        cache_delta = bot_data.ohlcv_cache.stats - cache_stats_before
+        logger.info(f"OHLCV cache: {cache_delta['delta_fetches']} delta / {cache_delta['full_fetches']} full fetches, {cache_delta['candles_downloaded']} candles downloaded, {cache_delta['gaps']} gaps.")
+        logger.info(f"Vectorized prefilter: {prefilter_stats['passed']}/{prefilter_stats['evaluated']} symbols passed the trend/volatility/volume/ADX filters in {prefilter_stats['batches']} batches.")
+        bot_data.ohlcv_cache.evict_idle(max_idle_seconds=6 * 3600)
+        bot_data.indicator_states.evict_idle(max_idle_seconds=6 * 3600)
+        bot_data.symbol_quarantine.evict_expired(forget_after_seconds=settings.get('symbol_quarantine', {}).get('max_seconds', 86400))
+        # رموز الترحيل التي لم يشملها هذا الفحص (فحص بث مقتصر على بعض الرموز) تبقى في الترحيل ما دامت في الكون؛
+        # رموز هذا الفحص تخرج منه سواء فُحصت أو رفضها فلتر التيكرات أو الحجر، فلا يتجاوز الترحيل حجم الكون
+        bot_data.scan_carryover = skipped_symbols + [symbol for symbol in bot_data.scan_carryover if symbol in universe_symbols and symbol not in due_symbols]
+        if tiers:
+            # رموز رفضها فلتر التيكرات تُحسب مفحوصة أيضاً؛ المؤجلة بسبب الميزانية لا
+            skipped_set = set(skipped_symbols)
+            bot_data.symbol_scan_candle = {symbol: candle for symbol, candle in bot_data.symbol_scan_candle.items() if symbol in tiers}
+            bot_data.symbol_scan_candle.update({m['symbol']: candle_index for m in top_markets if m['symbol'] not in skipped_set})
+        if skipped_symbols:
+            logger.warning(f"Scan budget of {budget_seconds:.0f}s reached: {len(skipped_symbols)}/{len(scan_markets)} symbols skipped and carried over to the next scan.")
+        state_delta = bot_data.indicator_states.stats - state_stats_before
+        logger.info(f"Indicator computations this scan: {sum(indicator_computations.values())} ({dict(indicator_computations)}); indicator states: {state_delta['incremental_updates']} incremental / {state_delta['rebuilds']} rebuilt.")
+        memo_hits = memo_skipped + len(memo.replayed)
+        if memo_hits: logger.info(f"Scan verdict memo: {memo_hits}/{len(scan_markets)} symbols already judged on this closed candle.")
+        with scan_stage("db_logging"):
+            await save_support_levels()
 
         if signals_found:
             logger.info(f"Scan found {len(signals_found)} new candidates. Logging them for the Wise Man to review.")
+            # الإشارات المستعادة من ذاكرة الأحكام لم تُحسب في هذا الفحص، فلا تُبقي رمزها في الطبقة الساخنة
             for signal in signals_found:
-                await log_candidate_to_db(signal)
+                if signal['symbol'] not in memo.replayed: bot_data.last_signal_time[signal['symbol']] = time.time()
+            with scan_stage("db_logging"):
+                candidate_ids = await log_candidates_to_db(signals_found)
+            if candidate_ids and wise_man is not None:
+                # المرشحون الجدد يُراجعون فوراً بدلاً من انتظار دورة المراجعة الدورية التالية، وبأولوية الحارس لا الفحص
+                with request_lane_scope("guardian"):
+                    bot_data.application.create_task(wise_man.review_candidates(candidate_ids))
 
         trades_opened_count = 0
         scan_duration = time.time() - scan_start_time
-        bot_data.last_scan_info = {"start_time": datetime.fromtimestamp(scan_start_time, EGYPT_TZ).strftime('%Y-%m-%d %H:%M:%S'), "duration_seconds": int(scan_duration), "checked_symbols": len(top_markets), "analysis_errors": len(analysis_errors)}
+        bot_data.last_scan_info = {"start_time": datetime.fromtimestamp(scan_start_time, EGYPT_TZ).strftime('%Y-%m-%d %H:%M:%S'), "duration_seconds": int(scan_duration), "checked_symbols": len(top_markets), "analysis_errors": len(analysis_errors), "indicator_computations": sum(indicator_computations.values()),
+                                   "budget_seconds": int(budget_seconds) if budget_seconds else None, "budget_used_percent": round(100 * scan_duration / budget_seconds) if budget_seconds else None,
+                                   "skipped_symbols": len(skipped_symbols), "carried_over_symbols": len(carried_markets), "pruned_scanners": pruned_scanners,
+                                   "tier_counts": dict(Counter(tiers.values())) if tiers else None, "memo_hits": memo_hits,
+                                   "quarantined_symbols": len(quarantined_symbols)}
         await safe_send_message(bot, f"✅ **فحص السوق اكتمل بنجاح**\n"
                                    f"━━━━━━━━━━━━━━━━━━\n"
                                    f"**المدة:** {int(scan_duration)} ثانية | **العملات المفحوصة:** {len(top_markets)}\n"
                                    f"**النتائج:**\n"
                                    f"  - **إشارات جديدة:** {len(signals_found)}\n"
                                    f"  - **صفقات تم فتحها:** {trades_opened_count} صفقة\n"
-                                   f"  - **مشكلات تحليل:** {len(analysis_errors)} عملة")
+                                   f"  - **مشكلات تحليل:** {len(analysis_errors)} عملة"
+                                   + (f"\n  - **مؤجلة للفحص التالي (انتهت الميزانية الزمنية):** {len(skipped_symbols)} عملة" if skipped_symbols else ""))
 
 # =======================================================================================
 # --- 🚀 New Engine V33.0 (WebSocket & Trade Management) 🚀 ---
@@ -1312,6 +1987,158 @@ class PublicWebSocketManager:
     async def run(self):
         await exponential_backoff_with_jitter(self._run_loop)
 
+# --- [مسح لحظي] قنوات بث السوق من OKX: كل اتصال يغطي مجموعة (shard) من رموز الفحص ---
+def okx_candle_channel(timeframe):
+    """'15m' -> 'candle15m'، '4h' -> 'candle4H' (وحدات الساعة واليوم والأسبوع كبيرة في OKX)."""
+    return f"candle{timeframe[:-1]}{timeframe[-1] if timeframe[-1] == 'm' else timeframe[-1].upper()}"
+
+class StreamShard:
+    def __init__(self, shard_id, ws_url, channel, row_handler):
+        self.ws_url = ws_url
+        self.shard_id = shard_id
+        self.channel = channel
+        self.handler = row_handler
+        self.subscriptions = set()
+        self.websocket = None
+        self.task = None
+
+    async def _send_op(self, op, symbols):
+        if not symbols or not self.websocket:
+            return
+        try:
+            await self.websocket.send(json.dumps({"op": op, "args": [{"channel": self.channel, "instId": s.replace('/', '-')} for s in symbols]}))
+        except websockets.exceptions.ConnectionClosed:
+            logger.warning(f"Could not send '{op}' operation; {self.channel} stream shard {self.shard_id} is closed.")
+
+    async def subscribe(self, symbols):
+        self.subscriptions.update(symbols)
+        await self._send_op('subscribe', symbols)
+
+    async def unsubscribe(self, symbols):
+        self.subscriptions.difference_update(symbols)
+        await self._send_op('unsubscribe', symbols)
+
+    async def _run_loop(self):
+        try:
+            async with websockets.connect(self.ws_url, ping_interval=20, ping_timeout=20) as ws:
+                self.websocket = ws
+                logger.info(f"✅ [Market Stream] {self.channel} shard {self.shard_id} connected ({len(self.subscriptions)} symbols).")
+                await self._send_op('subscribe', list(self.subscriptions))
+                async for msg in ws:
+                    if msg == 'ping':
+                        await ws.send('pong')
+                        continue
+                    data = json.loads(msg)
+                    if data.get('event') == 'error':
+                        logger.error(f"[Market Stream] {self.channel} shard {self.shard_id} error: {data}")
+                    elif data.get('arg', {}).get('channel') == self.channel and 'data' in data:
+                        symbol = data['arg']['instId'].replace('-', '/')
+                        for row in data['data']:
+                            await self.handler(symbol, row)
+        finally:
+            self.websocket = None
+
+    async def run(self):
+        await exponential_backoff_with_jitter(self._run_loop)
+
+class ShardedStreamManager:
+    """[مسح لحظي] يوزع قناة OKX واحدة على عدة اتصالات، كل منها حتى shard_size رمز، ويمرر كل صف إلى row_handler."""
+    def __init__(self, ws_url, channel, row_handler, shard_size=100):
+        self.ws_url = ws_url
+        self.channel = channel
+        self.row_handler = row_handler
+        self.shard_size = shard_size
+        self.shards = []
+
+    @property
+    def symbols(self):
+        return set().union(*(shard.subscriptions for shard in self.shards))
+
+    async def set_universe(self, symbols):
+        """يشترك في الرموز الجديدة ويلغي اشتراك الخارجة من الكون، ويعيد الرموز الخارجة."""
+        wanted = set(symbols)
+        left = set()
+        for shard in self.shards:
+            leaving = shard.subscriptions - wanted
+            if leaving:
+                await shard.unsubscribe(list(leaving)); left |= leaving
+        new_symbols = sorted(wanted - self.symbols)
+        for shard in self.shards:
+            room = self.shard_size - len(shard.subscriptions)
+            if room > 0 and new_symbols:
+                await shard.subscribe(new_symbols[:room]); new_symbols = new_symbols[room:]
+        while new_symbols:
+            shard = StreamShard(len(self.shards), self.ws_url, self.channel, self.row_handler)
+            shard.subscriptions.update(new_symbols[:self.shard_size]); new_symbols = new_symbols[self.shard_size:]
+            shard.task = asyncio.create_task(shard.run())
+            self.shards.append(shard)
+        return left
+
+    async def stop(self):
+        for shard in self.shards:
+            if shard.task: shard.task.cancel()
+        self.shards = []
+
+class MarketStreamManager(ShardedStreamManager):
+    """
+    [مسح لحظي] يشترك كون الفحص في قناة شموع TIMEFRAME موزعاً على عدة اتصالات، ويدمج الشموع المدفوعة في ohlcv_cache.
+    عند إغلاق شمعة (confirm = 1) يُبلغ on_candle_closed بالرمز ليُفحص فوراً.
+    """
+    def __init__(self, timeframe, on_candle_closed, shard_size=100):
+        super().__init__("wss://ws.okx.com:8443/ws/v5/business", okx_candle_channel(timeframe), self._apply_candle, shard_size)
+        self.timeframe = timeframe
+        self.on_candle_closed = on_candle_closed
+
+    async def _apply_candle(self, symbol, row):
+        # [ts, o, h, l, c, vol, volCcy, volCcyQuote, confirm] - الحجم بعملة الأساس كما في fetch_ohlcv
+        candle = [int(row[0]), float(row[1]), float(row[2]), float(row[3]), float(row[4]), float(row[5])]
+        confirmed = len(row) > 8 and row[8] == '1'
+        bot_data.ohlcv_cache.apply_stream_candle(symbol, self.timeframe, candle, confirmed)
+        if confirmed:
+            await self.on_candle_closed(symbol)
+
+class OrderBookStreamManager(ShardedStreamManager):
+    """[أداء] يبث قمة دفاتر أوامر كون الفحص (books5 أو bbo-tbt) إلى order_book_cache بدلاً من طلبي REST لكل رمز في كل فحص."""
+    def __init__(self, channel="books5", shard_size=100):
+        super().__init__("wss://ws.okx.com:8443/ws/v5/public", channel, self._apply_book, shard_size)
+
+    async def _apply_book(self, symbol, row):
+        bot_data.order_book_cache.apply(symbol, row.get('bids'), row.get('asks'), row.get('ts'))
+
+async def on_stream_candle_closed(symbol):
+    """[مسح لحظي] يجمع الرموز التي أغلقت شمعتها خلال مهلة قصيرة (كلها تغلق معاً تقريباً) ثم يطلق فحصاً لها فقط."""
+    bot_data.stream_closed_symbols.add(symbol)
+    if bot_data.stream_dispatch_task is None or bot_data.stream_dispatch_task.done():
+        bot_data.stream_dispatch_task = asyncio.create_task(dispatch_stream_scan())
+
+async def dispatch_stream_scan():
+    await asyncio.sleep(bot_data.settings.get('candle_stream', {}).get('debounce_seconds', 2.0))
+    symbols, bot_data.stream_closed_symbols = bot_data.stream_closed_symbols, set()
+    if symbols:
+        bot_data.application.job_queue.run_once(perform_scan, 0, data={"symbols": symbols}, name="perform_scan_stream")
+
+@in_request_lane("scan")
+async def sync_market_stream_universe(context: ContextTypes.DEFAULT_TYPE):
+    """يبقي بث الشموع على كون الفحص الحالي ويملأ شموع الرموز الجديدة."""
+    if not bot_data.market_stream: return
+    top_markets = await get_okx_markets()
+    if not top_markets: return
+    symbols = [m['symbol'] for m in top_markets]
+    new_symbols = [s for s in symbols if s not in bot_data.market_stream.symbols]
+    await bot_data.market_stream.set_universe(symbols)
+    if new_symbols:
+        await asyncio.gather(*(bot_data.ohlcv_cache.get_array(s, TIMEFRAME, 220) for s in new_symbols))
+        logger.info(f"[Candle Stream] Subscribed {len(new_symbols)} new symbols across {len(bot_data.market_stream.shards)} connections.")
+
+@in_request_lane("scan")
+async def sync_order_book_stream(context: ContextTypes.DEFAULT_TYPE):
+    """يبقي بث الدفاتر على كون الفحص الحالي وينسى دفاتر الرموز الخارجة منه."""
+    if not bot_data.order_book_stream: return
+    top_markets = await get_okx_markets()
+    if not top_markets: return
+    left = await bot_data.order_book_stream.set_universe([m['symbol'] for m in top_markets])
+    bot_data.order_book_cache.discard(left)
+
 # --- [تعديل V9.2] إعادة هيكلة TradeGuardian لدعم البروتوكولات الثلاثة ---
 # --- [تعديل V9.2] إعادة هيكلة TradeGuardian لدعم البروتوكولات الثلاثة ---
 class TradeGuardian:
@@ -1499,6 +2326,7 @@ class TradeGuardian:
                     await self._close_trade(trade, "فاشلة (Support Breakdown)", current_price)
                     return
 
+    @in_request_lane("order")
     async def _close_trade(self, trade, reason, close_price):
         symbol, trade_id = trade['symbol'], trade['id']
         bot = self.application.bot
@@ -1718,6 +2546,7 @@ async def handle_orphaned_trade(context: ContextTypes.DEFAULT_TYPE, symbol: str,
         name=job_name
     )
 
+@in_request_lane("order")
 async def liquidate_orphaned_position(context: ContextTypes.DEFAULT_TYPE):
     """Called by the job queue or a button to sell an orphaned position."""
     job_context = context.job.context
@@ -1751,9 +2580,8 @@ async def reconstruct_trade(symbol: str, entry_price: float, quantity: float):
         current_price = ticker['last']
         
         # Calculate default SL/TP
-        ohlcv = await safe_api_call(lambda: bot_data.exchange.fetch_ohlcv(symbol, '15m', limit=20))
-        if not ohlcv or len(ohlcv) < 14: raise Exception("Insufficient OHLCV data")
-        df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+        df = await bot_data.ohlcv_cache.get_frame(symbol, '15m', 20)
+        if df is None or len(df) < 14: raise Exception("Insufficient OHLCV data")
         atr = ta.atr(df['high'], df['low'], df['close'], length=14).iloc[-1]
         risk = atr * bot_data.settings['atr_sl_multiplier']
         stop_loss = entry_price - risk
@@ -1780,9 +2608,21 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     keyboard = [["Dashboard 🖥️"], ["الإعدادات ⚙️"]]
     await update.message.reply_text("أهلاً بك في **بوت OKX V9.5 (التبني التفاعلي)**", reply_markup=ReplyKeyboardMarkup(keyboard, resize_keyboard=True), parse_mode=ParseMode.MARKDOWN)
 
+def seconds_until_candle_scan():
+    """الثواني حتى إغلاق شمعة TIMEFRAME التالية مضافاً إليها scan_candle_offset_seconds (مهلة نشر المنصة لها)."""
+    next_close_ms = candle_open_ms(TIMEFRAME, now_ms()) + timeframe_to_ms(TIMEFRAME)
+    return (next_close_ms - now_ms()) / 1000 + bot_data.settings.get('scan_candle_offset_seconds', 5)
+
 async def manual_scan_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not bot_data.trading_enabled: await (update.message or update.callback_query.message).reply_text("🔬 الفحص محظور. مفتاح الإيقاف مفعل."); return
-    await (update.message or update.callback_query.message).reply_text("🔬 أمر فحص يدوي... قد يستغرق بعض الوقت.")
+    message = update.message or update.callback_query.message
+    # --- [أداء] دمج الطلبات اليدوية: لا فائدة من فحص ثانٍ لنفس الشمعة المغلقة
+    if scan_lock.locked():
+        await message.reply_text("🔬 يوجد فحص قيد التنفيذ حالياً، ستصلك نتائجه عند اكتماله."); return
+    if bot_data.settings.get('scan_schedule_mode') in ('candle_close', 'event_stream') and bot_data.last_scanned_candle == candle_open_ms(TIMEFRAME, now_ms()):
+        next_scan = datetime.now(EGYPT_TZ) + timedelta(seconds=seconds_until_candle_scan())
+        await message.reply_text(f"🔬 تم فحص آخر شمعة مغلقة بالفعل. الفحص التالي عند {next_scan.strftime('%H:%M:%S')}."); return
+    await message.reply_text("🔬 أمر فحص يدوي... قد يستغرق بعض الوقت.")
     context.job_queue.run_once(perform_scan, 1)
 
 async def show_dashboard_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1843,6 +2683,13 @@ async def universal_text_handler(update: Update, context: ContextTypes.DEFAULT_T
     elif text == "الإعدادات ⚙️":
         await show_settings_menu(update, context)
 
+def scan_prune_reason_ar(reason):
+    """سبب استبعاد ماسح من الخطة بصيغة عرض بلا شرطات سفلية (تقرير التشخيص يُرسل بتنسيق Markdown)."""
+    if reason.startswith("regime_"):
+        regime = reason[len("regime_"):]
+        return f"حالة السوق: {MARKET_REGIME_NAMES_AR.get(regime, regime.replace('_', ' '))}"
+    return {"weak_performance": "أداء ضعيف"}.get(reason, reason.replace('_', ' '))
+
 async def show_diagnostics_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     s = bot_data.settings
@@ -1854,6 +2701,26 @@ async def show_diagnostics_command(update: Update, context: ContextTypes.DEFAULT
     scan_duration = f'{scan_info.get("duration_seconds", "N/A")} ثانية'
     scan_checked = scan_info.get("checked_symbols", "N/A")
     scan_errors = scan_info.get("analysis_errors", "N/A")
+    scan_indicators = scan_info.get("indicator_computations", "N/A")
+    scan_budget = f'{scan_info["budget_used_percent"]}% من {scan_info["budget_seconds"]} ثانية' if scan_info.get("budget_seconds") else "N/A"
+    scan_skipped = f'{scan_info.get("skipped_symbols", "N/A")} (بدأ الفحص بـ {scan_info.get("carried_over_symbols", 0)} عملة مرحلة)'
+    scan_memo_hits = scan_info.get("memo_hits", "N/A")
+    scan_tiers = " | ".join(f"{tier}: {count}" for tier, count in sorted((scan_info.get("tier_counts") or {}).items())) or "معطلة"
+    quarantine = bot_data.symbol_quarantine.active()
+    scan_quarantine = f'{len(quarantine)} عملة (تخطى آخر فحص {scan_info.get("quarantined_symbols", 0)})' + "".join(
+        f"\n  - {symbol}: {SYMBOL_ERROR_CLASSES_AR.get(error_class, error_class.replace('_', ' '))} ×{strikes}، متبقٍ {seconds_left / 60:.0f} د" for symbol, error_class, strikes, seconds_left, _ in quarantine[:5])
+    scan_pruned = ", ".join(f"{STRATEGY_NAMES_AR.get(name, name)} ({scan_prune_reason_ar(reason)})" for name, reason in scan_info.get("pruned_scanners", {}).items()) or "لا يوجد"
+    scheduler = getattr(bot_data.exchange, 'scheduler', None)
+    request_lanes = scheduler.lane_summary() if scheduler else "N/A"
+    duplicate_reads = bot_data.exchange.duplicate_summary() if scheduler else "N/A"
+    book_stream, book_stats = s.get('order_book_stream', {}), bot_data.order_book_cache.stats
+    book_channel = book_stream.get('channel', 'books5') if book_stream.get('enabled', True) else None
+    book_levels = ORDER_BOOK_CHANNEL_LEVELS.get(book_channel, 0)
+    order_book_source = (f"بث {book_channel} ({book_levels} مستويات)" if book_channel else "REST فقط") + f" | من الذاكرة {book_stats['hits']} / REST {book_stats['misses'] + book_stats['stale']}"
+    if 'whale_radar' in s.get('active_scanners', []) and book_levels < WHALE_RADAR_DEPTH_LEVELS:
+        order_book_source += f"\n  - رادار الحيتان يحتاج {WHALE_RADAR_DEPTH_LEVELS} مستويات: طلب REST لكل رمز عند تفعيله في خطة الفحص"
+    ohlcv_cache = bot_data.ohlcv_cache
+    ohlcv_memory = f"{len(ohlcv_cache)} سلسلة، {ohlcv_cache.memory_bytes() / 1024:.1f} KB ({ohlcv_cache.dtype})" if ohlcv_cache else "N/A"
     scanners_list = "\n".join([f"  - {STRATEGY_NAMES_AR.get(key, key)}" for key in s.get('active_scanners', [])])
     scan_job = context.job_queue.get_jobs_by_name("perform_scan")
     next_scan_time = scan_job[0].next_t.astimezone(EGYPT_TZ).strftime('%H:%M:%S') if scan_job and scan_job[0].next_t else "N/A"
@@ -1890,7 +2757,15 @@ async def show_diagnostics_command(update: Update, context: ContextTypes.DEFAULT
         f"- وقت البدء: {scan_time}\n"
         f"- المدة: {scan_duration}\n"
         f"- العملات المفحوصة: {scan_checked}\n"
-        f"- فشل في التحليل: {scan_errors} عملات\n\n"
+        f"- طبقات الكون: {scan_tiers}\n"
+        f"- أحكام مستعادة من ذاكرة الفحص: {scan_memo_hits}\n"
+        f"- فشل في التحليل: {scan_errors} عملات\n"
+        f"- حسابات المؤشرات: {scan_indicators}\n"
+        f"- استهلاك الميزانية الزمنية: {scan_budget}\n"
+        f"- عملات مؤجلة للفحص التالي: {scan_skipped}\n"
+        f"- عملات في الحجر: {scan_quarantine}\n"
+        f"- مصدر دفاتر الأوامر: {order_book_source}\n"
+        f"- ماسحات داعمة فقط (لا تقود مرشحاً): {scan_pruned}\n\n"
         f"🔧 **الإعدادات النشطة**\n"
         f"- **النمط الحالي: {bot_data.active_preset_name}**\n"
         f"- الماسحات المفعلة:\n{scanners_list}\n"
@@ -1898,6 +2773,9 @@ async def show_diagnostics_command(update: Update, context: ContextTypes.DEFAULT
         f"🔩 **حالة العمليات الداخلية**\n"
         f"- فحص العملات: يعمل, التالي في: {next_scan_time}\n"
         f"- اتصال OKX WebSocket: {ws_status}\n"
+        f"- طلبات المنصة (المسار: العدد، متوسط الانتظار): {request_lanes}\n"
+        f"- طلبات قراءة مكررة تم دمجها: {duplicate_reads}\n"
+        f"- ذاكرة الشموع: {ohlcv_memory}\n"
         f"- قاعدة البيانات:\n"
         f"  - الاتصال: ناجح ✅\n"
         f"  - حجم الملف: {db_size}\n"
@@ -1907,6 +2785,7 @@ async def show_diagnostics_command(update: Update, context: ContextTypes.DEFAULT
     await safe_edit_message(query, report, reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔄 تحديث", callback_data="db_diagnostics")], [InlineKeyboardButton("🔙 العودة للوحة التحكم", callback_data="back_to_dashboard")]]))
 
 # --- [تعديل V8.1] تحديث التقرير اليومي بالكامل
+@in_request_lane("report")
 async def send_daily_report(context: ContextTypes.DEFAULT_TYPE):
     today_str = datetime.now(EGYPT_TZ).strftime('%Y-%m-%d')
     logger.info(f"Generating daily report for {today_str}...")
@@ -2027,6 +2906,7 @@ async def show_trades_command(update: Update, context: ContextTypes.DEFAULT_TYPE
     keyboard.append([InlineKeyboardButton("🔙 العودة للوحة التحكم", callback_data="back_to_dashboard")])
     await safe_edit_message(update.callback_query, text, reply_markup=InlineKeyboardMarkup(keyboard))
 
+@in_request_lane("report")
 async def check_trade_details(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     trade_id = int(query.data.split('_')[1])
@@ -2164,6 +3044,7 @@ async def show_stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
     )
     await safe_edit_message(update.callback_query, message, reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("📜 عرض تقرير الاستراتيجيات", callback_data="db_strategy_report")],[InlineKeyboardButton("🔙 العودة للوحة التحكم", callback_data="back_to_dashboard")]]))
 
+@in_request_lane("report")
 async def show_portfolio_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query; await query.answer("جاري جلب بيانات المحفظة...")
     try:
@@ -2353,6 +3234,7 @@ async def handle_clear_data_execute(update: Update, context: ContextTypes.DEFAUL
             os.remove(DB_FILE)
             logger.info("Database file has been deleted by user.")
         await init_database()
+        bot_data.support_levels_dirty.update(bot_data.support_levels)  # الفهارس في الذاكرة تُعاد كتابتها في القاعدة الجديدة
         await safe_edit_message(query, "✅ تم حذف جميع بيانات الصفقات بنجاح.")
     except Exception as e:
         logger.error(f"Failed to clear data: {e}")
@@ -2383,7 +3265,7 @@ async def handle_preset_set(update: Update, context: ContextTypes.DEFAULT_TYPE):
         bot_data.settings = copy.deepcopy(preset_settings)
         bot_data.settings['active_scanners'] = current_scanners 
         bot_data.settings.update(adaptive_settings)
-        determine_active_preset(); save_settings()
+        determine_active_preset(); save_settings(); bot_data.scan_verdicts.clear()
         await query.answer(f"✅ تم تفعيل النمط: {PRESET_NAMES_AR.get(preset_key, preset_key)}", show_alert=True)
     else:
         await query.answer("لم يتم العثور على النمط.")
@@ -2460,7 +3342,7 @@ async def handle_setting_value(update: Update, context: ContextTypes.DEFAULT_TYP
             else: new_value = float(user_input)
             current_dict[last_key] = new_value
 
-        save_settings(); determine_active_preset()
+        save_settings(); determine_active_preset(); bot_data.scan_verdicts.clear()
         await update.message.reply_text(f"✅ تم تحديث `{setting_key}` إلى `{new_value}`.")
     except (ValueError, KeyError):
         await update.message.reply_text("❌ قيمة غير صالحة. الرجاء إرسال رقم.")
@@ -2487,6 +3369,7 @@ async def handle_manual_sell_confirmation(update: Update, context: ContextTypes.
     keyboard = [[InlineKeyboardButton("✅ نعم، قم بالبيع الآن", callback_data=f"manual_sell_execute_{trade_id}")], [InlineKeyboardButton("❌ لا، تراجع", callback_data=f"check_{trade_id}")]]
     await safe_edit_message(query, message, reply_markup=InlineKeyboardMarkup(keyboard))
 
+@in_request_lane("order")
 async def handle_manual_sell_execute(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     trade_id = int(query.data.split('_')[-1])
@@ -2608,6 +3491,7 @@ async def post_init(application: Application):
 
     try:
         await init_database()
+        await load_support_levels()
     except Exception as e:
         logger.critical(f"FATAL: Database could not be initialized: {e}", exc_info=True)
         raise RuntimeError("Bot cannot start due to database failure.")
@@ -2618,9 +3502,11 @@ async def post_init(application: Application):
             'apiKey': os.getenv('OKX_API_KEY'),
             'secret': os.getenv('OKX_API_SECRET'),
             'password': os.getenv('OKX_API_PASSWORD'),
-            'enableRateLimit': True,
+            'enableRateLimit': False,
             'options': {'defaultType': 'spot', 'timeout': 30000}
         })
+        # --- [أداء] منظم الطلبات المركزي يحل محل منظم ccxt (FIFO): حدود لكل نقطة نهاية ومسارات أولوية
+        bot_data.exchange = ExchangeGateway(bot_data.exchange)
         
         logger.info("DEBUG: CCXT instance created. Attempting to load markets...")
         # --- [✅ الإصلاح الحاسم] ---
@@ -2654,9 +3540,15 @@ async def post_init(application: Application):
     
     load_settings()
 
+    # --- [أداء] ذاكرة شموع مشتركة بين الماسح والرجل الحكيم والمحرك التطوري ---
+    # الأطر الأكبر (1h، 4h) تُبنى من سلسلة 15m المحلية ما دام عمقها المطلوب ضمن resample_max_base_bars
+    bot_data.ohlcv_cache = OHLCVCache(fetcher=fetch_ohlcv_from_exchange, base_timeframe=bot_data.settings.get('resample_base_timeframe'),
+                                      max_base_bars=bot_data.settings.get('resample_max_base_bars', 1000),
+                                      dtype=bot_data.settings.get('ohlcv_store_dtype', 'float64'))
+
     global wise_man, smart_brain
     wise_man = WiseMan(exchange=bot_data.exchange, application=application, bot_data_ref=bot_data, db_file=DB_FILE)
-    smart_brain = EvolutionaryEngine(exchange=bot_data.exchange, db_file=DB_FILE)
+    smart_brain = EvolutionaryEngine(exchange=bot_data.exchange, db_file=DB_FILE, ohlcv_cache=bot_data.ohlcv_cache)
 
     bot_data.trade_guardian = TradeGuardian(application)
     bot_data.public_ws = PublicWebSocketManager(bot_data.trade_guardian.handle_ticker_update)
@@ -2673,7 +3565,21 @@ async def post_init(application: Application):
 
     jq = application.job_queue
     jq.run_repeating(wise_man.run_realtime_review, interval=10, first=5, name="wise_man_realtime_engine")
-    jq.run_repeating(perform_scan, interval=SCAN_INTERVAL_SECONDS, first=10, name="perform_scan")
+    if bot_data.settings.get('scan_schedule_mode') == 'event_stream':
+        # --- [مسح لحظي] لا يوجد فحص دوري: كل رمز يُفحص عند إغلاق شمعته في بث الشموع
+        bot_data.market_stream = MarketStreamManager(TIMEFRAME, on_stream_candle_closed, shard_size=bot_data.settings.get('candle_stream', {}).get('shard_size', 100))
+        jq.run_repeating(sync_market_stream_universe, interval=300, first=5, name="market_stream_sync")
+    elif bot_data.settings.get('scan_schedule_mode') == 'candle_close':
+        # --- [أداء] الفحص يبدأ بعد إغلاق كل شمعة UTC بمهلة قصيرة، فتكون شمعة الإشارة (iloc[-2]) مغلقة للتو
+        jq.run_repeating(perform_scan, interval=timeframe_to_ms(TIMEFRAME) // 1000, first=seconds_until_candle_scan(), name="perform_scan")
+    else:
+        jq.run_repeating(perform_scan, interval=SCAN_INTERVAL_SECONDS, first=10, name="perform_scan")
+    book_stream_settings = bot_data.settings.get('order_book_stream', {})
+    if book_stream_settings.get('enabled', True):
+        bot_data.order_book_stream = OrderBookStreamManager(book_stream_settings.get('channel', 'books5'), shard_size=book_stream_settings.get('shard_size', 100))
+        jq.run_repeating(sync_order_book_stream, interval=300, first=5, name="order_book_stream_sync")
+        if ORDER_BOOK_CHANNEL_LEVELS.get(bot_data.order_book_stream.channel, 0) < WHALE_RADAR_DEPTH_LEVELS:
+            logger.info(f"Order book stream ({bot_data.order_book_stream.channel}) serves spreads only; whale radar lookups need {WHALE_RADAR_DEPTH_LEVELS} levels and use REST.")
     jq.run_repeating(the_supervisor_job, interval=SUPERVISOR_INTERVAL_SECONDS, first=30, name="the_supervisor_job")
     jq.run_daily(send_daily_report, time=dt_time(hour=23, minute=55, tzinfo=EGYPT_TZ), name='daily_report')
     jq.run_repeating(update_strategy_performance, interval=STRATEGY_ANALYSIS_INTERVAL_SECONDS, first=60, name="update_strategy_performance")
@@ -2691,6 +3597,11 @@ async def post_shutdown(application: Application):
         await bot_data.websocket_manager.stop()
     if bot_data.exchange:
         await bot_data.exchange.close()
+    if bot_data.market_stream:
+        await bot_data.market_stream.stop()
+    if bot_data.order_book_stream:
+        await bot_data.order_book_stream.stop()
+    reset_scan_process_pool()
     logger.info("Bot has shut down gracefully.")
 
 def main():
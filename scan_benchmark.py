@@ -0,0 +1,384 @@
+# -*- coding: utf-8 -*-
+# =======================================================================================
+# --- ⏱️ Maestro Scan Benchmark (Offline) ⏱️ ---
+# =======================================================================================
+#
+# يقيس أداء مسار الفحص الحقيقي (perform_scan → worker_batch) بدون الاتصال بـ OKX:
+#   - FixtureExchange تعيد ردود fetch_tickers / fetch_ohlcv / fetch_order_book / fetch_balance من ملفات مسجلة
+#     مع زمن استجابة محاكى، وتزيح الطوابع الزمنية بحيث تكون آخر شمعة مسجلة هي الشمعة الحالية.
+#   - وضع record يسجل الملفات من بيانات OKX العامة، ووضع synthetic يولدها عشوائياً.
+#   - --symbols 300 2000 يكبر الكون صناعياً بنسخ الرموز المسجلة بأسماء جديدة لمعرفة أين يتوقف worker_batch عن التوسع.
+#
+# الاستخدام:
+#   python scan_benchmark.py record --out fixtures/ --symbols 300
+#   python scan_benchmark.py run --fixtures fixtures/ --symbols 300 2000 --runs 3 --latency-ms 80
+#   python scan_benchmark.py run --synthetic 300 --symbols 300 1000 2000
+#   python scan_benchmark.py indicators --synthetic 200
+#
+# وضع indicators يقيس زمن بناء إطار المؤشرات لكل رمز بنوى NumPy مقابل pandas_ta (المسار السابق)،
+# ويتحقق من تطابق كل عمود بين الطريقتين.
+#
+# =======================================================================================
+
+import argparse
+import asyncio
+import copy
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+import numpy as np
+
+from market_data import OHLCVCache, candle_open_ms, now_ms, resample_ohlcv, timeframe_to_ms
+
+logger = logging.getLogger(__name__)
+
+RECORDED_TIMEFRAMES = {'15m': 300, '4h': 220}
+
+
+def percentile(samples, q):
+    return float(np.percentile(samples, q)) if samples else 0.0
+
+
+class ScanProfiler:
+    """Collects wall time per scan stage; okx_maestro.scan_stage() reports into it while it is set on bot_data."""
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples[name].append(time.perf_counter() - started)
+
+
+class FixtureExchange:
+    """Stand-in for ccxt.okx that replays recorded public responses."""
+    def __init__(self, tickers, ohlcv, order_books, balance=None, latency_ms=0.0, latency_jitter=0.5):
+        self.tickers = tickers
+        self.ohlcv = self._shift_to_now(ohlcv)
+        self.order_books = order_books
+        self.balance = balance or {'USDT': {'free': 10_000.0, 'used': 0.0, 'total': 10_000.0}, 'total': {'USDT': 10_000.0}}
+        self.latency_ms, self.latency_jitter = latency_ms, latency_jitter
+        self.calls = defaultdict(int)
+
+    @staticmethod
+    def _shift_to_now(ohlcv):
+        """Moves every recorded series so its last candle is the one forming right now (keeps delta fetches realistic)."""
+        shifted = {}
+        for symbol, series in ohlcv.items():
+            shifted[symbol] = {}
+            for timeframe, rows in series.items():
+                if not rows: continue
+                offset = candle_open_ms(timeframe, now_ms()) - rows[-1][0]
+                shifted[symbol][timeframe] = [[row[0] + offset, *row[1:6]] for row in rows]
+        return shifted
+
+    @classmethod
+    def from_dir(cls, fixture_dir, **kwargs):
+        with open(os.path.join(fixture_dir, 'tickers.json')) as f: tickers = json.load(f)
+        with open(os.path.join(fixture_dir, 'ohlcv.json')) as f: ohlcv = json.load(f)
+        with open(os.path.join(fixture_dir, 'order_books.json')) as f: order_books = json.load(f)
+        return cls(tickers, ohlcv, order_books, **kwargs)
+
+    @classmethod
+    def synthetic(cls, n_symbols, seed=7, **kwargs):
+        """Random-walk universe for runs without recordings (BTC/USDT included for the mood/regime paths)."""
+        rng = np.random.default_rng(seed)
+        tickers, ohlcv, order_books = {}, {}, {}
+        for i in range(n_symbols):
+            symbol = 'BTC/USDT' if i == 0 else f"SYN{i:04d}/USDT"
+            price = float(rng.uniform(0.05, 500))
+            series = {}
+            for timeframe, bars in RECORDED_TIMEFRAMES.items():
+                tf_ms = timeframe_to_ms(timeframe)
+                drift, vol = rng.normal(0, 0.001), rng.uniform(0.002, 0.02) * np.sqrt(tf_ms / 900_000)
+                closes = price * np.exp(np.cumsum(rng.normal(drift, vol, bars)))
+                opens = np.r_[closes[0], closes[:-1]]
+                highs = np.maximum(opens, closes) * (1 + rng.uniform(0, vol, bars))
+                lows = np.minimum(opens, closes) * (1 - rng.uniform(0, vol, bars))
+                volumes = rng.lognormal(10, 1, bars)
+                start = candle_open_ms(timeframe, now_ms()) - (bars - 1) * tf_ms
+                series[timeframe] = [[start + j * tf_ms, float(opens[j]), float(highs[j]), float(lows[j]), float(closes[j]), float(volumes[j])] for j in range(bars)]
+            ohlcv[symbol] = series
+            day = series['15m'][-96:]
+            last, spread = day[-1][4], day[-1][4] * float(rng.uniform(0.0002, 0.004))
+            tickers[symbol] = {'symbol': symbol, 'last': last, 'bid': last - spread / 2, 'ask': last + spread / 2, 'open': day[0][1],
+                               'high': max(r[2] for r in day), 'low': min(r[3] for r in day), 'quoteVolume': float(rng.uniform(1.5e6, 5e8)), 'active': True}
+            order_books[symbol] = {'bids': [[last - spread / 2 * (k + 1), float(rng.lognormal(3, 1))] for k in range(20)],
+                                   'asks': [[last + spread / 2 * (k + 1), float(rng.lognormal(3, 1))] for k in range(20)]}
+        return cls(tickers, ohlcv, order_books, **kwargs)
+
+    def scaled(self, n_symbols):
+        """Copy of this exchange with exactly n_symbols tradable symbols, cloning recorded ones under new names if needed."""
+        originals = [s for s in self.tickers if s in self.ohlcv and s != 'BTC/USDT']
+        tickers, ohlcv, order_books = {}, {}, {}
+        if 'BTC/USDT' in self.ohlcv:
+            tickers['BTC/USDT'], ohlcv['BTC/USDT'], order_books['BTC/USDT'] = self.tickers['BTC/USDT'], self.ohlcv['BTC/USDT'], self.order_books.get('BTC/USDT')
+        for i in range(n_symbols):
+            source = originals[i % len(originals)]
+            symbol = source if i < len(originals) else f"C{i // len(originals)}{source}"
+            tickers[symbol] = {**self.tickers[source], 'symbol': symbol}
+            ohlcv[symbol], order_books[symbol] = self.ohlcv[source], self.order_books.get(source)
+        clone = copy.copy(self)
+        clone.tickers, clone.ohlcv, clone.order_books, clone.calls = tickers, ohlcv, order_books, defaultdict(int)
+        return clone
+
+    async def _latency(self, endpoint):
+        self.calls[endpoint] += 1
+        if self.latency_ms > 0:
+            await asyncio.sleep(self.latency_ms / 1000 * random.lognormvariate(0, self.latency_jitter))
+
+    async def load_markets(self):
+        return {}
+
+    async def fetch_balance(self):
+        await self._latency('fetch_balance')
+        return copy.deepcopy(self.balance)
+
+    async def fetch_tickers(self, symbols=None):
+        await self._latency('fetch_tickers')
+        return {s: dict(t) for s, t in self.tickers.items() if symbols is None or s in symbols}
+
+    async def fetch_ticker(self, symbol):
+        await self._latency('fetch_ticker')
+        return dict(self.tickers[symbol])
+
+    async def fetch_ohlcv(self, symbol, timeframe='15m', since=None, limit=None):
+        await self._latency('fetch_ohlcv')
+        series = self.ohlcv.get(symbol, {})
+        rows = series.get(timeframe)
+        if rows is None and '15m' in series:
+            rows = resample_ohlcv(series['15m'], timeframe)
+        rows = rows or []
+        if since is not None:
+            rows = [row for row in rows if row[0] >= since]
+            return [list(row) for row in rows[:limit or len(rows)]]
+        return [list(row) for row in rows[-(limit or len(rows)):]]
+
+    async def fetch_order_book(self, symbol, limit=None):
+        await self._latency('fetch_order_book')
+        book = self.order_books.get(symbol) or {'bids': [], 'asks': []}
+        return {'bids': book['bids'][:limit], 'asks': book['asks'][:limit]}
+
+    async def close(self):
+        pass
+
+
+async def record_fixtures(out_dir, n_symbols):
+    """Records public OKX responses (no API keys needed) for the top n_symbols USDT pairs by quote volume."""
+    import ccxt.async_support as ccxt
+    exchange = ccxt.okx({'enableRateLimit': True, 'options': {'defaultType': 'spot'}})
+    try:
+        tickers = await exchange.fetch_tickers()
+        symbols = sorted((s for s in tickers if s.endswith('/USDT')), key=lambda s: tickers[s].get('quoteVolume') or 0, reverse=True)[:n_symbols]
+        if 'BTC/USDT' not in symbols: symbols.append('BTC/USDT')
+        ohlcv, order_books = {}, {}
+        for i, symbol in enumerate(symbols):
+            ohlcv[symbol] = {tf: await exchange.fetch_ohlcv(symbol, tf, limit=bars) for tf, bars in RECORDED_TIMEFRAMES.items()}
+            book = await exchange.fetch_order_book(symbol, limit=20)
+            order_books[symbol] = {'bids': [row[:2] for row in book['bids']], 'asks': [row[:2] for row in book['asks']]}
+            if (i + 1) % 50 == 0: logger.info(f"Recorded {i + 1}/{len(symbols)} symbols...")
+    finally:
+        await exchange.close()
+    os.makedirs(out_dir, exist_ok=True)
+    for name, data in (('tickers', {s: tickers[s] for s in symbols}), ('ohlcv', ohlcv), ('order_books', order_books)):
+        with open(os.path.join(out_dir, f'{name}.json'), 'w') as f: json.dump(data, f)
+    logger.info(f"Fixtures for {len(symbols)} symbols written to {out_dir}")
+
+
+class _SilentBot:
+    async def send_message(self, *args, **kwargs):
+        return None
+
+
+async def run_scan_benchmark(exchange, n_symbols, runs=3, execution_mode='async'):
+    """Runs the real perform_scan `runs` times on a universe of n_symbols and returns one report per run."""
+    import okx_maestro  # يستورد البوت فقط عند التشغيل، حتى يعمل وضع record بدون اعتماديات البوت
+
+    db_dir = tempfile.mkdtemp(prefix='scan_benchmark_')
+    okx_maestro.DB_FILE = os.path.join(db_dir, 'benchmark.db')
+    await okx_maestro.init_database()
+
+    bot_data = okx_maestro.bot_data
+    bot_data.exchange = exchange.scaled(n_symbols)
+    bot_data.settings = copy.deepcopy(okx_maestro.DEFAULT_SETTINGS)
+    bot_data.settings.update({
+        "top_n_symbols_by_volume": n_symbols, "scan_execution_mode": execution_mode, "asset_blacklist": [],
+        # الفلاتر التي تعتمد على خدمات خارجية (أخبار، مؤشر الخوف) أو قد توقف الفحص مبكراً تُعطل لقياس المسار كاملاً
+        "news_filter_enabled": False, "market_mood_filter_enabled": False, "btc_trend_filter_enabled": False,
+        "scan_time_budget": {"enabled": False}, "scan_tiers": {"enabled": False},  # نقيس الكون كاملاً في كل فحص
+    })
+    bot_data.scan_carryover = []
+    bot_data.symbol_quarantine = okx_maestro.SymbolQuarantine()
+    bot_data.support_levels, bot_data.support_levels_dirty = {}, set()
+    bot_data.ohlcv_cache = OHLCVCache(fetcher=okx_maestro.fetch_ohlcv_from_exchange, base_timeframe=bot_data.settings['resample_base_timeframe'],
+                                      max_base_bars=bot_data.settings['resample_max_base_bars'], dtype=bot_data.settings['ohlcv_store_dtype'])
+    bot_data.htf_cache = okx_maestro.CandleBoundaryCache()
+    bot_data.indicator_states = okx_maestro.indicators.IndicatorStateCache(okx_maestro.timeframe_to_ms(okx_maestro.TIMEFRAME))
+    context = type('BenchmarkContext', (), {'bot': _SilentBot()})()
+
+    reports = []
+    try:
+        for run in range(runs):
+            bot_data.last_markets_fetch = 0
+            bot_data.order_book_cache = okx_maestro.OrderBookCache()  # لا يوجد بث دفاتر أوامر هنا: كل فحص يدفع ثمن طلبات REST الاحتياطية
+            bot_data.scan_verdicts = okx_maestro.ScanVerdictCache()  # كل الفحوصات هنا على نفس الشمعة: نقيس التحليل لا ذاكرة الأحكام
+            bot_data.exchange.calls.clear()
+            bot_data.scan_profiler = profiler = ScanProfiler()
+            started = time.perf_counter()
+            await okx_maestro.perform_scan(context)
+            elapsed = time.perf_counter() - started
+            reports.append({
+                "run": run + 1, "symbols": n_symbols, "wall_seconds": elapsed, "symbols_per_second": n_symbols / elapsed if elapsed else 0.0,
+                "api_calls": dict(bot_data.exchange.calls),
+                "stages": {name: {"count": len(samples), "total": sum(samples), "p50": percentile(samples, 50), "p99": percentile(samples, 99)}
+                           for name, samples in sorted(profiler.samples.items())},
+            })
+    finally:
+        bot_data.scan_profiler = None
+        okx_maestro.reset_scan_process_pool()
+    return reports
+
+
+# المسار السابق لبناء إطار المؤشرات، للمقارنة فقط
+PANDAS_TA_BUILDERS = {
+    "vwap": lambda df: df.ta.vwap(),
+    "bbands": lambda df, length: df.ta.bbands(length=length),
+    "macd": lambda df: df.ta.macd(),
+    "rsi": lambda df, length: df.ta.rsi(length=length),
+    "kc": lambda df, length, scalar: df.ta.kc(length=length, scalar=scalar),
+    "obv": lambda df: df.ta.obv(),
+    "supertrend": lambda df, length, multiplier: df.ta.supertrend(length=length, multiplier=multiplier),
+    "volume_sma": lambda df, length: df['volume'].rolling(length).mean().rename(f"VOLUME_SMA_{length}"),
+}
+
+
+def pandas_ta_indicator_frame(ohlcv_array, specs):
+    import pandas as pd
+    import pandas_ta  # noqa: F401 (يسجل df.ta)
+    df = pd.DataFrame(ohlcv_array, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+    df = df.set_index('timestamp').sort_index()
+    return pd.concat([df, *(PANDAS_TA_BUILDERS[name](df, **params) for name, params in specs)], axis=1)
+
+
+def run_indicator_benchmark(exchange, repeats=3, tolerance=1e-9):
+    """
+    Times the per-symbol indicator frame of every scanner with the NumPy kernels and with pandas_ta, and returns
+    the worst relative difference per column (equivalence check). pandas_ta is optional; without it only the kernels are timed.
+    """
+    import okx_maestro
+    specs = okx_maestro.collect_indicator_specs(list(okx_maestro.SCANNER_INDICATORS), okx_maestro.DEFAULT_SETTINGS)
+    arrays = [np.asarray(series['15m'][-220:], dtype=np.float64) for series in exchange.ohlcv.values() if '15m' in series]
+
+    def time_per_symbol(build):
+        best = float('inf')
+        for _ in range(repeats):
+            started = time.perf_counter()
+            for array in arrays: build(array)
+            best = min(best, (time.perf_counter() - started) / len(arrays))
+        return best
+
+    report = {"symbols": len(arrays), "indicators": [name for name, _ in specs],
+              "numpy_ms": time_per_symbol(lambda a: okx_maestro.build_indicator_frame(a, specs)) * 1000}
+    try:
+        import pandas as pd
+        import pandas_ta  # noqa: F401
+    except ImportError:
+        pd = None
+    if pd is None or not hasattr(pd.DataFrame, 'ta'):
+        logger.warning("pandas_ta (df.ta accessor) is not available; skipping the before/after comparison. tests/test_indicators.py checks the kernels against pandas.")
+        return report
+
+    report["pandas_ta_ms"] = time_per_symbol(lambda a: pandas_ta_indicator_frame(a, specs)) * 1000
+    worst = defaultdict(float)
+    for array in arrays:
+        mine, reference = okx_maestro.build_indicator_frame(array, specs), pandas_ta_indicator_frame(array, specs)
+        for column in reference.columns:
+            x, y = mine[column].to_numpy(dtype=np.float64), reference[column].to_numpy(dtype=np.float64)
+            if not np.array_equal(np.isnan(x), np.isnan(y)):
+                worst[column] = float('inf'); continue
+            valid = ~np.isnan(y)
+            if valid.any(): worst[column] = max(worst[column], float(np.max(np.abs(x[valid] - y[valid]) / np.maximum(1.0, np.abs(y[valid])))))
+    report["max_relative_diff"] = dict(worst)
+    report["mismatched_columns"] = [column for column, diff in worst.items() if diff > tolerance]
+    return report
+
+
+def print_indicator_report(report):
+    print(f"\n=== indicator frame | {report['symbols']} symbols | {', '.join(report['indicators'])} ===")
+    print(f"NumPy kernels: {report['numpy_ms']:.3f} ms/symbol")
+    if 'pandas_ta_ms' not in report: return
+    print(f"pandas_ta:     {report['pandas_ta_ms']:.3f} ms/symbol ({report['pandas_ta_ms'] / report['numpy_ms']:.1f}x)")
+    for column, diff in sorted(report['max_relative_diff'].items()):
+        print(f"  {column:<20}{diff:>12.2e}")
+    print("equivalence: " + ("OK" if not report['mismatched_columns'] else f"MISMATCH in {report['mismatched_columns']}"))
+
+
+def print_report(report):
+    print(f"\n=== {report['symbols']} symbols | run {report['run']} | {report['wall_seconds']:.2f}s | {report['symbols_per_second']:.1f} symbols/s ===")
+    print(f"API calls: {report['api_calls']}")
+    print(f"{'stage':<32}{'count':>8}{'total s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, stage in report['stages'].items():
+        print(f"{name:<32}{stage['count']:>8}{stage['total']:>10.2f}{stage['p50'] * 1000:>10.1f}{stage['p99'] * 1000:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark for the Maestro scan path.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    record = sub.add_parser('record', help="record public OKX responses into fixture files")
+    record.add_argument('--out', required=True)
+    record.add_argument('--symbols', type=int, default=300)
+    run = sub.add_parser('run', help="run perform_scan against fixtures")
+    source = run.add_mutually_exclusive_group(required=True)
+    source.add_argument('--fixtures', help="directory written by the record command")
+    source.add_argument('--synthetic', type=int, help="generate a random universe with this many base symbols")
+    run.add_argument('--symbols', type=int, nargs='+', default=[300], help="universe sizes to benchmark (recorded symbols are cloned to reach them)")
+    run.add_argument('--runs', type=int, default=3, help="scans per size; the first one fills the OHLCV cache")
+    run.add_argument('--latency-ms', type=float, default=80.0, help="median simulated REST latency")
+    run.add_argument('--mode', choices=['async', 'process_pool'], default='async')
+    run.add_argument('--json', help="also write the reports to this file")
+    bench = sub.add_parser('indicators', help="per-symbol indicator frame: NumPy kernels vs pandas_ta, with an equivalence check")
+    bench_source = bench.add_mutually_exclusive_group(required=True)
+    bench_source.add_argument('--fixtures', help="directory written by the record command")
+    bench_source.add_argument('--synthetic', type=int, help="generate a random universe with this many symbols")
+    bench.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.WARNING)
+    if args.command == 'record':
+        logging.getLogger(__name__).setLevel(logging.INFO)
+        asyncio.run(record_fixtures(args.out, args.symbols)); return
+
+    if args.command == 'indicators':
+        exchange = FixtureExchange.from_dir(args.fixtures) if args.fixtures else FixtureExchange.synthetic(args.synthetic)
+        report = run_indicator_benchmark(exchange, repeats=args.repeats)
+        print_indicator_report(report)
+        if report.get('mismatched_columns'): raise SystemExit(1)
+        return
+
+    if args.fixtures: exchange = FixtureExchange.from_dir(args.fixtures, latency_ms=args.latency_ms)
+    else: exchange = FixtureExchange.synthetic(args.synthetic, latency_ms=args.latency_ms)
+
+    async def run_all():
+        all_reports = []
+        for n_symbols in args.symbols:
+            all_reports.extend(await run_scan_benchmark(exchange, n_symbols, runs=args.runs, execution_mode=args.mode))
+        return all_reports
+
+    reports = asyncio.run(run_all())
+    for report in reports: print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f: json.dump(reports, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -5,22 +5,27 @@ import json
 import pandas as pd
 import pandas_ta as ta
 import ccxt.async_support as ccxt
+from market_data import ohlcv_frame
 
 logger = logging.getLogger(__name__)
 
 class EvolutionaryEngine:
-    def __init__(self, exchange: ccxt.Exchange, db_file: str):
+    def __init__(self, exchange: ccxt.Exchange, db_file: str, ohlcv_cache=None):
         """
         [النسخة النهائية] يتم الآن تمرير مسار قاعدة البيانات بشكل صريح.
+        ohlcv_cache: ذاكرة الشموع المشتركة (OHLCVCache) من البوت الرئيسي، اختيارية.
         """
         self.exchange = exchange
         self.db_file = db_file
+        self.ohlcv_cache = ohlcv_cache
         logger.info("🧬 Evolutionary Engine Initialized (Final Version).")
 
     async def _capture_market_snapshot(self, symbol: str) -> dict:
         try:
-            ohlcv = await self.exchange.fetch_ohlcv(symbol, '15m', limit=100)
-            df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+            if self.ohlcv_cache is not None:
+                df = await self.ohlcv_cache.get_frame(symbol, '15m', 100)
+            else:
+                df = ohlcv_frame(await self.exchange.fetch_ohlcv(symbol, '15m', limit=100))
             rsi = ta.rsi(df['close'], length=14)
             adx_data = ta.adx(df['high'], df['low'], df['close'])
             last_rsi = rsi.iloc[-1] if rsi is not None and not rsi.empty else None
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+# مقارنة نوى indicators.py مع تعريفات pandas المرجعية (ومع pandas_ta نفسها إن كانت مثبتة).
+import numpy as np
+import pandas as pd
+import pytest
+
+import indicators
+
+N = 300
+TF_MS = 15 * 60_000
+
+
+@pytest.fixture(scope="module")
+def ohlcv():
+    rng = np.random.default_rng(7)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, N)))
+    open_ = np.r_[close[0], close[:-1]]
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.005, N))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.005, N))
+    volume = rng.uniform(1_000, 5_000, N)
+    ts = 1_700_000_000_000 // TF_MS * TF_MS + np.arange(N) * TF_MS
+    return np.column_stack([ts, open_, high, low, close, volume]).astype(np.float64)
+
+
+def series(ohlcv, column):
+    return pd.Series(ohlcv[:, indicators.OHLCV_FIELDS.index(column)])
+
+
+def assert_same(actual, expected, rtol=1e-9):
+    actual, expected = np.asarray(actual, dtype=np.float64), np.asarray(expected, dtype=np.float64)
+    np.testing.assert_array_equal(np.isnan(actual), np.isnan(expected))
+    np.testing.assert_allclose(actual[~np.isnan(actual)], expected[~np.isnan(expected)], rtol=rtol)
+
+
+# --- تعريفات pandas_ta بعمليات pandas ---
+def ref_ema(s, length):
+    s = s.copy()
+    first = s.first_valid_index()
+    seed = s.iloc[first:first + length].mean()
+    s.iloc[:first + length - 1] = np.nan
+    s.iloc[first + length - 1] = seed
+    return s.ewm(span=length, adjust=False).mean()
+
+
+def ref_rma(s, length):
+    return s.ewm(alpha=1.0 / length, min_periods=length).mean()
+
+
+def ref_true_range(high, low, close):
+    prev_close = close.shift(1)
+    tr = pd.concat([high - low, (high - prev_close).abs(), (low - prev_close).abs()], axis=1).max(axis=1)
+    tr.iloc[0] = np.nan
+    return tr
+
+
+def ref_supertrend(high, low, close, length, multiplier):
+    hl2 = (high + low) / 2
+    matr = multiplier * ref_rma(ref_true_range(high, low, close), length)
+    upper, lower = (hl2 + matr).to_list(), (hl2 - matr).to_list()
+    direction, trend = [1] * len(close), [np.nan] * len(close)
+    for i in range(1, len(close)):
+        if close.iloc[i] > upper[i - 1]: direction[i] = 1
+        elif close.iloc[i] < lower[i - 1]: direction[i] = -1
+        else:
+            direction[i] = direction[i - 1]
+            if direction[i] > 0 and lower[i] < lower[i - 1]: lower[i] = lower[i - 1]
+            if direction[i] < 0 and upper[i] > upper[i - 1]: upper[i] = upper[i - 1]
+        trend[i] = lower[i] if direction[i] > 0 else upper[i]
+    return pd.Series(trend), pd.Series(direction, dtype=float)
+
+
+def test_moving_averages(ohlcv):
+    close = series(ohlcv, 'close')
+    assert_same(indicators.sma(close.to_numpy(), 20), close.rolling(20).mean())
+    assert_same(indicators.ema(close.to_numpy(), 21), ref_ema(close, 21))
+    assert_same(indicators.rma(close.to_numpy(), 14), ref_rma(close, 14))
+
+
+def test_atr_and_adx(ohlcv):
+    high, low, close = (series(ohlcv, c) for c in ('high', 'low', 'close'))
+    atr = ref_rma(ref_true_range(high, low, close), 14)
+    assert_same(indicators.atr(high.to_numpy(), low.to_numpy(), close.to_numpy(), 14), atr)
+
+    up, dn = high.diff(), -low.diff()
+    pos = ((up > dn) & (up > 0)) * up
+    neg = ((dn > up) & (dn > 0)) * dn
+    pos[up.isna()], neg[dn.isna()] = np.nan, np.nan
+    dmp, dmn = 100 / atr * ref_rma(pos, 14), 100 / atr * ref_rma(neg, 14)
+    adx = ref_rma(100 * (dmp - dmn).abs() / (dmp + dmn), 14)
+    actual = indicators.adx(high.to_numpy(), low.to_numpy(), close.to_numpy(), 14)
+    for a, e in zip(actual, (adx, dmp, dmn)): assert_same(a, e)
+
+
+def test_scanner_kernels(ohlcv):
+    high, low, close, volume = (series(ohlcv, c) for c in ('high', 'low', 'close', 'volume'))
+    change = close.diff()
+    gains, losses = ref_rma(change.clip(lower=0), 14), ref_rma(change.clip(upper=0).abs(), 14)
+    assert_same(indicators.rsi(close.to_numpy(), 14)["RSI_14"], 100 * gains / (gains + losses))
+
+    bands = indicators.bbands(close.to_numpy(), 20, 2.0)
+    mid, std = close.rolling(20).mean(), close.rolling(20).std(ddof=0)
+    assert_same(bands["BBM_20_2.0"], mid)
+    assert_same(bands["BBU_20_2.0"], mid + 2 * std)
+    assert_same(bands["BBL_20_2.0"], mid - 2 * std)
+
+    sign = np.sign(change).fillna(1.0)
+    assert_same(indicators.obv(close.to_numpy(), volume.to_numpy())["OBV"], (sign * volume).cumsum())
+
+    fast, slow = ref_ema(close, 12), ref_ema(close, 26)
+    line = fast - slow
+    macd = indicators.macd(close.to_numpy())
+    assert_same(macd["MACD_12_26_9"], line)
+    assert_same(macd["MACDs_12_26_9"], ref_ema(line, 9))
+
+
+def test_supertrend(ohlcv):
+    high, low, close = (series(ohlcv, c) for c in ('high', 'low', 'close'))
+    result = indicators.supertrend(high.to_numpy(), low.to_numpy(), close.to_numpy(), 10, 3.0)
+    trend, direction = ref_supertrend(high, low, close, 10, 3.0)
+    assert np.isnan(result["SUPERT_10_3.0"][0])
+    assert_same(result["SUPERT_10_3.0"], trend)
+    assert_same(result["SUPERTd_10_3.0"], direction)
+
+
+def test_incremental_state_matches_kernels(ohlcv):
+    config = {"ema_period": 50, "atr_periods": (14,), "adx_length": 14, "rsi_lengths": (14,),
+              "volume_sma_length": 20, "supertrend": (10, 3.0), "history": 64}
+    state = indicators.IndicatorState(config, TF_MS)
+    assert state.update(ohlcv[:200])
+    for end in range(201, N + 1):
+        assert not state.update(ohlcv[:end])
+    closed = ohlcv[:-1]
+    high, low, close, volume = closed[:, 2], closed[:, 3], closed[:, 4], closed[:, 5]
+    expected = {
+        "EMA_50": indicators.ema(close, 50), "ATRr_14": indicators.atr(high, low, close, 14),
+        "ADX_14": indicators.adx(high, low, close, 14)[0], "RSI_14": indicators.rsi(close, 14)["RSI_14"],
+        "OBV": indicators.obv(close, volume)["OBV"], "VOLUME_SMA_20": indicators.sma(volume, 20),
+        **{k: v for k, v in indicators.supertrend(high, low, close, 10, 3.0).items()},
+    }
+    for name, values in expected.items():
+        assert_same([state.value(name, back) for back in range(63, -1, -1)], values[-64:])
+
+
+def test_kernels_match_pandas_ta(ohlcv):
+    pytest.importorskip("pandas_ta")
+    okx_maestro = pytest.importorskip("okx_maestro")
+    import scan_benchmark
+
+    specs = okx_maestro.collect_indicator_specs(list(okx_maestro.SCANNER_INDICATORS), okx_maestro.DEFAULT_SETTINGS)
+    mine, reference = okx_maestro.build_indicator_frame(ohlcv, specs), scan_benchmark.pandas_ta_indicator_frame(ohlcv, specs)
+    for column in reference.columns:
+        assert_same(mine[column].to_numpy(dtype=np.float64), reference[column].to_numpy(dtype=np.float64), rtol=1e-7)
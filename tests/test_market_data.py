@@ -0,0 +1,22 @@
+from market_data import SymbolQuarantine
+
+
+def test_quarantine_success_clears_only_given_classes():
+    quarantine = SymbolQuarantine()
+    backoffs = []
+    for _ in range(3):
+        backoffs.append(quarantine.record_failure("X/USDT", "analysis_error", 600, 86400))
+        quarantine.record_success("X/USDT", ("bad_symbol", "exchange_error", "no_data"))
+    assert backoffs == [600, 1200, 2400]
+    assert quarantine.is_quarantined("X/USDT")
+
+    quarantine.record_success("X/USDT", ("analysis_error",))
+    assert not quarantine.is_quarantined("X/USDT") and len(quarantine) == 0
+
+
+def test_quarantine_success_without_classes_clears_all():
+    quarantine = SymbolQuarantine()
+    quarantine.record_failure("X/USDT", "no_data", 900, 86400)
+    quarantine.record_failure("X/USDT", "analysis_error", 600, 86400)
+    quarantine.record_success("X/USDT")
+    assert len(quarantine) == 0 and quarantine.stats['released'] == 2
@@ -25,6 +25,7 @@ import os
 import httpx
 
 import numpy as np
+from market_data import ohlcv_frame
 from smtplib import SMTP
 from email.mime.text import MIMEText
 
@@ -57,6 +58,13 @@ PORTFOLIO_RISK_RULES = {
     "max_asset_concentration_pct": 30.0,
     "max_sector_concentration_pct": 50.0,
 }
+# الاستراتيجيات التي يقبل الرجل الحكيم تنفيذ مرشحيها في كل حالة سوق (الماسح يستخدمها أيضاً لاستبعاد الماسحات مسبقاً)
+REGIME_ALLOWED_STRATEGIES = {
+    'BULL_TREND': ["momentum_breakout", "breakout_squeeze_pro", "supertrend_pullback", "sniper_pro"],
+    'BEAR_TREND': [],
+    'VOLATILE_RANGE': ["rsi_divergence", "support_rebound", "whale_radar"],
+    'QUIET_RANGE': ["support_rebound", "breakout_squeeze_pro"]
+}
 SECTOR_MAP = {
     'RNDR': 'AI', 'FET': 'AI', 'AGIX': 'AI', 'WLD': 'AI', 'OCEAN': 'AI', 'TAO': 'AI',
     'SAND': 'Gaming', 'MANA': 'Gaming', 'GALA': 'Gaming', 'AXS': 'Gaming', 'IMX': 'Gaming', 'APE': 'Gaming',
@@ -81,6 +89,7 @@ class WiseMan:
         self.model_trained = False
         
         self.request_semaphore = asyncio.Semaphore(5)
+        self.entry_review_lock = asyncio.Lock() # المراجعة الدورية ومراجعة ما بعد الفحص لا تتداخلان
         self._cache = {}
         
         logger.info("🧠 Wise Man module upgraded to V13.0 'Efficient Async Optimized' model.")
@@ -93,6 +102,18 @@ class WiseMan:
     def _set_cache(self, key: str, value, ttl_seconds: int):
         self._cache[key] = {'value': value, 'expiry': time.time() + ttl_seconds}
 
+    async def _fetch_ohlcv_frame(self, symbol: str, timeframe: str, limit: int, direct: bool = False):
+        """
+        [أداء] يمر عبر ذاكرة الشموع المشتركة مع الماسح (جلب الشموع الجديدة فقط) إن كانت متاحة،
+        ويعيد DataFrame مبنياً من مصفوفاتها المضغوطة مباشرة، أو None عند الفشل.
+        direct: طلب صغير مباشر بدقة المنصة الكاملة (float64) لقرارات إدارة الصفقات المفتوحة، بدلاً من الذاكرة المضغوطة.
+        """
+        ohlcv_cache = getattr(self.bot_data, 'ohlcv_cache', None)
+        if ohlcv_cache is not None and not direct:
+            return await ohlcv_cache.get_frame(symbol, timeframe, limit)
+        ohlcv = await self.exchange.fetch_ohlcv(symbol, timeframe, limit=limit)
+        return ohlcv_frame(ohlcv) if ohlcv else None
+
     async def train_ml_model(self, context: object = None):
         if not SKLEARN_AVAILABLE:
             return
@@ -109,8 +130,7 @@ class WiseMan:
             return cached
         
         try:
-            btc_ohlcv = await self.exchange.fetch_ohlcv('BTC/USDT', '4h', limit=100)
-            btc_df = pd.DataFrame(btc_ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+            btc_df = await self._fetch_ohlcv_frame('BTC/USDT', '4h', 100)
             adx_data = ta.adx(btc_df['high'], btc_df['low'], btc_df['close'])
             adx_value = adx_data['ADX_14'].iloc[-1]
             atr_value = ta.atr(btc_df['high'], btc_df['low'], btc_df['close']).iloc[-1]
@@ -156,11 +176,18 @@ class WiseMan:
         await self._review_pending_entries()
         await self._review_pending_exits()
 
-    async def _review_pending_entries(self):
+    async def review_candidates(self, candidate_ids: list):
+        """يراجع المرشحين الذين سجلهم الفحص للتو دون انتظار المراجعة الدورية التالية."""
+        await self._review_pending_entries(candidate_ids)
+
+    async def _review_pending_entries(self, candidate_ids: list = None):
         pending_commits = []
-        async with aiosqlite.connect(self.db_file) as conn:
+        async with self.entry_review_lock, aiosqlite.connect(self.db_file) as conn:
             conn.row_factory = aiosqlite.Row
-            candidates = await (await conn.execute("SELECT * FROM trade_candidates WHERE status = 'pending'")).fetchall()
+            if candidate_ids:
+                candidates = await (await conn.execute(f"SELECT * FROM trade_candidates WHERE status = 'pending' AND id IN ({','.join('?' * len(candidate_ids))})", candidate_ids)).fetchall()
+            else:
+                candidates = await (await conn.execute("SELECT * FROM trade_candidates WHERE status = 'pending'")).fetchall()
             if not candidates:
                 return
             
@@ -171,7 +198,7 @@ class WiseMan:
                 async with self.request_semaphore:
                     tasks = [
                         self.exchange.fetch_tickers(symbols),
-                        *[self.exchange.fetch_ohlcv(s, '15m', limit=50) for s in symbols]
+                        *[self._fetch_ohlcv_frame(s, '15m', 50) for s in symbols]
                     ]
                     results = await asyncio.gather(*tasks, return_exceptions=True)
                 
@@ -186,13 +213,6 @@ class WiseMan:
             
             current_market_regime = await self.get_market_regime()
             logger.info(f"Maestro reviewing {len(candidates)} entries under regime: {current_market_regime}")
-            
-            allowed_strategies = {
-                'BULL_TREND': ["momentum_breakout", "breakout_squeeze_pro", "supertrend_pullback", "sniper_pro"],
-                'BEAR_TREND': [], 
-                'VOLATILE_RANGE': ["rsi_divergence", "support_rebound", "whale_radar"],
-                'QUIET_RANGE': ["support_rebound", "breakout_squeeze_pro"]
-            }
 
             for cand_id, candidate in candidate_map.items():
                 symbol = candidate['symbol']
@@ -204,8 +224,8 @@ class WiseMan:
                         continue
 
                     ticker = tickers.get(symbol)
-                    ohlcv = ohlcvs.get(symbol)
-                    if not ticker or not ohlcv:
+                    df = ohlcvs.get(symbol)
+                    if not ticker or df is None or df.empty:
                         pending_commits.append(("UPDATE trade_candidates SET status = 'error_data' WHERE id = ?", (cand_id,)))
                         continue
                     
@@ -218,11 +238,10 @@ class WiseMan:
                         continue
 
                     primary_strategy = candidate['reason'].split(' + ')[0]
-                    if primary_strategy not in allowed_strategies.get(current_market_regime, []):
+                    if primary_strategy not in REGIME_ALLOWED_STRATEGIES.get(current_market_regime, []):
                         pending_commits.append(("UPDATE trade_candidates SET status = 'rejected_regime_filter' WHERE id = ?", (cand_id,)))
                         continue
                     
-                    df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
                     atr = ta.atr(df['high'], df['low'], df['close'], length=14).iloc[-1]
                     atr_percent = (atr / current_price) * 100 if current_price > 0 else 0
                     adx_data = ta.adx(df['high'], df['low'], df['close'])
@@ -265,8 +284,7 @@ class WiseMan:
                 symbol = trade['symbol']
                 try:
                     async with self.request_semaphore:
-                        ohlcv = await self.exchange.fetch_ohlcv(symbol, '1m', limit=20)
-                    df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+                        df = await self._fetch_ohlcv_frame(symbol, '1m', 20, direct=True)
                     df['ema_9'] = ta.ema(df['close'], length=9)
                     current_price = df['close'].iloc[-1]
                     last_ema = df['ema_9'].iloc[-1]
@@ -297,10 +315,9 @@ class WiseMan:
                     symbol = trade['symbol']
                     try:
                         async with self.request_semaphore:
-                            ohlcv = await self.exchange.fetch_ohlcv(symbol, '15m', limit=50)
-                        if not ohlcv: continue
+                            df = await self._fetch_ohlcv_frame(symbol, '15m', 50, direct=True)
+                        if df is None or df.empty: continue
                         
-                        df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
                         current_price = df['close'].iloc[-1]
 
                         if current_price >= (trade['take_profit'] * 0.98): # Price is near target
@@ -346,12 +363,10 @@ class WiseMan:
         if cached: return cached
         try:
             async with self.request_semaphore:
-                ohlcv_symbol, ohlcv_btc = await asyncio.gather(
-                    self.exchange.fetch_ohlcv(symbol, '1h', limit=100),
-                    self.exchange.fetch_ohlcv('BTC/USDT', '1h', limit=100)
+                df_symbol, df_btc = await asyncio.gather(
+                    self._fetch_ohlcv_frame(symbol, '1h', 100),
+                    self._fetch_ohlcv_frame('BTC/USDT', '1h', 100)
                 )
-            df_symbol = pd.DataFrame(ohlcv_symbol, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-            df_btc = pd.DataFrame(ohlcv_btc, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
             correlation = df_symbol['close'].corr(df_btc['close'])
             self._set_cache(f"corr_{symbol}", correlation, 3600)
             return correlation